@@ -29,7 +29,10 @@ if current_dir not in sys.path:
 @click.option(
     "--network",
     "net_type",
-    type=click.Choice(["zmq-tcp", "zmq-udp", "ros"], case_sensitive=False),
+    type=click.Choice(
+        ["zmq-tcp", "zmq-router", "zmq-pubsub", "zmq-udp", "shm", "ros"],
+        case_sensitive=False,
+    ),
     help="Specify the network type.",
     required=True,
     default="zmq-tcp",
@@ -66,6 +69,108 @@ if current_dir not in sys.path:
 @click.option("--model-name", "model_name", required=True, type=str, default="dummy")
 @click.option("--device", "device", required=False, default="cuda:0", type=str)
 @click.option("--generate-plots", "generate_plots", flag_value=True)
+@click.option(
+    "--window",
+    "window",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Maximum number of requests in flight. 1 runs stop-and-wait.",
+)
+@click.option(
+    "--clock-sync-interval",
+    "clock_sync_interval",
+    default=30.0,
+    type=click.FloatRange(min=0),
+    help="Seconds between clock syncs with the server. 0 only syncs at startup.",
+)
+@click.option(
+    "--codec",
+    "codec",
+    type=click.Choice(["none", "zlib", "lz4", "jpeg", "webp", "adaptive"]),
+    help="Compress samples before sending them. adaptive picks a codec from the measured upload throughput.",  # noqa: E501
+)
+@click.option(
+    "--quality",
+    "quality",
+    default=75,
+    type=click.IntRange(1, 100),
+    help="Quality of lossy codecs (jpeg, webp).",
+)
+@click.option(
+    "--queue-depth",
+    "queue_depth",
+    default=0,
+    type=click.IntRange(min=0),
+    help="Server only. Requests queued at most, dropping stale ones beyond that. 0 serves every request in order.",  # noqa: E501
+)
+@click.option(
+    "--drop-policy",
+    "drop_policy",
+    default="drop-oldest",
+    type=click.Choice(["drop-oldest", "keep-latest"]),
+    help="Server only. Whether a full queue is served oldest first, or only its newest request.",  # noqa: E501
+)
+@click.option(
+    "--probe-rate",
+    "probe_rate",
+    default=0.0,
+    type=click.FloatRange(min=0),
+    help="Pings per second to measure the link in the background, on ports of their own. 0 disables probing. Servers only check whether it's 0.",  # noqa: E501
+)
+@click.option(
+    "--replay",
+    "replay",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Client only. Send the requests of a recorded trace (see the record network setting) instead of sampling the sensor.",  # noqa: E501
+)
+@click.option(
+    "--replay-speed",
+    "replay_speed",
+    default=1.0,
+    type=click.FloatRange(min=0),
+    help="Client only. Multiple of the recorded pace to replay at. 0 replays as fast as possible.",  # noqa: E501
+)
+@click.option(
+    "--scheduler",
+    "scheduler",
+    default="least-outstanding",
+    type=click.Choice(["least-outstanding", "round-robin", "latency-aware"]),
+    help="Client only. How requests are spread when the network config lists several servers.",  # noqa: E501
+)
+@click.option(
+    "--workers",
+    "workers",
+    default=0,
+    type=click.IntRange(min=0),
+    help="Server only. Process requests on a pool of this many workers, answering them as they complete. 0 processes them one at a time.",  # noqa: E501
+)
+@click.option(
+    "--worker-type",
+    "worker_type",
+    default="thread",
+    type=click.Choice(["thread", "process"]),
+    help="Server only. Whether workers are threads sharing one engine, or processes loading one each.",  # noqa: E501
+)
+@click.option(
+    "--max-batch-size",
+    "max_batch_size",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Server only. Gather requests from every client into batches of up to this many, and run inference once per batch. 1 disables batching.",  # noqa: E501
+)
+@click.option(
+    "--max-batch-wait",
+    "max_batch_wait",
+    default=0.005,
+    type=click.FloatRange(min=0),
+    help="Server only. Most seconds a batch waits to fill up.",
+)
+@click.option(
+    "--one-way",
+    "one_way",
+    flag_value=True,
+    help="Stream samples without replies or acks. The server measures one-way latency, jitter and loss, and writes them to --result-loc if given.",  # noqa: E501
+)
 def main(
     device_type,
     device_name,
@@ -79,6 +184,21 @@ def main(
     model_name,
     device,
     generate_plots,
+    window,
+    clock_sync_interval,
+    codec,
+    quality,
+    queue_depth,
+    drop_policy,
+    probe_rate,
+    replay,
+    replay_speed,
+    scheduler,
+    workers,
+    worker_type,
+    max_batch_size,
+    max_batch_wait,
+    one_way,
 ):
     """Entrypoint."""
     for path in sys.path:
@@ -89,7 +209,21 @@ def main(
         from peernet.cli_server import server_main
 
         server_main(
-            device_name, net_type, net_config, num_iterations, model_name, device
+            device_name,
+            net_type,
+            net_config,
+            num_iterations,
+            model_name,
+            device,
+            queue_depth,
+            drop_policy,
+            probe_rate > 0,
+            workers,
+            worker_type,
+            max_batch_size,
+            max_batch_wait,
+            bool(one_way),
+            results,
         )
 
     elif device_type == "client":
@@ -112,6 +246,15 @@ def main(
             num_iterations,
             results,
             generate_plots,
+            window,
+            clock_sync_interval,
+            codec,
+            quality,
+            probe_rate,
+            replay,
+            replay_speed,
+            scheduler,
+            bool(one_way),
         )
 
     else:
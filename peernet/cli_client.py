@@ -1,16 +1,18 @@
 """Client side implementation of offloaded inference CLI."""
 from peernet.sensors import get_sensor
-from peernet.networks import Message
-from peernet.metrics import Container, Timer, Timing, Value
+from peernet.networks import ClockSync, Message, Prober, ReplayNetwork
+from peernet.networks.Prober import probe_network
+from peernet.networks.compression import AdaptiveCodec, get_codec
+from peernet.networks.scheduling import get_scheduler
+from peernet.metrics import Container, Timer, Timing, Value, pad_sections
 from peernet.utils.plotting import generate_plots
 
 import omegaconf
 import pathlib
+from typing import Optional
+import zmq
 from tqdm import tqdm
 
-import pickle
-import sys
-
 # Logging setup
 import logging
 from peernet.utils import ch
@@ -30,8 +32,54 @@ def client_main(
     num_iterations: int,
     results: pathlib.Path,
     plot: bool,
+    window: int = 1,
+    clock_sync_interval: float = 30.0,
+    codec: Optional[str] = None,
+    quality: int = 75,
+    probe_rate: float = 0.0,
+    replay: Optional[str] = None,
+    replay_speed: float = 1.0,
+    scheduler: str = "least-outstanding",
+    one_way: bool = False,
 ):
-    """Main method for client side."""
+    """Main method for client side.
+
+    With window = 1 the client runs stop-and-wait: sample, send, block on the
+    response. Larger windows keep up to that many requests in flight, so the
+    measured throughput is no longer capped at 1/RTT.
+
+    On lossy networks (zmq-udp, or an impairment with loss), a response that
+    doesn't arrive within the network's rcvtimeo gives up on the oldest request
+    in flight. Its row is kept, with dropped = 1 and NaN for everything that was
+    never measured. The same goes for requests a streaming server
+    (queue_depth > 0) drops. For those it does answer, frame-age is how old the
+    sample was when processing started, upload and queueing (or batching-wait)
+    included.
+
+    The server's clock offset is estimated at startup, and again every
+    clock_sync_interval seconds (0 disables this), once the requests in flight
+    are answered. Upload and download times are corrected for it.
+
+    With a codec, samples are compressed before they're sent, and the server
+    decompresses them before inference. Both are timed, and the codec used is
+    logged with every iteration.
+
+    With replay, the requests of a recorded trace are sent at replay_speed times
+    their recorded pace (0 as fast as possible) instead of sampling the sensor.
+    Traces are recorded by setting record to a path in the network config.
+
+    The config's server can also be a list of servers, or a mapping of servers
+    to weights. The scheduler picks one for every request, and each row logs
+    the server that answered it. Per-server counts and latencies are written to
+    servers.csv.
+
+    ZMQ options from the config's tuning key are written to tuning.csv, as
+    applied.
+
+    With one_way, samples are streamed to the servers in turn without waiting
+    for anything back, and the servers measure one-way latency, jitter and
+    loss themselves. Rows only hold what's measured here.
+    """
     # Make sure the path is ok first and error out if it's not
     if results.exists():
         logger.warning(
@@ -43,15 +91,40 @@ def client_main(
 
     # Network configuration stuffs
     net_config = omegaconf.OmegaConf.load(net_config_file)
+
+    # Devices sharing a config record traces of their own
+    if "record" in net_config:
+        net_config.record = net_config.record.format(device=device_name)
+
     if net_type == "zmq-tcp":
         logger.debug("Setting up zmq tcp network")
         from peernet.networks import ZMQ_Pair
 
         network = ZMQ_Pair(device_name=device_name, **net_config)
 
+    elif net_type == "zmq-router":
+        logger.debug("Setting up zmq router/dealer network")
+        from peernet.networks import ZMQ_Router
+
+        network = ZMQ_Router(device_name=device_name, **net_config)
+
+    elif net_type == "zmq-pubsub":
+        logger.debug("Setting up zmq pub/sub network")
+        from peernet.networks import ZMQ_PubSub
+
+        network = ZMQ_PubSub(device_name=device_name, **net_config)
+
+    elif net_type == "shm":
+        logger.debug("Setting up shared memory network")
+        from peernet.networks import SharedMemory_Pair
+
+        network = SharedMemory_Pair(device_name=device_name, **net_config)
+
     elif net_type == "zmq-udp":
         logger.debug("Setting up zmq udp network")
-        from peernet.networks import ZMQ_UDP  # noqa: F401
+        from peernet.networks import ZMQ_UDP
+
+        network = ZMQ_UDP(device_name=device_name, **net_config)
 
     elif net_type == "ros":
         logger.debug("Setting up ros network")
@@ -59,72 +132,331 @@ def client_main(
     else:
         logger.error("Something went wrong.")
 
+    # Emulate the link in user space, if the config describes one
+    if "impairment" in net_config:
+        from peernet.networks import ImpairedNetwork
+
+        network = ImpairedNetwork.from_config(
+            network, net_config.impairment, device_name
+        )
+
+    # Keep the ZMQ options in effect with the results
+    if network.tuning.applied:
+        network.tuning.summary().to_csv(results / "tuning.csv")
+
+    # Requests are spread over the servers by the scheduler
+    scheduler = get_scheduler(scheduler, net_config.server)
+    servers = scheduler.servers
+
+    # Set up the connections to the servers ahead of the first request
+    setup = network.connect_peers(servers)
+    logger.info(f"Set up connections to {len(servers)} servers in {setup:.4f} s")
+
+    # Estimate each server's clock offset, to correct one-way delays
+    clocks = {
+        server: ClockSync(network, server, interval=clock_sync_interval or None)
+        for server in servers
+    }
+    for clock in clocks.values():
+        clock.sync()
+
+    # Stream samples without waiting for replies, leaving the servers to measure
+    if one_way:
+        sensor = get_sensor(sensor_type, dataset_loc, sensor_object)
+        if codec is not None:
+            codec = get_codec(codec, quality=quality)
+
+        data_logger = _stream(network, servers, clocks, sensor, codec, num_iterations)
+        data_logger.to_csv(results / "data.csv")
+        network.close()
+
+        if plot:
+            generate_plots(results)
+        return
+
+    # Send the requests of a recorded trace, instead of sampling the sensor
+    if replay is not None:
+        replayed = ReplayNetwork(network, replay).replay(speed=replay_speed)
+        replayed.to_csv(results / "data.csv")
+        network.close()
+
+        if plot:
+            generate_plots(results)
+        return
+
+    # Measure the link in the background, on ports of its own
+    prober = None
+    if probe_rate:
+        probe_net = probe_network(network, device_name, net_config)
+        prober = Prober(probe_net, servers, rate=probe_rate)
+        prober.start()
+
     # setup dataset
     sensor = get_sensor(sensor_type, dataset_loc, sensor_object)
 
+    if codec is not None:
+        codec = get_codec(codec, quality=quality)
+
     # Setup logger
     data_logger = Container(f"cv-bench-{device_name}")
 
+    # Iterations in flight, keyed by sequence number. Finished iterations are
+    # added to data_logger in order, so periodic csv dumps only see whole rows.
+    pending = dict()
+    finished = dict()
+    next_row = 0
+
+    # A completed iteration, whose sections dropped iterations are padded to
+    template = None
+
     for idx in tqdm(range(num_iterations)):
+        # Probes and responses share a socket, so only resync with none in flight
+        if not pending:
+            for clock in clocks.values():
+                clock.maybe_sync()
+
         # Get a timing container for this iteration
-        iter_l = data_logger.log_section(f"{idx}", Container)
+        iter_l = Container(f"{idx}")
 
         # Sample an image from the dataset
         with Timing(iter_l, "sensing"):
             sample = sensor.sample()
 
-        # Turn the sample into a Message
-        msg = Message(sample, iter_l)
+        # Trade compute for bandwidth, if asked to
+        if codec is not None:
+            with Timing(iter_l, "compress"):
+                sample = codec.compress(sample)
+            iter_l.log_section("codec", Value).end_collection(sample.codec)
 
-        # Compute the serialized size right now, but only add it to the logger later
-        up_size = sys.getsizeof(pickle.dumps(msg))
-        up_logger_size = sys.getsizeof(pickle.dumps(msg.logger))
+        # Turn the sample into a Message, numbered so the reply can be matched
+        msg = Message(sample, iter_l, seq=idx)
 
         # Send the message to the cloud-- start a sub-logger with the name 'upload'
+        # The network reports the size of what it actually sent, logged later.
+        server = scheduler.pick()
         iter_l.log_section("upload", Timer)
-        network.send(net_config.server, msg)
+        up_stats = network.send(server, msg, "upload-encode")
+        scheduler.sent(idx, server)
+        pending[idx] = (iter_l, up_stats)
 
-        # Block while waiting for a response
-        recv_msg: Message = network.recv(net_config.server)
+        # Block for responses while the window of outstanding requests is full,
+        # or while draining it for the last iteration or a clock resync
+        last = idx == num_iterations - 1
+        while len(pending) >= window or ((last or _resync_due(clocks)) and pending):
+            try:
+                seq, done_l = _complete_iteration(network, servers, pending, clocks)
 
-        # Copy the recv_message logger after ending the download time
-        recv_msg.logger.end_sub("download")
-        iter_l.copy_from(recv_msg.logger)
+            except (zmq.Again, TimeoutError):
+                # Nothing came back in time, so give up on the oldest request
+                seq = min(pending)
+                done_l = _drop_iteration(pending, seq)
+                logger.warning(f"Iteration {seq} timed out, recording it as dropped")
 
-        # Log the received size correctly now
-        down_size = sys.getsizeof(pickle.dumps(recv_msg))
-        down_logger_size = sys.getsizeof(pickle.dumps(recv_msg.logger))
-        iter_l.log_section("download-bytes", Value).end_collection(down_size)
-        iter_l.log_section("download-logger-bytes", Value).end_collection(
-            down_logger_size
-        )
+            # Rows name their server, so latency can be broken out per server
+            if done_l.get_metric("dropped"):
+                server = scheduler.drop(seq)
+            else:
+                server = scheduler.done(seq)
+            done_l.log_section("server", Value).end_collection(server)
 
-        # Now we can add the uploaded size correctly
-        iter_l.log_section("upload-bytes", Value).end_collection(up_size)
-        iter_l.log_section("upload-logger-bytes", Value).end_collection(up_logger_size)
+            if not done_l.get_metric("dropped"):
+                if template is None:
+                    template = done_l
 
-        # Log the throughput(s), a computed value
-        # Am I computing bits per second correctly? This is quite fast!
-        upload_throughput = (
-            8 * iter_l.get_metric("upload-bytes") / iter_l.get_metric("upload")
-        )
-        iter_l.log_section("upload-throughput", Value).end_collection(upload_throughput)
+                # The adaptive codec follows the link's measured throughput
+                if isinstance(codec, AdaptiveCodec):
+                    codec.update(done_l.get_metric("upload-throughput"))
 
-        download_throughput = (
-            8 * iter_l.get_metric("download-bytes") / iter_l.get_metric("download")
-        )
-        iter_l.log_section("download-throughput", Value).end_collection(
-            download_throughput
-        )
+                if prober is not None:
+                    prober.log(done_l, server)
+
+            finished[seq] = done_l
 
-        # logger.info(f"Completed iteration {idx+1}/{num_iterations}")
+            while next_row in finished:
+                # Dropped rows wait for a template, so the csv columns line up
+                if finished[next_row].get_metric("dropped"):
+                    if template is None:
+                        break
+                    pad_sections(finished[next_row], template)
 
-        if num_iterations > 1000 and (idx + 1) % 1000 == 0:
-            data_logger.to_csv(results / "data.csv")
+                data_logger.insert(finished.pop(next_row))
+                next_row += 1
+
+                if num_iterations > 1000 and next_row % 1000 == 0:
+                    data_logger.to_csv(results / "data.csv")
+
+    # If nothing ever completed, the remaining rows are all dropped and alike
+    for seq in sorted(finished):
+        data_logger.insert(finished.pop(seq))
 
     # Write all the results
     logger.debug(data_logger)
     data_logger.to_csv(results / "data.csv")
+    scheduler.summary().to_csv(results / "servers.csv")
+
+    if prober is not None:
+        prober.stop()
+        prober.to_csv(results / "probes.csv")
+        probe_net.close()
+    network.close()
 
     if plot:
         generate_plots(results)
+
+
+def _stream(
+    network, servers: list, clocks: dict, sensor, codec, num_iterations: int
+) -> Container:
+    """Sends num_iterations samples to servers in turn, without waiting on them.
+
+    Each server gets sequence numbers of its own, so it can count the samples
+    it lost. Samples carry an open upload section and the clock offset, for the
+    server to measure one-way latency with.
+
+    Returns:
+        Container - One row per sample.
+    """
+    data_logger = Container("cv-bench-stream")
+    seqs = dict.fromkeys(servers, 0)
+
+    for idx in tqdm(range(num_iterations)):
+        server = servers[idx % len(servers)]
+        clocks[server].maybe_sync()
+
+        iter_l = Container(f"{idx}")
+        with Timing(iter_l, "sensing"):
+            sample = sensor.sample()
+
+        if codec is not None:
+            with Timing(iter_l, "compress"):
+                sample = codec.compress(sample)
+            iter_l.log_section("codec", Value).end_collection(sample.codec)
+
+        clocks[server].log(iter_l)
+        msg = Message(sample, iter_l, seq=seqs[server])
+        seqs[server] += 1
+
+        # The server ends upload, so it has no place in rows kept here
+        upload = iter_l.log_section("upload", Timer)
+        up_stats = network.send(server, msg, "upload-encode")
+        iter_l.children.remove(upload)
+
+        iter_l.log_section("upload-bytes", Value).end_collection(up_stats.nbytes)
+        iter_l.log_section("server", Value).end_collection(server)
+        data_logger.insert(iter_l)
+
+    return data_logger
+
+
+def _resync_due(clocks: dict) -> bool:
+    """Whether any server's clock is due to be synced again."""
+    return any(clock.due for clock in clocks.values())
+
+
+def _complete_iteration(network, servers: list, pending: dict, clocks: dict):
+    """Receives one response and fills in the iteration it answers.
+
+    Args:
+        network: BaseNetwork - Network the requests were sent on
+        servers: list - Names of the devices the requests were sent to
+        pending: dict - Maps sequence numbers to (iteration logger, upload stats).
+            The answered iteration is removed.
+        clocks: dict - ClockSync by server, whose offset is taken out of the
+            upload and download times
+
+    Returns:
+        Tuple[int, Container] - Sequence number and logger of the iteration.
+    """
+    # Skip anything that doesn't answer a request we're waiting on
+    while True:
+        if len(servers) == 1:
+            recv_msg: Message = network.recv(servers[0], "download-decode")
+        else:
+            recv_msg = network.recv_any("download-decode")
+        down_stats = network.last_recv
+        if isinstance(recv_msg, Message) and recv_msg.seq in pending:
+            break
+        seq = getattr(recv_msg, "seq", None)
+        logger.warning(f"Dropping unexpected {type(recv_msg).__name__} {seq}")
+
+    # A streaming server answers the requests it dropped with no data
+    if recv_msg.logger.get_metric("dropped") == 1:
+        logger.debug(f"Iteration {recv_msg.seq} was dropped by the server")
+        return recv_msg.seq, _drop_iteration(pending, recv_msg.seq)
+
+    iter_l, up_stats = pending.pop(recv_msg.seq)
+
+    # Copy the recv_message logger after ending the download time
+    recv_msg.logger.end_sub("download")
+    iter_l.copy_from(recv_msg.logger)
+
+    # Upload ended on the server's clock, and download started on it
+    clock = clocks[network.last_source]
+    clock.correct(iter_l, outbound=["upload"], inbound=["download"])
+    clock.log(iter_l)
+
+    # Log the received size correctly now
+    iter_l.log_section("dropped", Value).end_collection(0)
+    iter_l.log_section("download-bytes", Value).end_collection(down_stats.nbytes)
+    iter_l.log_section("download-logger-bytes", Value).end_collection(
+        down_stats.header_bytes
+    )
+
+    # Now we can add the uploaded size correctly
+    iter_l.log_section("upload-bytes", Value).end_collection(up_stats.nbytes)
+    iter_l.log_section("upload-logger-bytes", Value).end_collection(
+        up_stats.header_bytes
+    )
+
+    # Log the throughput(s), a computed value
+    # Am I computing bits per second correctly? This is quite fast!
+    upload_throughput = (
+        8 * iter_l.get_metric("upload-bytes") / iter_l.get_metric("upload")
+    )
+    iter_l.log_section("upload-throughput", Value).end_collection(upload_throughput)
+
+    download_throughput = (
+        8 * iter_l.get_metric("download-bytes") / iter_l.get_metric("download")
+    )
+    iter_l.log_section("download-throughput", Value).end_collection(
+        download_throughput
+    )
+
+    # Streaming, pooled and batching servers hold requests before processing them,
+    # so a sample is this old once processed
+    waits = [
+        child.name
+        for child in iter_l.children
+        if child.name in ("queueing", "batching-wait")
+    ]
+    if waits:
+        frame_age = iter_l.get_metric("upload") + iter_l.get_metric(waits[0])
+        iter_l.log_section("frame-age", Value).end_collection(frame_age)
+
+    # Lossy networks also report frames lost before this response
+    if hasattr(network, "last_loss"):
+        iter_l.log_section("download-lost-frames", Value).end_collection(
+            network.last_loss.frames_lost
+        )
+        iter_l.log_section("download-partial-frames", Value).end_collection(
+            network.last_loss.frames_partial
+        )
+
+    return recv_msg.seq, iter_l
+
+
+def _drop_iteration(pending: dict, seq: int) -> Container:
+    """Records a request that was never answered as dropped.
+
+    Args:
+        pending: dict - Maps sequence numbers to (iteration logger, upload stats).
+            The dropped iteration is removed.
+        seq: int - Sequence number of the dropped request
+
+    Returns:
+        Container - Logger of the iteration, with dropped = 1.
+    """
+    iter_l, up_stats = pending.pop(seq)
+    iter_l.log_section("dropped", Value).end_collection(1)
+    iter_l.log_section("upload-bytes", Value).end_collection(up_stats.nbytes)
+    return iter_l
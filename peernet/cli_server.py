@@ -1,7 +1,18 @@
 """Server side implementation of offloaded inference CLI."""
 from peernet.inference import get_engine
+from peernet.metrics import Container
+from peernet.networks import (
+    BatchPool,
+    FrameQueue,
+    OneWayMonitor,
+    ProbeResponder,
+    WorkerPool,
+)
+from peernet.networks.Prober import probe_network
 
 import omegaconf
+import pathlib
+from typing import Optional
 
 # Logging setup
 import logging
@@ -11,6 +22,13 @@ logger = logging.getLogger("cv_bench_server")
 logger.setLevel(logging.DEBUG)
 logger.addHandler(ch)
 
+# Seconds without a request after which a server on a lossy network (zmq-udp,
+# or an impairment with loss) assumes the rest were lost
+IDLE_TIMEOUT = 10.0
+
+# Engine of a worker process, loaded by _load_engine as the process starts
+_engine = None
+
 
 def server_main(
     device_name: str,
@@ -19,19 +37,88 @@ def server_main(
     num_iterations: int,
     model_name: str,
     device: str,
+    queue_depth: int = 0,
+    drop_policy: str = "drop-oldest",
+    probe: bool = False,
+    workers: int = 0,
+    worker_type: str = "thread",
+    max_batch_size: int = 1,
+    max_batch_wait: float = 0.005,
+    one_way: bool = False,
+    results: Optional[pathlib.Path] = None,
 ):
-    """Main method for cli server."""
+    """Main method for cli server.
+
+    With queue_depth > 0, requests that arrive while one is processed are queued
+    up to that depth, and stale ones are dropped according to drop_policy. The
+    client records dropped requests with dropped = 1. The time served requests
+    spent queued is logged as "queueing".
+
+    With probe, the client's background link probes are answered on a second
+    instance of the network.
+
+    With workers > 0, requests are processed on a pool of that many threads or
+    processes (worker_type), and answered as they complete. Each process loads
+    its own engine. The time requests wait for a free worker is logged as
+    "queueing".
+
+    With max_batch_size > 1, requests from every client are gathered into
+    batches of up to that size, waiting at most max_batch_wait seconds for one
+    to fill, and each batch runs through inference at once. The time requests
+    wait for their batch is logged as "batching-wait", and its size as
+    "batch-size".
+
+    With one_way, nothing is sent back for the client's samples, not even acks.
+    Each sample's one-way latency, upload-jitter (RFC 3550) and upload-lost
+    (sequence gaps) are measured here instead. With results, they're written
+    to data.csv, and per-client totals to streams.csv.
+
+    ZMQ options from the config's tuning key are logged, and with results,
+    written to tuning.csv.
+    """
+    if queue_depth and workers:
+        raise ValueError("Streaming (queue_depth) and workers can't be combined")
+    if max_batch_size > 1 and (queue_depth or workers):
+        raise ValueError("Batching can't be combined with queue_depth or workers")
+    if one_way and (queue_depth or workers or max_batch_size > 1):
+        raise ValueError("One-way streams are served one sample at a time")
+
     # Cases on network type
     net_config = omegaconf.OmegaConf.load(net_config_file)
+
+    # Devices sharing a config record traces of their own
+    if "record" in net_config:
+        net_config.record = net_config.record.format(device=device_name)
+
     if net_type == "zmq-tcp":
         logger.debug("Setting up zmq tcp network")
         from peernet.networks import ZMQ_Pair
 
         network = ZMQ_Pair(device_name=device_name, **net_config)
 
+    elif net_type == "zmq-router":
+        logger.debug("Setting up zmq router/dealer network")
+        from peernet.networks import ZMQ_Router
+
+        network = ZMQ_Router(device_name=device_name, **net_config)
+
+    elif net_type == "zmq-pubsub":
+        logger.debug("Setting up zmq pub/sub network")
+        from peernet.networks import ZMQ_PubSub
+
+        network = ZMQ_PubSub(device_name=device_name, **net_config)
+
+    elif net_type == "shm":
+        logger.debug("Setting up shared memory network")
+        from peernet.networks import SharedMemory_Pair
+
+        network = SharedMemory_Pair(device_name=device_name, **net_config)
+
     elif net_type == "zmq-udp":
         logger.debug("Setting up zmq udp network")
-        logger.error("This isn't implemented yet!")
+        from peernet.networks import ZMQ_UDP
+
+        network = ZMQ_UDP(device_name=device_name, **net_config)
 
     elif net_type == "ros":
         logger.debug("Setting up ros network")
@@ -40,9 +127,200 @@ def server_main(
     else:
         logger.error("Something went wrong.")
 
+    # Emulate the link in user space, if the config describes one
+    if "impairment" in net_config:
+        from peernet.networks import ImpairedNetwork
+
+        network = ImpairedNetwork.from_config(
+            network, net_config.impairment, device_name
+        )
+
+    # Report the ZMQ options in effect
+    if network.tuning.applied:
+        logger.info(f"ZMQ tuning applied: {network.tuning.applied}")
+        if results is not None:
+            results.mkdir(parents=True, exist_ok=True)
+            network.tuning.summary().to_csv(results / "tuning.csv")
+
     # returns a new class with a callback method that wraps a call to DummyModel
-    # infer with timing and message passing. ie is an instance of that "engine
-    ie = get_engine(model_name, device)
+    # infer with timing and message passing. ie is an instance of that "engine.
+    # Worker processes load one each instead.
+    pool = None
+    queue_section = "queueing"
+    if workers and worker_type == "process":
+        pool = WorkerPool(workers, "process", _load_engine, (model_name, device))
+        callback = _infer
+    else:
+        ie = get_engine(model_name, device)
+        callback = ie.callback
+        if workers:
+            pool = WorkerPool(workers, "thread")
+        elif max_batch_size > 1:
+            pool = BatchPool(max_batch_size, max_batch_wait)
+            callback = ie.batch_callback
+            queue_section = "batching-wait"
+
+    # Answer the client's link probes in the background, on ports of their own
+    responder = None
+    if probe:
+        probe_net = probe_network(network, device_name, net_config)
+        responder = ProbeResponder(probe_net)
+        responder.start()
 
+    if one_way:
+        _serve_one_way(
+            network, callback, net_type, num_iterations, device_name, results
+        )
+    elif pool is not None:
+        _serve_pool(network, pool, callback, net_type, num_iterations, queue_section)
+        pool.close()
+    elif queue_depth:
+        _serve_stream(
+            network, callback, net_type, num_iterations, queue_depth, drop_policy
+        )
+    else:
+        _serve(network, callback, net_type, num_iterations)
+
+    if network.setup_times:
+        logger.info(
+            f"Set up connections to {len(network.setup_times)} peers in "
+            f"{sum(network.setup_times.values()):.4f} s"
+        )
+
+    if responder is not None:
+        responder.stop()
+        probe_net.close()
+    network.close()
+
+
+def _serve(network, callback, net_type: str, num_iterations: int):
+    """Serves requests in the order they arrive."""
     # Setup the network to poll, calling back to whichever inference engine is used.
-    network.poll(num_iterations, ie.callback)
+    sections = dict(decode_section="upload-decode", encode_section="download-encode")
+    if not _lossy(network, net_type):
+        network.poll(num_iterations, callback, **sections)
+        return
+
+    # UDP also reports the frames lost before each request
+    if net_type == "zmq-udp":
+        sections["loss_section"] = "upload"
+
+    # Requests can be lost, so only the first one is waited for indefinitely.
+    # After that, stop once the client goes quiet.
+    handled = network.poll(1, callback, **sections)
+    handled += network.poll(
+        num_iterations - handled, callback, timeout=IDLE_TIMEOUT, **sections
+    )
+
+    if handled < num_iterations:
+        logger.warning(f"Only {handled} of {num_iterations} requests arrived")
+
+
+def _serve_one_way(
+    network,
+    callback,
+    net_type: str,
+    num_iterations: int,
+    device_name: str,
+    results: Optional[pathlib.Path],
+):
+    """Runs samples through the engine without answering, measuring the stream."""
+    monitor = OneWayMonitor("upload")
+    data_logger = Container(f"cv-bench-{device_name}")
+
+    def consume(msg):
+        monitor.observe(msg, network.last_source)
+        callback(msg)
+        data_logger.insert(msg.logger)
+
+    # As in _serve, lossy networks stop once the client goes quiet
+    sections = dict(decode_section="upload-decode", ack=False)
+    handled = network.poll(1, consume, **sections)
+    timeout = IDLE_TIMEOUT if _lossy(network, net_type) else None
+    handled += network.poll(
+        num_iterations - handled, consume, timeout=timeout, **sections
+    )
+
+    summary = monitor.summary()
+    logger.info(f"One-way streams:\n{summary}")
+    if results is not None:
+        results.mkdir(parents=True, exist_ok=True)
+        data_logger.to_csv(results / "data.csv")
+        summary.to_csv(results / "streams.csv")
+
+    if handled < num_iterations:
+        logger.warning(f"Only {handled} of {num_iterations} samples arrived")
+
+
+def _serve_stream(
+    network, callback, net_type: str, num_iterations: int, depth: int, policy: str
+):
+    """Serves requests through a FrameQueue, dropping stale ones when behind."""
+    queue = FrameQueue(depth, policy)
+    sections = dict(
+        decode_section="upload-decode",
+        encode_section="download-encode",
+        arrival_section="upload",
+        queue_section="queueing",
+    )
+
+    # As in _serve, lossy networks stop once the client goes quiet
+    timeout = None
+    handled = 0
+    if _lossy(network, net_type):
+        handled = network.stream(queue, callback, 1, **sections)
+        timeout = IDLE_TIMEOUT
+
+    handled += network.stream(
+        queue, callback, num_iterations - handled, timeout=timeout, **sections
+    )
+
+    logger.info(f"Dropped {queue.dropped} of {handled} requests")
+    if handled < num_iterations:
+        logger.warning(f"Only {handled} of {num_iterations} requests arrived")
+
+
+def _serve_pool(
+    network, pool, callback, net_type: str, num_iterations: int, queue_section: str
+):
+    """Serves requests on a pool of workers, answering them as they complete."""
+    sections = dict(
+        decode_section="upload-decode",
+        encode_section="download-encode",
+        arrival_section="upload",
+        queue_section=queue_section,
+    )
+
+    # As in _serve, lossy networks stop once the client goes quiet
+    timeout = None
+    handled = 0
+    if _lossy(network, net_type):
+        handled = network.serve(pool, callback, 1, **sections)
+        timeout = IDLE_TIMEOUT
+
+    handled += network.serve(
+        pool, callback, num_iterations - handled, timeout=timeout, **sections
+    )
+
+    if isinstance(pool, BatchPool):
+        logger.info(f"Served {handled} requests in batches of {pool.max_batch_size}")
+    else:
+        logger.info(f"Served {handled} requests on {pool.workers} {pool.kind} workers")
+    if handled < num_iterations:
+        logger.warning(f"Only {handled} of {num_iterations} requests arrived")
+
+
+def _load_engine(model_name: str, device: str):
+    """Loads the engine of a worker process."""
+    global _engine
+    _engine = get_engine(model_name, device)
+
+
+def _infer(msg):
+    """Runs the worker process's engine on a request."""
+    return _engine.callback(msg)
+
+
+def _lossy(network, net_type: str) -> bool:
+    """Whether requests can be lost on the way to the server."""
+    return net_type == "zmq-udp" or getattr(network, "lossy", False)
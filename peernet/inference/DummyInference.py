@@ -1,7 +1,7 @@
 """Fake inference object to demonstrate use of inference objects."""
 
 import time
-from typing import Any
+from typing import Any, List
 
 
 class DummyModel:
@@ -25,6 +25,11 @@ class DummyModel:
         time.sleep(self.inference_time - 0.02)
         return 0
 
+    def infer_batch(self, data: List[Any]) -> List[Any]:
+        """Sleeps once for a whole batch, like infer() does for one sample."""
+        time.sleep(self.inference_time - 0.02)
+        return [0] * len(data)
+
     def postprocess(self, inference_output: Any) -> Any:
         """Sleeps for 0.01 seconds."""
         time.sleep(0.01)
@@ -68,12 +68,11 @@ class TorchvisionPretrainedClassifier:
         Args:
             img: PIL.Image - input image
         """
-        self.batch = self.preprocessor(img).unsqueeze(0).to(self.device)
-        return self.batch
+        return self.preprocessor(img).unsqueeze(0).to(self.device)
 
     def infer(self, x: torch.tensor) -> torch.tensor:
         """Get the actual  output tensor."""
-        return self.model(self.batch)
+        return self.model(x)
 
     def postprocess(self, x: torch.tensor) -> Tuple[str, float]:
         """Processes output tensor into classification + score."""
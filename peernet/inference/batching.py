@@ -0,0 +1,61 @@
+"""Stacking preprocessed samples into batches, and splitting results back up.
+
+Engines run infer() once on a batch of requests, gathered by a BatchPool. Each
+preprocessed sample is a batch of its own, with a leading batch axis, like the
+(1, C, H, W) tensors TorchvisionPretrainedClassifier.preprocess() returns.
+Samples are concatenated along that axis, and infer()'s output is split back
+into pieces of the same sizes, so postprocess() sees what it would unbatched.
+
+Inference objects that can't be batched this way, or batch more cleverly, can
+define infer_batch(), which takes a list of samples and returns a list of
+outputs.
+"""
+
+from typing import Any, List, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import torch  # type: ignore
+except ImportError:
+    torch = None
+
+
+def _is_tensor(x: Any) -> bool:
+    return torch is not None and isinstance(x, torch.Tensor)
+
+
+def collate(samples: Sequence[Any]) -> Tuple[Any, List[int]]:
+    """Concatenates samples along their leading batch axis.
+
+    Args:
+        samples: Sequence - numpy arrays or torch tensors, all of one type.
+
+    Returns:
+        Tuple[Any, List[int]] - The batch, and how many rows each sample took.
+
+    Raises:
+        TypeError - The samples aren't arrays or tensors.
+    """
+    sizes = [len(sample) for sample in samples]
+
+    if all(_is_tensor(sample) for sample in samples):
+        return torch.cat(list(samples)), sizes
+    if all(isinstance(sample, np.ndarray) for sample in samples):
+        return np.concatenate(samples), sizes
+
+    raise TypeError(
+        f"Can't batch samples of type {type(samples[0]).__name__}. "
+        "Preprocess into arrays or tensors, or define infer_batch()."
+    )
+
+
+def split(batch: Any, sizes: Sequence[int]) -> List[Any]:
+    """Splits infer()'s output on a collated batch into one piece per sample."""
+    pieces = []
+    start = 0
+    for size in sizes:
+        pieces.append(batch[start : start + size])
+        start += size
+
+    return pieces
@@ -14,23 +14,28 @@ callback method allow us to bind a callback function to be called every time a
 network receives a message. We refer to classes with a callback function as
 inference engines, and they are used in PEERNet's CLI for offloaded inference. We
 implement enginize(), a method that turns either classes or objects passed in into
-a valid inference engine.
+a valid inference engine. Engines also get a batch_callback() method, which runs
+infer() once for a list of messages gathered by a BatchPool.
 """
 
 import importlib
 import sys
-from typing import Union, Type
+import time
+from typing import List, Union, Type
 
 from peernet.networks import Message
+from peernet.networks.compression import CompressedPayload, decompress
 from peernet.metrics import MetricLogger
-from peernet.metrics import Timer, Timing
+from peernet.metrics import Timer, Timing, Value
+from peernet.inference.batching import collate, split
 
 
-from peernet.inference import (
-    DummyModel,
-    TorchvisionPretrainedClassifier,
-    Inference,
-)
+from peernet.inference import DummyModel, Inference
+
+try:
+    from peernet.inference import TorchvisionPretrainedClassifier
+except ImportError:
+    TorchvisionPretrainedClassifier = None
 
 # logger setup
 import logging
@@ -44,7 +49,7 @@ logger.addHandler(ch)
 def enginize(
     model_class: Union[Type[Inference], Inference],
 ) -> Union[Type[Inference], Inference]:
-    """A class decorator that adds a "callback" method to model class.
+    """A class decorator that adds callback and batch_callback methods to model class.
 
     The implementation of this function is a little strange. We define a callback
     function, which calls and times the input's pipeline. We then
@@ -61,29 +66,36 @@ def enginize(
             with a callback function
     """
 
-    def callback(self, msg: Message):
-        """The callback function to add into the model_class class/object."""
-        # End the upload-time logger
+    def prepare(self, msg: Message):
+        """Ends the upload, and decompresses and preprocesses msg's data."""
+        # End the upload-time logger, unless the network did on arrival
         iter_l: MetricLogger = msg.logger
-        iter_l.end_sub("upload")
+        if iter_l.get_metric("upload") is None:
+            iter_l.end_sub("upload")
 
         # using timing context manager(s), time the calls to preprocess, inference, and
         # postprocess. We also check before to see if preprocess and postprocess exist.
         #  If they don't exist, we don't run and time them.
         x = msg.data
+        if isinstance(x, CompressedPayload):
+            with Timing(iter_l, "decompress"):
+                x = decompress(x)
+
         if hasattr(self, "preprocess") and callable(getattr(self, "preprocess")):
             with Timing(iter_l, "preprocessing"):
                 x = self.preprocess(x)
 
-        with Timing(iter_l, "inference"):
-            x = self.infer(x)
+        return x
 
+    def respond(self, msg: Message, x):
+        """Postprocesses an inference output, and packs the reply to msg."""
+        iter_l: MetricLogger = msg.logger
         if hasattr(self, "postprocess") and callable(getattr(self, "postprocess")):
             with Timing(iter_l, "postprocessing"):
                 x = self.postprocess(x)
 
-        # Pack the return message
-        ret = Message(x, iter_l)
+        # Pack the return message, answering the request's sequence number
+        ret = Message(x, iter_l, msg.seq)
 
         # Before opening a timer for download and returning the object to send back,
         # We should log how many bytes the object is. BUT, since we send an open
@@ -98,6 +110,35 @@ def enginize(
 
         return ret
 
+    def callback(self, msg: Message):
+        """The callback function to add into the model_class class/object."""
+        x = prepare(self, msg)
+
+        with Timing(msg.logger, "inference"):
+            x = self.infer(x)
+
+        return respond(self, msg, x)
+
+    def batch_callback(self, msgs: List[Message]) -> List[Message]:
+        """Like callback, but runs inference once for a batch of messages.
+
+        Every message logs the batch's inference time as its own.
+        """
+        xs = [prepare(self, msg) for msg in msgs]
+
+        start = time.time()
+        if hasattr(self, "infer_batch") and callable(getattr(self, "infer_batch")):
+            ys = self.infer_batch(xs)
+        else:
+            batch, sizes = collate(xs)
+            ys = split(self.infer(batch), sizes)
+        elapsed = time.time() - start
+
+        for msg in msgs:
+            msg.logger.log_section("inference", Value).end_collection(elapsed)
+
+        return [respond(self, msg, y) for msg, y in zip(msgs, ys)]
+
     # Add the callback function to model_class
     # model_class.callback = callback
 
@@ -106,13 +147,16 @@ def enginize(
     if isinstance(model_class, type):  # Check if target is a class
         logger.debug("Not monkeypatching, since a class was passed in")
         setattr(model_class, "callback", callback)
+        setattr(model_class, "batch_callback", batch_callback)
     else:  # target is an instance
         logger.debug("Monkeypatching, since an object was passed in")
-        setattr(
-            model_class,
-            "callback",
-            callback.__get__(model_class, model_class.__class__),
-        )
+        methods = {"callback": callback, "batch_callback": batch_callback}
+        for name, method in methods.items():
+            setattr(
+                model_class,
+                name,
+                method.__get__(model_class, model_class.__class__),
+            )
 
     return model_class
 
@@ -153,7 +197,13 @@ def get_engine(model_name: str, device: str) -> Inference:
 
     if model_name == "dummy":
         return enginize(DummyModel)()
-    elif model_name == "efficientnet_v2_s":
+
+    # Torchvision models need the torch option
+    torchvision = TorchvisionPretrainedClassifier is not None
+    if model_name.startswith("efficientnet") and not torchvision:
+        raise ImportError(f"The {model_name} model requires pytorch.")
+
+    if model_name == "efficientnet_v2_s":
         return enginize(TorchvisionPretrainedClassifier)(
             model_name="efficientnet_v2_s",
             model_weight_name="EfficientNet_V2_S_Weights",
@@ -7,6 +7,7 @@ manager for containers. See documentation for use of context managers for metric
 """
 
 from peernet.metrics.MetricLogger import MetricLogger
+from peernet.metrics.SingleValue import Value
 
 
 class Container(MetricLogger):
@@ -41,3 +42,30 @@ class ContainerNode:
     def __exit__(self, exc_type, exc_value, traceback):  # noqa: D105
         #Container does nothing on exit
         pass
+
+
+def pad_sections(iter_l: MetricLogger, template: MetricLogger):
+    """Gives an incomplete iteration NaN placeholders for the sections it's missing.
+
+    Rows written by to_csv() need the same sections, so iterations that were
+    dropped are padded to the layout of a completed one.
+
+    Args:
+        iter_l: MetricLogger - Logger of the incomplete iteration, padded in place
+        template: MetricLogger - Logger of a completed iteration
+    """
+    for child in iter_l.children:
+        if child.metric is None:
+            child.metric = float("nan")
+
+    names = {child.name: child for child in iter_l.children}
+    for section in template.children:
+        if section.name in names:
+            padded = names[section.name]
+        elif isinstance(section, Container):
+            padded = iter_l.log_section(section.name, Container)
+        else:
+            padded = iter_l.log_section(section.name, Value)
+            padded.end_collection(float("nan"))
+
+        pad_sections(padded, section)
@@ -5,4 +5,5 @@ from .Timer import Timer, Timing  # noqa: F401
 from .TokensPerSecond import TokensPerSecondMeter, TPSTracking  # noqa: F401
 from .MetricLogger import pd_from_csv  # noqa: F401
 from .SingleValue import Value, ValueNode  # noqa: F401
-from .Container import Container, ContainerNode  # noqa: F401
+from .Container import Container, ContainerNode, pad_sections  # noqa: F401
+from .wire import pack_logger, unpack_logger  # noqa: F401
@@ -0,0 +1,222 @@
+"""Compact binary wire encoding for MetricLogger trees.
+
+Every Message carries a MetricLogger subtree. Pickling that subtree sends
+class references, attribute names, and depths for every node, which can be
+larger than the payload for small messages like RandomString latency probes.
+
+pack_logger() instead writes:
+
+1. A header with a format version and the root depth. Depths of all other
+   nodes follow from their position in the tree.
+2. A string table for section names and string values. Names from
+   KNOWN_SECTIONS are interned: both sides already know them, so they are
+   sent as a 2 byte ID and never spelled out.
+3. One fixed-size record per node, in pre-order: node type, metric tag, name
+   ID, and child count. Timer-like nodes are followed by their start time,
+   and numeric metrics by a packed float64/int64.
+
+unpack_logger() rebuilds the same Timer/Value/Container/TokensPerSecondMeter
+nodes on the far side. Trees holding other node types, or more names, children
+or depth than the 2 byte fields above can hold, raise a TypeError, so callers
+can fall back to pickle.
+
+Typical usage example:
+    buf = pack_logger(iter_l)
+    iter_l = unpack_logger(buf)
+"""
+
+import pickle
+import struct
+from typing import Any, Dict, List, Tuple
+
+from peernet.metrics.MetricLogger import MetricLogger
+from peernet.metrics.Container import Container
+from peernet.metrics.SingleValue import Value
+from peernet.metrics.Timer import Timer
+from peernet.metrics.TokensPerSecond import TokensPerSecondMeter
+
+VERSION = 1
+
+# Section names used throughout PEERNet. Never reorder, only append: the
+# position in this tuple is the ID sent on the wire.
+KNOWN_SECTIONS: Tuple[str, ...] = (
+    "sensing",
+    "upload",
+    "download",
+    "preprocessing",
+    "inference",
+    "postprocessing",
+    "upload-encode",
+    "upload-decode",
+    "download-encode",
+    "download-decode",
+    "upload-bytes",
+    "download-bytes",
+    "upload-logger-bytes",
+    "download-logger-bytes",
+    "upload-throughput",
+    "download-throughput",
+)
+_KNOWN_IDS = {name: i for i, name in enumerate(KNOWN_SECTIONS)}
+
+# Node type code -> (class, metric_name set by that class' constructor)
+_NODE_TYPES: List[Tuple[type, str]] = [
+    (Container, "Container"),
+    (Timer, "Time"),
+    (Value, "Value"),
+    (TokensPerSecondMeter, "Tokens Per Second"),
+]
+_TYPE_CODES = {cls: code for code, (cls, _) in enumerate(_NODE_TYPES)}
+_TIMED = (Timer, TokensPerSecondMeter)
+
+# Metric tags
+_NONE, _FLOAT, _INT, _STR, _TRUE, _FALSE, _PICKLE = range(7)
+
+_HEADER = struct.Struct("<BHH")  # version, root depth, string table size
+_NODE = struct.Struct("<BBHH")  # type code, metric tag, name id, child count
+_F64 = struct.Struct("<d")
+_I64 = struct.Struct("<q")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_U16_MAX = 2**16 - 1
+
+
+def _u16(value: int, what: str) -> int:
+    """Returns value, if it fits the format's 2 byte fields."""
+    if value > _U16_MAX:
+        raise TypeError(f"No wire encoding for {value} {what}, at most {_U16_MAX}")
+    return value
+
+
+def pack_logger(root: MetricLogger) -> bytes:
+    """Encodes a MetricLogger tree into the compact wire format.
+
+    Args:
+        root: MetricLogger - Root of the tree to encode.
+
+    Returns:
+        bytes - Encoded tree.
+
+    Raises:
+        TypeError: The tree holds a node type without a wire encoding, or is
+            too large for the format.
+    """
+    strings: Dict[str, int] = {}
+    records: List[bytes] = []
+
+    def intern(s: str) -> int:
+        if s in _KNOWN_IDS:
+            return _KNOWN_IDS[s]
+        if s not in strings:
+            strings[s] = _u16(len(KNOWN_SECTIONS) + len(strings), "string IDs")
+        return strings[s]
+
+    def visit(node: MetricLogger) -> None:
+        code = _TYPE_CODES.get(type(node))
+        if code is None:
+            raise TypeError(f"No wire encoding for node type {type(node)}")
+
+        metric = node.metric
+        extra = b""
+        if code == 0 or metric is None:
+            tag = _NONE
+        elif metric is True:
+            tag = _TRUE
+        elif metric is False:
+            tag = _FALSE
+        elif isinstance(metric, float):
+            tag, extra = _FLOAT, _F64.pack(metric)
+        elif isinstance(metric, int) and -(2**63) <= metric < 2**63:
+            tag, extra = _INT, _I64.pack(metric)
+        elif isinstance(metric, str):
+            tag, extra = _STR, _U16.pack(intern(metric))
+        else:
+            blob = pickle.dumps(metric, protocol=5)
+            tag, extra = _PICKLE, _U32.pack(len(blob)) + blob
+
+        num_children = _u16(len(node.children), "children")
+        records.append(_NODE.pack(code, tag, intern(node.name), num_children))
+        if isinstance(node, _TIMED):
+            records.append(_F64.pack(node.start))
+        records.append(extra)
+
+        for child in node.children:
+            visit(child)
+
+    visit(root)
+
+    table = []
+    for s in strings:
+        encoded = s.encode()
+        table.append(_U16.pack(_u16(len(encoded), "bytes in a string")) + encoded)
+
+    header = _HEADER.pack(VERSION, _u16(root.depth, "levels of depth"), len(strings))
+    return b"".join([header, *table, *records])
+
+
+def unpack_logger(buffer: Any) -> MetricLogger:
+    """Rebuilds a MetricLogger tree from the compact wire format.
+
+    Args:
+        buffer: Any - Bytes-like object produced by pack_logger().
+
+    Returns:
+        MetricLogger - Root of the rebuilt tree.
+    """
+    view = memoryview(buffer)
+    version, root_depth, num_strings = _HEADER.unpack_from(view)
+    if version != VERSION:
+        raise ValueError(f"Unsupported logger wire format version {version}")
+
+    offset = _HEADER.size
+    names = list(KNOWN_SECTIONS)
+    for _ in range(num_strings):
+        (length,) = _U16.unpack_from(view, offset)
+        offset += _U16.size
+        names.append(bytes(view[offset : offset + length]).decode())
+        offset += length
+
+    def read(depth: int) -> MetricLogger:
+        nonlocal offset
+        code, tag, name_id, num_children = _NODE.unpack_from(view, offset)
+        offset += _NODE.size
+
+        cls, metric_name = _NODE_TYPES[code]
+        node = cls.__new__(cls)
+        node.name = names[name_id]
+        node.depth = depth
+        node.metric_name = metric_name
+        node.end = None
+
+        if cls in _TIMED:
+            (node.start,) = _F64.unpack_from(view, offset)
+            offset += _F64.size
+
+        if code == 0:
+            node.metric = "No Metric"
+        elif tag == _NONE:
+            node.metric = None
+        elif tag == _TRUE:
+            node.metric = True
+        elif tag == _FALSE:
+            node.metric = False
+        elif tag == _FLOAT:
+            (node.metric,) = _F64.unpack_from(view, offset)
+            offset += _F64.size
+        elif tag == _INT:
+            (node.metric,) = _I64.unpack_from(view, offset)
+            offset += _I64.size
+        elif tag == _STR:
+            (string_id,) = _U16.unpack_from(view, offset)
+            node.metric = names[string_id]
+            offset += _U16.size
+        else:
+            (length,) = _U32.unpack_from(view, offset)
+            offset += _U32.size
+            node.metric = pickle.loads(view[offset : offset + length])
+            offset += length
+
+        node.children = [read(depth + 1) for _ in range(num_children)]
+        return node
+
+    return read(root_depth)
@@ -0,0 +1,189 @@
+"""Asyncio implementation of ZMQ_Pair, built on zmq.asyncio.
+
+AsyncZMQ_Pair sets up exactly the same sockets as ZMQ_Pair, from the same
+device config, and exchanges the same Messages. send(), recv() and poll() are
+coroutines instead of blocking calls, so PEERNet profiling can be embedded in
+asyncio robot stacks, and many peers can be driven from one event loop without
+a thread per socket. recv_any() is a coroutine too. stream(), serve() and
+ClockSync block on the network, so they raise a TypeError here.
+
+Typical usage example:
+    network = AsyncZMQ_Pair(device_name="robot1", **net_config)
+
+    async def step(sample):
+        await network.send("server", Message(sample, iter_l), "upload-encode")
+        return await network.recv("server", "download-decode")
+"""
+
+import inspect
+
+import zmq
+import zmq.asyncio
+
+from peernet.networks import NO_REPLY, Message, TransferStats, ZMQ_Pair
+from peernet.networks.trace import RECV, SEND
+from peernet.metrics import Timer
+
+
+class AsyncZMQ_Pair(ZMQ_Pair):
+    """ZMQ_Pair with awaitable send, recv and poll."""
+
+    _context_class = zmq.asyncio.Context
+    _poller_class = zmq.asyncio.Poller
+
+    async def send(self, destination: str, data, section_name=None) -> TransferStats:
+        """Send (data) to destination.
+
+        destination - a hostname, not an IP
+        section_name - if data is a Message, log its encoding time under this name
+
+        Returns the wire sizes of the sent message, also kept in self.last_send.
+        """
+        socket = self._send_socket(destination)
+
+        frames = self.serializer.dumps(data, section_name)
+        await socket.send_multipart(frames, copy=False)
+
+        self.last_send = TransferStats.from_frames(frames)
+        self._record(SEND, destination, frames, self.last_send.nbytes)
+        return self.last_send
+
+    async def send_with_timing(self, destination: str, data, logger, section_name):
+        """Sends with timing using our serialized logger format."""
+        msg = Message(data, logger)
+
+        msg.logger.log_section(section_name, Timer)
+
+        await self.send(destination, msg, f"{section_name}-encode")
+
+    async def recv(self, source: str, section_name=None):
+        """Wait to receive data from source without blocking the event loop.
+
+        section_name - if a Message arrives, log its decoding time under this name
+        """
+        return await self._recv_from(self._recv_socket(source), section_name)
+
+    async def _recv_from(self, socket, section_name=None, flags=0):
+        """Receives and deserializes one message, recording its wire sizes."""
+        frames = await socket.recv_multipart(flags, copy=False)
+        self.last_recv = TransferStats.from_frames(frames)
+        self.last_source = self.recv_socket_mapping[socket]
+        self._record(RECV, self.last_source, frames, self.last_recv.nbytes)
+        return self.serializer.loads(frames, section_name)
+
+    async def recv_with_timing(
+        self, source: str, logger, section_name, log_bytes=True
+    ):
+        """Receives with timing using our serialized logger format."""
+        recv_msg = await self.recv(source, f"{section_name}-decode")
+        return self._finish_recv_with_timing(
+            recv_msg, logger, section_name, log_bytes, source
+        )
+
+    async def poll(
+        self,
+        max_msg_count=None,
+        callback=None,
+        decode_section=None,
+        encode_section=None,
+        timeout=None,
+        stop=None,
+        ack=True,
+    ) -> int:
+        """Polls for messages from all peers, replying to each.
+
+        Takes the same arguments as BaseNetwork.poll. Only this task waits; the
+        rest of the event loop keeps running. The callback may be a plain
+        function or a coroutine function.
+
+        Returns:
+            int - Number of messages handled.
+        """
+        handled = 0
+
+        while max_msg_count is None or handled < max_msg_count:
+            if stop is not None and stop():
+                break
+
+            received = await self._recv_next(decode_section, timeout)
+            if received is None:
+                break
+
+            source, msg = received
+            if await self._handle(source, msg, callback, encode_section, ack):
+                handled += 1
+
+        return handled
+
+    async def recv_any(self, section_name=None, timeout=None):
+        """Waits until a message arrives from any peer, and returns it.
+
+        Works as BaseNetwork.recv_any does, without blocking the event loop.
+
+        Raises:
+            zmq.Again - Nothing arrived in time.
+        """
+        if timeout is None and self.rcvtimeo is not None:
+            timeout = self.rcvtimeo / 1000
+
+        received = []
+
+        def keep(msg):
+            received.append(msg)
+            return NO_REPLY
+
+        if not await self.poll(1, keep, decode_section=section_name, timeout=timeout):
+            raise self._timeout_error()
+        return received[0]
+
+    def stream(self, *args, **kwargs):
+        """Not supported, as streaming blocks while it polls.
+
+        Raises:
+            TypeError - Always. Await poll() instead.
+        """
+        raise TypeError("AsyncZMQ_Pair doesn't support stream(), await poll()")
+
+    def serve(self, *args, **kwargs):
+        """Not supported, as serving blocks on the poll loop.
+
+        Raises:
+            TypeError - Always. Await poll() with a coroutine callback instead.
+        """
+        raise TypeError("AsyncZMQ_Pair doesn't support serve(), await poll()")
+
+    async def _recv_next(self, section_name=None, timeout=None):
+        """Receives the next message from any peer, as ZMQ_Pair does."""
+        while True:
+            while self._ready:
+                receiver = self._ready[0]
+                try:
+                    msg = await self._recv_from(receiver, section_name, zmq.NOBLOCK)
+                except zmq.Again:
+                    self._ready.popleft()
+                    continue
+                return self.recv_socket_mapping[receiver], msg
+
+            self.connect_peers(self.peers)
+            timeout_ms = None if timeout is None else int(timeout * 1000)
+            ready = await self.poller.poll(timeout_ms)
+            if not ready:
+                return None
+            self._ready.extend(receiver for receiver, _ in ready)
+
+    async def _handle(
+        self, source: str, msg, callback=None, encode_section=None, ack=True
+    ) -> bool:
+        """Replies to a message poll() received, as BaseNetwork._handle does."""
+        answer = self._answer_control(msg)
+        if answer is not None:
+            await self.send(source, answer)
+            return False
+
+        call_out = self._call_back(msg, callback, ack)
+        if inspect.isawaitable(call_out):
+            call_out = await call_out
+
+        if self._replies(call_out, ack):
+            await self.send(source, call_out, encode_section)
+        return True
@@ -1,14 +1,59 @@
 """Base class for other network types to inherit."""
 
 import logging
+from concurrent.futures import FIRST_COMPLETED, wait
 from peernet.utils import ch
+from peernet.networks.serializers import Serializer, get_serializer
+from peernet.networks.TransferStats import TransferStats
+from peernet.networks.Messages import NO_REPLY, ControlMessage, Message
+from peernet.networks.trace import RECV, SEND, TraceWriter
+from peernet.networks.tuning import Tuning
+from peernet.metrics import Timer, Value
+
+from typing import Any, Iterable, Mapping, Optional, Union
 
 
 class BaseNetwork:
-    """An abstract class that specific network types will inherit from."""
+    """An abstract class that specific network types will inherit from.
+
+    Subclasses implement send(destination, data, section_name=None),
+    recv(source, section_name=None) and _recv_next(section_name, timeout), and
+    get send_with_timing(), recv_with_timing() and poll() on top of them.
+    poll() answers ControlMessages itself, and doesn't reply when the callback
+    returns NO_REPLY, which stream() and serve() build on.
+    """
+
+    # Raised by recv() and recv_any() when nothing arrives in time. ZMQ networks
+    # raise zmq.Again instead, as their sockets do.
+    _timeout_error = TimeoutError
+
+    def __init__(
+        self,
+        devices,
+        verbose=0,
+        serializer: Union[str, Serializer] = "pickle",
+        record: Optional[str] = None,
+        record_payloads: bool = True,
+        tuning: Optional[Mapping[str, Any]] = None,
+        *args,
+        **kwargs,
+    ):
+        """Constructor.
 
-    def __init__(self, devices, verbose=0, *args, **kwargs):
-        """Constructor."""
+        Args:
+            devices: dict - Mapping of device names to dns names/ip addresses.
+            verbose: int - 0/1/2 scale for logging verbosity.
+            serializer: Union[str, Serializer] - Serializer name registered in
+                peernet.networks.serializers, or a Serializer instance.
+            record: str - If given, write every message sent and received to a
+                trace file at this path. See peernet.networks.trace.
+            record_payloads: bool - Whether the trace includes message frames,
+                or only their sizes and timing.
+            tuning: Mapping - ZMQ context and socket options, for networks
+                built on ZMQ. See peernet.networks.tuning.
+            *args: Ignored, so subclasses can pass their arguments on.
+            **kwargs: Ignored, so subclasses can pass their arguments on.
+        """
         # logger setup
         self.logger = logging.getLogger("BaseNetwork")
         if verbose == 0:
@@ -25,6 +70,431 @@ class BaseNetwork:
         self.name_to_ip = devices
         self.ip_to_name = {ip: name for name, ip in devices.items()}
 
+        # How objects are turned into frames on the wire
+        self.serializer = get_serializer(serializer)
+
+        # Wire sizes of the most recent send and receive
+        self.last_send = TransferStats()
+        self.last_recv = TransferStats()
+
+        # Device the most recent message came from
+        self.last_source = None
+
+        # Milliseconds recv() and recv_any() wait before raising _timeout_error,
+        # for lossy networks. None waits forever.
+        self.rcvtimeo = None
+
+        # Seconds spent setting up connections to each peer, for networks that
+        # connect on first contact
+        self.setup_times = dict()
+
+        # ZMQ options, set by subclasses on their context and sockets
+        self.tuning = Tuning.from_config(tuning)
+
+        # ClockSync estimators by peer, registered by ClockSync itself
+        self.clocks = dict()
+
+        # Trace of every message, for replay
+        self.recorder = None
+        if record is not None:
+            self.recorder = TraceWriter(
+                record, list(devices), self.serializer.name, record_payloads
+            )
+
+    def connect_peers(self, peers: Iterable[str]) -> float:
+        """Sets up connections to peers now, rather than on first contact.
+
+        Networks that connect to every device up front have nothing to do.
+
+        Returns:
+            float - Seconds spent setting up connections that didn't exist yet.
+        """
+        return 0.0
+
+    def poll(
+        self,
+        max_msg_count=None,
+        callback=None,
+        decode_section=None,
+        encode_section=None,
+        timeout=None,
+        stop=None,
+        ack=True,
+    ) -> int:
+        """Handles messages from any device, replying to each sender.
+
+        Args:
+            max_msg_count: int - Return after handling this many messages.
+                None polls until timeout or stop says otherwise.
+            callback: Callable - Called with each message; its return value is
+                sent back to the sender, None included, unless it's NO_REPLY.
+                Without a callback, we send "ack", unless ack is False.
+            decode_section: str - If given, log the time spent decoding
+                received Messages under this name.
+            encode_section: str - If given, log the time spent encoding
+                replies under this name.
+            timeout: float - Return if no message arrives for this many seconds.
+            stop: Callable[[], bool] - Checked after every message. Return once
+                it returns True.
+            ack: bool - Whether to send "ack" when there's no callback. If
+                False, None results aren't sent back either, so one-way streams
+                cost no reverse traffic, and only actual results go back.
+
+        Returns:
+            int - Number of messages handled.
+        """
+        handled = 0
+
+        while max_msg_count is None or handled < max_msg_count:
+            if stop is not None and stop():
+                break
+
+            received = self._recv_next(decode_section, timeout)
+            if received is None:
+                break
+
+            source, msg = received
+            if self._handle(source, msg, callback, encode_section, ack):
+                handled += 1
+
+        return handled
+
+    def _recv_next(self, section_name=None, timeout: Optional[float] = None):
+        """Waits for the next message from any device, for poll().
+
+        Args:
+            section_name: str - If a Message arrives, log its decoding time
+                under this name.
+            timeout: float - Seconds to wait. None waits forever.
+
+        Returns:
+            Tuple[str, Any] - The sender and the message, or None if nothing
+                arrived in time.
+        """
+        raise NotImplementedError("Subclass must implement _recv_next method")
+
+    def _handle(
+        self, source: str, msg, callback=None, encode_section=None, ack=True
+    ) -> bool:
+        """Replies to a message poll() received, as poll() describes.
+
+        Control messages are answered right away, and don't count. Those
+        without an answer are replies, passed to the callback.
+
+        Returns:
+            bool - Whether msg counts towards poll()'s max_msg_count.
+        """
+        answer = self._answer_control(msg)
+        if answer is not None:
+            self.send(source, answer)
+            return False
+
+        call_out = self._call_back(msg, callback, ack)
+        if self._replies(call_out, ack):
+            self.send(source, call_out, encode_section)
+        return True
+
+    @staticmethod
+    def _answer_control(msg):
+        """Returns what a control message asks to be sent back, if anything."""
+        if isinstance(msg, ControlMessage):
+            return msg.answer()
+
+        return None
+
+    @staticmethod
+    def _call_back(msg, callback=None, ack=True):
+        """Returns the callback's reply to msg, or without one, "ack" if ack."""
+        if callback:
+            return callback(msg)
+
+        return "ack" if ack else None
+
+    @staticmethod
+    def _replies(call_out, ack=True) -> bool:
+        """Whether call_out is sent back, as poll() describes."""
+        if call_out is NO_REPLY:
+            return False
+
+        return ack or call_out is not None
+
+    def recv_any(self, section_name=None, timeout: Optional[float] = None):
+        """Blocks until a message arrives from any device, and returns it.
+
+        The sender is in last_source. Built on poll(), so control messages are
+        answered along the way, and nothing is sent back for this one.
+
+        Args:
+            section_name: str - If a Message arrives, log its decoding time
+                under this name.
+            timeout: float - Seconds to wait. Defaults to rcvtimeo.
+
+        Raises:
+            TimeoutError - Nothing arrived in time. ZMQ networks raise zmq.Again,
+                as recv() does.
+        """
+        if timeout is None and self.rcvtimeo is not None:
+            timeout = self.rcvtimeo / 1000
+
+        received = []
+
+        def keep(msg):
+            received.append(msg)
+            return NO_REPLY
+
+        if not self.poll(1, keep, decode_section=section_name, timeout=timeout):
+            raise self._timeout_error()
+        return received[0]
+
+    def send_with_timing(self, destination: str, data, logger, section_name):
+        """Sends with timing using our serialized logger format."""
+        msg = Message(data, logger)
+
+        msg.logger.log_section(section_name, Timer)
+
+        self.send(destination, msg, f"{section_name}-encode")
+
+    def recv_with_timing(self, source: str, logger, section_name, log_bytes=True):
+        """Receives with timing using our serialized logger format."""
+        recv_msg = self.recv(source, f"{section_name}-decode")
+        return self._finish_recv_with_timing(
+            recv_msg, logger, section_name, log_bytes, source
+        )
+
+    def _finish_recv_with_timing(
+        self, recv_msg, logger, section_name, log_bytes, source=None
+    ):
+        """Ends the timed section of a received Message and copies its logger.
+
+        The section was started on source, so if we keep a ClockSync for
+        source, its clock offset is taken out.
+        """
+        recv_msg.logger.end_sub(section_name)
+        if source in self.clocks:
+            self.clocks[source].correct(recv_msg.logger, inbound=[section_name])
+
+        # Byte counts come from the frames we just received, so they're free
+        if log_bytes:
+            recv_msg.logger.log_section(
+                f"{section_name}-msg-bytes", Value
+            ).end_collection(self.last_recv.nbytes)
+            recv_msg.logger.log_section(
+                f"{section_name}-data-bytes", Value
+            ).end_collection(self.last_recv.payload_bytes)
+
+        logger.copy_from(recv_msg.logger)
+
+        return recv_msg.data
+
+    def stream(
+        self,
+        queue,
+        callback=None,
+        max_msg_count=None,
+        decode_section=None,
+        encode_section=None,
+        timeout=None,
+        stop=None,
+        ack=True,
+        arrival_section=None,
+        queue_section=None,
+    ) -> int:
+        """Serves messages through a FrameQueue, dropping stale ones when behind.
+
+        Everything waiting on the network is moved into queue before the next
+        message is processed, so slow processing never stalls senders. Replies
+        work as in poll(). Dropped Messages are answered with
+        Message(None, logger, seq), with dropped = 1 logged, so senders can
+        account for them. Anything else that's dropped is discarded.
+
+        Args:
+            queue: FrameQueue - Holds messages waiting to be processed.
+            callback: Callable - Called with each message that isn't dropped;
+                replies work as in poll().
+            max_msg_count: int - Return once this many messages were received,
+                and all of them processed or dropped.
+            decode_section: str - If given, log the time spent decoding
+                received Messages under this name.
+            encode_section: str - If given, log the time spent encoding
+                replies under this name.
+            timeout: float - Return if no message arrives for this many seconds
+                while the queue is empty.
+            stop: Callable[[], bool] - Checked between messages. Return once it
+                returns True.
+            ack: bool - Whether to send "ack" when there's no callback, as in
+                poll().
+            arrival_section: str - If given, end this section of Messages'
+                loggers when they arrive, so it doesn't include time queued.
+            queue_section: str - If given, log the time Messages spend queued
+                as a Timer section with this name, and the number of messages
+                dropped since the previous processed one as
+                {queue_section}-drops.
+
+        Returns:
+            int - Number of messages received.
+        """
+        received = 0
+        dropped_before = queue.dropped
+
+        def enqueue(msg):
+            nonlocal received
+            received += 1
+
+            if isinstance(msg, Message):
+                if arrival_section:
+                    msg.logger.end_sub(arrival_section)
+                if queue_section:
+                    msg.logger.log_section(queue_section, Timer)
+
+            self._answer_dropped(queue.push((self.last_source, msg)))
+
+            # Replies wait until the message is processed
+            return NO_REPLY
+
+        while max_msg_count is None or received < max_msg_count or queue:
+            if stop is not None and stop():
+                break
+
+            # Wait for something to do, then take in everything else waiting
+            if not queue and not self.poll(1, enqueue, decode_section, timeout=timeout):
+                break
+            remaining = None if max_msg_count is None else max_msg_count - received
+            self.poll(remaining, enqueue, decode_section, timeout=0)
+
+            (source, msg), stale = queue.pop()
+            self._answer_dropped(stale)
+
+            if isinstance(msg, Message) and queue_section:
+                msg.logger.end_sub(queue_section)
+                msg.logger.log_section(f"{queue_section}-drops", Value).end_collection(
+                    queue.dropped - dropped_before
+                )
+                dropped_before = queue.dropped
+
+            call_out = self._call_back(msg, callback, ack)
+            if self._replies(call_out, ack):
+                self.send(source, call_out, encode_section)
+
+        return received
+
+    def serve(
+        self,
+        pool,
+        callback,
+        max_msg_count=None,
+        decode_section=None,
+        encode_section=None,
+        timeout=None,
+        stop=None,
+        arrival_section=None,
+        queue_section=None,
+        tick=0.001,
+    ) -> int:
+        """Serves messages on a WorkerPool, replying as results complete.
+
+        Receiving carries on while workers run, so a slow callback doesn't hold
+        up other senders, and control messages are answered right away. Replies
+        work as in poll(), but may go out in a different order than requests
+        came in.
+
+        Args:
+            pool: WorkerPool - Runs the callback.
+            callback: Callable - Called with each message on a worker.
+            max_msg_count: int - Return once this many messages were received,
+                and all of them answered. Once they're all in, nothing more is
+                received, control messages included.
+            decode_section: str - If given, log the time spent decoding
+                received Messages under this name.
+            encode_section: str - If given, log the time spent encoding
+                replies under this name.
+            timeout: float - Return if no message arrives for this many seconds.
+                With work running, this only counts once it's all done.
+            stop: Callable[[], bool] - Checked between messages. Return once it
+                returns True, without waiting for running work.
+            arrival_section: str - If given, end this section of Messages'
+                loggers when they arrive, so it doesn't include time queued.
+            queue_section: str - If given, log the time Messages wait for a
+                worker as a Timer section with this name.
+            tick: float - Seconds between checks on the workers while waiting
+                for messages.
+
+        Returns:
+            int - Number of messages received.
+        """
+        received = 0
+        running = dict()
+
+        def submit(msg):
+            nonlocal received
+            received += 1
+
+            if isinstance(msg, Message):
+                if arrival_section:
+                    msg.logger.end_sub(arrival_section)
+                if queue_section:
+                    msg.logger.log_section(queue_section, Timer)
+
+            running[pool.submit(callback, msg, queue_section)] = self.last_source
+
+            # Replies wait until the worker is done
+            return NO_REPLY
+
+        def finished():
+            return any(future.done() for future in running) or (
+                stop is not None and stop()
+            )
+
+        while max_msg_count is None or received < max_msg_count or running:
+            if stop is not None and stop():
+                break
+
+            # Wait for a request while idle, take in requests until a result is
+            # ready while busy, and only wait on workers once every request is in
+            remaining = None if max_msg_count is None else max_msg_count - received
+            if remaining == 0:
+                wait(running, return_when=FIRST_COMPLETED)
+            elif not running:
+                polled = self.poll(
+                    1, submit, decode_section, timeout=timeout, stop=stop
+                )
+                if not polled:
+                    break
+            else:
+                self.poll(
+                    remaining, submit, decode_section, timeout=tick, stop=finished
+                )
+
+            for future in [future for future in running if future.done()]:
+                source = running.pop(future)
+                call_out = future.result()
+                if self._replies(call_out):
+                    self.send(source, call_out, encode_section)
+
+        return received
+
+    def _answer_dropped(self, frames):
+        """Tells the senders of dropped Messages that they were dropped."""
+        for source, msg in frames:
+            if isinstance(msg, Message):
+                msg.logger.log_section("dropped", Value).end_collection(1)
+                self.send(source, Message(None, msg.logger, msg.seq))
+
+    def close(self):
+        """Closes the trace, if recording. Subclasses also close their sockets."""
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def _record(self, kind: bytes, peer: str, frames, nbytes: int) -> None:
+        """Adds a message sent to, or received from, peer to the trace."""
+        if self.recorder is None:
+            return
+
+        if kind == SEND:
+            self.recorder.write(kind, self.name, peer, frames, nbytes)
+        else:
+            self.recorder.write(RECV, peer, self.name, frames, nbytes)
+
     def get_ip(self, hostname: str) -> str:
         """Given a hostname, returns the dns/ip.
         
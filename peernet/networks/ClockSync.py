@@ -0,0 +1,224 @@
+"""Clock offset estimation between two devices, for one-way delays.
+
+Timers use time.time(), so a section started on one device and ended on
+another, like upload and download, measures the one-way delay plus the
+difference between the two clocks. ClockSync runs an NTP-style exchange over an
+existing network: we send a ClockProbe stamped with our send time t0, the peer
+stamps its receive and send times t1 and t2 inside poll(), and we stamp the
+reply's arrival t3. Each exchange gives
+
+    offset = ((t1 - t0) + (t2 - t3)) / 2    (peer clock minus ours)
+    delay = (t3 - t0) - (t2 - t1)
+
+Like NTP, each sync keeps the sample with the smallest delay, whose offset is
+off by at most delay / 2. Offsets from successive syncs are fitted to a line,
+so drift between syncs is corrected too.
+
+Typical usage example:
+    clock = ClockSync(network, "server", interval=30)
+    clock.sync()
+    ...
+    clock.maybe_sync()
+    clock.correct(iter_l, outbound=["upload"], inbound=["download"])
+    clock.log(iter_l)
+"""
+
+import inspect
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+import zmq
+
+from peernet.metrics import Value
+from peernet.metrics.MetricLogger import MetricLogger
+from peernet.networks.Messages import ControlMessage
+
+
+@dataclass
+class ClockProbe(ControlMessage):
+    """Control message for clock sync, answered by the peer's poll().
+
+    Attributes:
+        t0: float - When we sent the probe, on our clock.
+        t1: float - When the peer received it, on its clock.
+        t2: float - When the peer sent the reply, on its clock.
+    """
+
+    t0: float
+    t1: Optional[float] = None
+    t2: Optional[float] = None
+
+    def answer(self) -> Optional["ClockProbe"]:
+        """Stamps the probe on the peer, as soon as it's been received.
+
+        Replies, already stamped, aren't answered again.
+        """
+        if self.t1 is not None:
+            return None
+
+        self.t1 = time.time()
+        self.t2 = time.time()
+        return self
+
+
+class ClockSync:
+    """Estimates the offset and drift of a peer's clock relative to ours."""
+
+    def __init__(
+        self,
+        network,
+        peer: str,
+        rounds: int = 8,
+        interval: Optional[float] = None,
+        history: int = 16,
+    ):
+        """Constructor.
+
+        Registers itself in network.clocks, so network.recv_with_timing()
+        corrects sections the peer started.
+
+        Args:
+            network: BaseNetwork - Network to exchange probes over. The peer
+                answers them as long as it's in poll().
+            peer: str - Device to synchronize with.
+            rounds: int - Probes per sync.
+            interval: float - Seconds between syncs for maybe_sync(). None
+                only syncs when sync() is called.
+            history: int - Number of syncs the drift is fitted over.
+
+        Raises:
+            TypeError - network's send() is a coroutine, as in AsyncZMQ_Pair.
+        """
+        if inspect.iscoroutinefunction(network.send):
+            raise TypeError("ClockSync needs a network with blocking send and recv")
+
+        self.network = network
+        self.peer = peer
+        self.rounds = rounds
+        self.interval = interval
+
+        # (local time, offset, delay) of the best sample of each sync
+        self.samples = deque(maxlen=history)
+        self.last_sync = None
+
+        network.clocks[peer] = self
+
+    def sync(self) -> None:
+        """Exchanges probes with the peer, and keeps the one with least delay.
+
+        Must be called while nothing else is in flight to the peer, on a
+        network with blocking send() and recv(). Probes that time out, like
+        lost UDP datagrams, are skipped.
+        """
+        best = None
+        for _ in range(self.rounds):
+            probe = ClockProbe(time.time())
+            self.network.send(self.peer, probe)
+
+            try:
+                reply = self.network.recv(self.peer)
+                t3 = time.time()
+            except (zmq.Again, TimeoutError):
+                continue
+
+            # Late replies to probes that timed out are ignored
+            if not isinstance(reply, ClockProbe) or reply.t0 != probe.t0:
+                continue
+
+            offset = ((reply.t1 - reply.t0) + (reply.t2 - t3)) / 2
+            delay = (t3 - reply.t0) - (reply.t2 - reply.t1)
+            if best is None or delay < best[2]:
+                best = ((reply.t0 + t3) / 2, offset, delay)
+
+        self.last_sync = time.time()
+        if best is not None:
+            self.samples.append(best)
+
+    @property
+    def due(self) -> bool:
+        """Whether interval has passed since the last sync."""
+        if self.interval is None:
+            return False
+
+        return self.last_sync is None or time.time() - self.last_sync >= self.interval
+
+    def maybe_sync(self) -> bool:
+        """Syncs again if it's due.
+
+        Returns:
+            bool - Whether a sync happened.
+        """
+        if not self.due:
+            return False
+
+        self.sync()
+        return True
+
+    @property
+    def drift(self) -> float:
+        """Seconds the offset changes by per second, 0 until we've synced twice."""
+        if len(self.samples) < 2:
+            return 0.0
+
+        t, offset, _ = np.array(self.samples).T
+        return np.polyfit(t - t[0], offset, 1)[0]
+
+    @property
+    def uncertainty(self) -> float:
+        """Maximum error of the latest offset estimate, half its round trip."""
+        if not self.samples:
+            return float("nan")
+
+        return self.samples[-1][2] / 2
+
+    def offset_at(self, when: Optional[float] = None) -> float:
+        """Estimated peer clock minus our clock, at time when (default now)."""
+        if not self.samples:
+            return 0.0
+
+        when = time.time() if when is None else when
+        t, offset, _ = self.samples[-1]
+        return offset + self.drift * (when - t)
+
+    def correct(
+        self,
+        logger: MetricLogger,
+        outbound: Iterable[str] = (),
+        inbound: Iterable[str] = (),
+    ) -> None:
+        """Removes the clock offset from timers that crossed between devices.
+
+        Args:
+            logger: MetricLogger - Tree holding the timers
+            outbound: Iterable[str] - Sections started here and ended on the peer
+            inbound: Iterable[str] - Sections started on the peer and ended here
+        """
+        offset = self.offset_at()
+
+        for name, sign in [(n, -1) for n in outbound] + [(n, 1) for n in inbound]:
+            section = _find_section(logger, name)
+            if section is not None and isinstance(section.metric, float):
+                section.metric += sign * offset
+
+    def log(self, logger: MetricLogger) -> None:
+        """Logs the current offset as clock-offset, and its uncertainty."""
+        logger.log_section("clock-offset", Value).end_collection(self.offset_at())
+        logger.log_section("clock-offset-uncertainty", Value).end_collection(
+            self.uncertainty
+        )
+
+
+def _find_section(logger: MetricLogger, name: str) -> Optional[MetricLogger]:
+    """Returns the first node named name in logger's tree, depth first."""
+    if logger.name == name:
+        return logger
+
+    for child in logger.children:
+        found = _find_section(child, name)
+        if found is not None:
+            return found
+
+    return None
@@ -0,0 +1,405 @@
+"""User-space network impairment, wrapping any BaseNetwork.
+
+Benchmarks on one machine run over loopback, which has none of the latency,
+bandwidth limits, loss or reordering of the links PEERNet is deployed on. Tools
+like tc/netem emulate those, but need root. ImpairedNetwork does it in user
+space instead: messages a device receives are held in a delay line until a
+link with the configured properties would have delivered them.
+
+1. bandwidth - a token bucket of burst bytes, refilled at bandwidth bits per
+   second. Messages wait until the bucket can pay for them.
+2. latency - added to every message after that, drawn from a distribution
+   with the given mean and jitter (standard deviation): "constant", "uniform",
+   "normal", or the heavy-tailed "pareto".
+3. loss - the probability a message is dropped. recv() raises the wrapped
+   network's timeout error (zmq.Again for ZMQ networks) after rcvtimeo
+   milliseconds without a message, like ZMQ_UDP.
+4. reorder - the probability a message is held back an extra reorder_delay
+   seconds, so the ones behind it overtake it. Jitter reorders too.
+
+Impairment applies to inbound traffic, so each device emulates the link
+towards itself. With both devices wrapped, both directions are impaired.
+Control messages (clock sync probes, pings) are answered by the wrapped
+network as soon as they arrive, so only their replies are impaired.
+
+Profiles are loaded from the "impairment" key of a network config, either as
+settings or as the name of a preset in PROFILES with settings overriding it.
+Settings under a device's name apply only to traffic into that device:
+
+    impairment:
+      profile: lte
+      loss: 0.01
+      server:
+        bandwidth: 5e6  # slower uplink
+
+Typical usage example:
+    network = ImpairedNetwork.from_config(ZMQ_Pair("client", **config), config)
+"""
+
+import heapq
+import itertools
+import time
+from typing import Any, Dict, Mapping, Optional
+
+import numpy as np
+
+from peernet.networks.BaseNetwork import BaseNetwork
+from peernet.networks.Messages import NO_REPLY
+
+# logger setup
+import logging
+from peernet.utils import ch
+
+logger = logging.getLogger("ImpairedNetwork")
+logger.setLevel(logging.WARNING)
+logger.addHandler(ch)
+
+DISTRIBUTIONS = ("constant", "uniform", "normal", "pareto")
+
+# Rough figures for common access links, one way
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "wifi": dict(latency=0.004, jitter=0.002, bandwidth=100e6, loss=0.001),
+    "lte": dict(
+        latency=0.025, jitter=0.008, distribution="pareto", bandwidth=20e6, loss=0.005
+    ),
+    "3g": dict(
+        latency=0.080, jitter=0.020, distribution="pareto", bandwidth=2e6, loss=0.01
+    ),
+    "satellite": dict(latency=0.300, jitter=0.010, bandwidth=10e6, loss=0.005),
+}
+
+# Standardizes numpy's pareto (Lomax) samples with shape 3 to mean 0, std 1
+_PARETO_SHAPE = 3.0
+_PARETO_MEAN = 1 / (_PARETO_SHAPE - 1)
+_PARETO_STD = np.sqrt(_PARETO_SHAPE / ((_PARETO_SHAPE - 1) ** 2 * (_PARETO_SHAPE - 2)))
+
+
+class ImpairedNetwork(BaseNetwork):
+    """Wraps a network, impairing the messages it receives."""
+
+    def __init__(
+        self,
+        network: BaseNetwork,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        distribution: str = "normal",
+        bandwidth: Optional[float] = None,
+        burst: Optional[int] = None,
+        loss: float = 0.0,
+        reorder: float = 0.0,
+        reorder_delay: float = 0.01,
+        rcvtimeo: Optional[int] = None,
+        seed: Optional[int] = None,
+    ):
+        """Constructor.
+
+        Args:
+            network: BaseNetwork - Network to wrap. It shouldn't be used
+                directly afterwards.
+            latency: float - Mean one-way delay, in seconds.
+            jitter: float - Standard deviation of the delay, in seconds.
+            distribution: str - Distribution of the delay, one of DISTRIBUTIONS.
+            bandwidth: float - Bits per second. None doesn't limit bandwidth.
+            burst: int - Token bucket size in bytes. Defaults to 10 ms worth
+                of bandwidth, and at least 1500 bytes.
+            loss: float - Probability that a message is dropped.
+            reorder: float - Probability that a message is held back.
+            reorder_delay: float - Seconds reordered messages are held back.
+            rcvtimeo: int - Milliseconds recv() waits before raising the
+                wrapped network's timeout error. Defaults to 1000 if loss > 0,
+                and otherwise waits indefinitely.
+            seed: int - Seed for reproducible impairment.
+        """
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown distribution {distribution}. Options are {DISTRIBUTIONS}"
+            )
+        if not 0 <= loss < 1 or not 0 <= reorder <= 1:
+            raise ValueError("loss and reorder must be probabilities, and loss < 1")
+
+        super().__init__(network.name_to_ip, serializer=network.serializer)
+        self.network = network
+        self._timeout_error = network._timeout_error
+
+        # The wrapped network's sockets are the ones that were tuned and set up
+        self.tuning = network.tuning
+        self.setup_times = network.setup_times
+
+        # Settings, so the same impairment can be applied to another network
+        self.profile = dict(
+            latency=latency,
+            jitter=jitter,
+            distribution=distribution,
+            bandwidth=bandwidth,
+            burst=burst,
+            loss=loss,
+            reorder=reorder,
+            reorder_delay=reorder_delay,
+            rcvtimeo=rcvtimeo,
+            seed=seed,
+        )
+        self.latency = latency
+        self.jitter = jitter
+        self.distribution = distribution
+        self.loss = loss
+        self.reorder = reorder
+        self.reorder_delay = reorder_delay
+        self.rng = np.random.default_rng(seed)
+
+        if rcvtimeo is None and loss > 0:
+            rcvtimeo = 1000
+        self.rcvtimeo = rcvtimeo
+
+        # Token bucket, in bytes. Tokens go negative while messages queue up.
+        self.bandwidth = bandwidth
+        if bandwidth is not None and burst is None:
+            burst = max(int(bandwidth / 8 * 0.01), 1500)
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill = time.time()
+
+        # Delay line of (release time, arrival order, source, message, stats)
+        self.delay_line = []
+        self.arrivals = itertools.count()
+
+        # Extra options poll() passes on to the wrapped network's poll()
+        self._poll_options = dict()
+
+        # Messages received from the wrapped network, and what became of them
+        self.received = 0
+        self.dropped = 0
+        self.reordered = 0
+
+    @classmethod
+    def from_config(
+        cls,
+        network: BaseNetwork,
+        config: Mapping,
+        device_name: Optional[str] = None,
+    ) -> "ImpairedNetwork":
+        """Wraps network with the impairment described by a config.
+
+        Args:
+            network: BaseNetwork - Network to wrap.
+            config: Mapping - Settings, with an optional preset name under
+                "profile", and overrides for single devices under their names.
+            device_name: str - Device the network belongs to. Defaults to
+                network.name.
+        """
+        config = dict(config)
+        device_name = device_name or getattr(network, "name", None)
+
+        settings = dict()
+        profile = config.pop("profile", None)
+        if profile is not None:
+            if profile not in PROFILES:
+                raise ValueError(
+                    f"Unknown profile {profile}. Options are {list(PROFILES)}"
+                )
+            settings.update(PROFILES[profile])
+
+        device_settings = dict()
+        for key, value in config.items():
+            if key == device_name:
+                device_settings = dict(value)
+            elif key not in network.name_to_ip:
+                settings[key] = value
+        settings.update(device_settings)
+
+        logger.info(f"Impairing traffic into {device_name} with {settings}")
+        return cls(network, **settings)
+
+    @property
+    def lossy(self) -> bool:
+        """Whether messages can be lost."""
+        return self.loss > 0
+
+    def __getattr__(self, name: str) -> Any:
+        """Falls back to the wrapped network, e.g. for name."""
+        if name == "network":
+            raise AttributeError(name)
+        return getattr(self.network, name)
+
+    def connect_peers(self, peers):
+        """Sets up the wrapped network's connections to peers."""
+        return self.network.connect_peers(peers)
+
+    def send(self, destination: str, data, section_name=None):
+        """Sends through the wrapped network. Only inbound traffic is impaired."""
+        stats = self.network.send(destination, data, section_name)
+        self.last_send = self.network.last_send
+        return stats
+
+    def recv(self, source: str, section_name=None):
+        """Receives the next message from source, once the link delivers it.
+
+        Raises:
+            TimeoutError - Nothing arrived within rcvtimeo milliseconds, or
+                zmq.Again if the wrapped network is built on ZMQ.
+        """
+        timeout = None if self.rcvtimeo is None else self.rcvtimeo / 1000
+        return self._next(source, section_name, timeout)[1]
+
+    def poll(
+        self,
+        max_msg_count=None,
+        callback=None,
+        decode_section=None,
+        encode_section=None,
+        timeout=None,
+        stop=None,
+        ack=True,
+        **kwargs,
+    ) -> int:
+        """Handles the messages the link delivers, replying to each sender.
+
+        Args:
+            max_msg_count: int - Return after handling this many messages.
+                None polls until timeout or stop says otherwise.
+            callback: Callable - Called with each message; its return value is
+                sent back to the sender, None included, unless it's NO_REPLY.
+                Without a callback, we send "ack", unless ack is False.
+            decode_section: str - If given, log the time spent decoding
+                received Messages under this name.
+            encode_section: str - If given, log the time spent encoding
+                replies under this name.
+            timeout: float - Return if no message arrives for this many seconds.
+            stop: Callable[[], bool] - Checked after every message. Return once
+                it returns True.
+            ack: bool - Whether to send "ack" when there's no callback. If
+                False, None results aren't sent back either.
+            **kwargs: Passed on to the wrapped network's poll(), e.g.
+                loss_section for ZMQ_UDP.
+
+        Returns:
+            int - Number of messages handled.
+        """
+        self._poll_options = kwargs
+        try:
+            return super().poll(
+                max_msg_count,
+                callback,
+                decode_section,
+                encode_section,
+                timeout,
+                stop,
+                ack,
+            )
+        finally:
+            self._poll_options = dict()
+
+    def _recv_next(self, section_name=None, timeout=None):
+        """Waits for the next message the link delivers, from anyone.
+
+        Lost messages never arrive, so poll() needs a timeout to stop waiting
+        for them.
+        """
+        try:
+            return self._next(None, section_name, timeout)
+        except self._timeout_error:
+            return None
+
+    def close(self):
+        """Closes the wrapped network."""
+        self.network.close()
+
+    def _next(self, source: Optional[str], section_name, timeout: Optional[float]):
+        """Waits for the next message the link delivers, from source or anyone.
+
+        Returns:
+            Tuple[str, Any] - The sender and the message.
+
+        Raises:
+            _timeout_error - Nothing was delivered within timeout seconds.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        pulled = False
+
+        while True:
+            now = time.time()
+            entry = self._earliest(source)
+            if entry is not None and entry[0] <= now:
+                self.delay_line.remove(entry)
+                heapq.heapify(self.delay_line)
+
+                _, _, self.last_source, msg, self.last_recv = entry
+                return self.last_source, msg
+
+            # Wait for new arrivals until the next delivery, or the deadline
+            wait = None if entry is None else entry[0] - now
+            if deadline is not None:
+                # Even without time left, look for arrivals once
+                if pulled and now >= deadline:
+                    raise self._timeout_error("No message arrived in time")
+                left = max(deadline - now, 0)
+                wait = left if wait is None else min(wait, left)
+
+            self._pull(section_name, wait)
+            pulled = True
+
+    def _earliest(self, source: Optional[str]):
+        """Returns the first entry of the delay line from source, or anyone."""
+        if source is None:
+            return self.delay_line[0] if self.delay_line else None
+
+        from_source = [entry for entry in self.delay_line if entry[2] == source]
+        return min(from_source) if from_source else None
+
+    def _pull(self, section_name, timeout: Optional[float]) -> None:
+        """Moves messages arriving within timeout into the delay line."""
+        # Wait for the first, then take in everything else that's waiting
+        options = self._poll_options
+        if self.network.poll(1, self._admit, section_name, timeout=timeout, **options):
+            self.network.poll(None, self._admit, section_name, timeout=0, **options)
+
+    def _admit(self, msg):
+        """Decides when the link delivers a message, if at all."""
+        now = time.time()
+        stats = self.network.last_recv
+        self.received += 1
+
+        # Lost messages are never answered
+        if self.loss and self.rng.random() < self.loss:
+            self.dropped += 1
+            return NO_REPLY
+
+        release = self._shape(now, stats.nbytes) + self._delay()
+        if self.reorder and self.rng.random() < self.reorder:
+            self.reordered += 1
+            release += self.reorder_delay
+
+        entry = (release, next(self.arrivals), self.network.last_source, msg, stats)
+        heapq.heappush(self.delay_line, entry)
+
+        # No reply until the message is delivered
+        return NO_REPLY
+
+    def _shape(self, now: float, nbytes: int) -> float:
+        """Takes nbytes from the token bucket, returning when they're paid for."""
+        if self.bandwidth is None:
+            return now
+
+        rate = self.bandwidth / 8
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * rate)
+        self.last_refill = now
+
+        self.tokens -= nbytes
+        if self.tokens >= 0:
+            return now
+        return now - self.tokens / rate
+
+    def _delay(self) -> float:
+        """Draws a one-way delay."""
+        if self.distribution == "constant" or not self.jitter:
+            delay = self.latency
+        elif self.distribution == "uniform":
+            # Uniform with this standard deviation spans +- sqrt(3) of it
+            spread = np.sqrt(3) * self.jitter
+            delay = self.rng.uniform(self.latency - spread, self.latency + spread)
+        elif self.distribution == "normal":
+            delay = self.rng.normal(self.latency, self.jitter)
+        else:
+            sample = (self.rng.pareto(_PARETO_SHAPE) - _PARETO_MEAN) / _PARETO_STD
+            delay = self.latency + self.jitter * sample
+
+        return max(delay, 0.0)
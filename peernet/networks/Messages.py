@@ -5,10 +5,13 @@ inference engines expect messages as arguments. This class is a useful
 abstraction that enables easy implementation of our one-way network delay
 estimation scheme.
 """
-from dataclasses import dataclass
+import math
+import sys
+import time
 
+from dataclasses import dataclass
 from peernet.metrics import MetricLogger
-from typing import Any
+from typing import Any, Optional
 
 # Logging setup
 import logging
@@ -19,13 +22,102 @@ logger.setLevel(logging.DEBUG)
 logger.addHandler(ch)
 
 
-@dataclass
+# Python 3.8 and 3.9 don't take slots, and keep a per-instance dict there
+@dataclass(**({"slots": True} if sys.version_info >= (3, 10) else {}))
 class Message:
     """Wwrapper around a python object that tacks on a metric logger for transmission.
 
     This is best used for pyzmq message passing. Defining these types for ROS
     requires some attention.
+
+    Besides data and logger, a Message carries a few numbers that travel packed
+    in its header, rather than as sections of the logger:
+
+    seq is an optional sequence number. Replies should carry the seq of the
+    request they answer, so that clients with several requests in flight can
+    match responses that arrive out of order.
+
+    sent is the sender's time.monotonic() when the Message was serialized. The
+    serializer packs it without changing the Message it sends, so it's only set
+    on received copies. Monotonic clocks of different devices aren't
+    comparable, but differences between sent times are, e.g. for jitter.
+
+    source is an optional number identifying the sender, e.g. its device number.
+
+    deadline is an optional time.monotonic() on the sender's clock after which
+    the Message is no longer worth processing. Receivers can only tell how much
+    of the budget (deadline - sent) is left, from when the Message arrived.
+
+    received is the receiver's time.monotonic() when the Message was
+    deserialized. It stays on the device that set it.
     """
 
     data: Any
     logger: MetricLogger
+    seq: Optional[int] = None
+    sent: Optional[float] = None
+    source: Optional[int] = None
+    deadline: Optional[float] = None
+    received: Optional[float] = None
+
+    @property
+    def budget(self) -> Optional[float]:
+        """Seconds the sender allowed between sending and the deadline."""
+        if self.deadline is None or self.sent is None:
+            return None
+
+        return self.deadline - self.sent
+
+    def age(self) -> float:
+        """Seconds since the Message arrived, or since it was sent on the sender."""
+        start = self.received if self.received is not None else self.sent
+        if start is None:
+            return 0.0
+
+        return time.monotonic() - start
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline, not counting time in transit.
+
+        Returns:
+            float - math.inf without a deadline. Negative once it has passed.
+        """
+        if self.deadline is None:
+            return math.inf
+
+        if self.received is None:
+            return self.deadline - time.monotonic()
+
+        return self.budget - self.age()
+
+    def expired(self) -> bool:
+        """Whether the deadline has passed."""
+        return self.remaining() < 0
+
+
+class _NoReply:
+    """Type of NO_REPLY, which pickles back to the same object."""
+
+    def __repr__(self) -> str:
+        return "NO_REPLY"
+
+    def __reduce__(self) -> str:
+        return "NO_REPLY"
+
+
+# Returned by a poll() callback that sends nothing back for a message
+NO_REPLY = _NoReply()
+
+
+class ControlMessage:
+    """Base class for messages that networks answer themselves, inside poll().
+
+    Control messages (e.g. clock sync probes) never reach the poll callback and
+    don't count towards max_msg_count. They are always pickled, whichever
+    serializer the network uses. Replies that need no answer themselves return
+    None from answer(), and are passed to the poll callback instead.
+    """
+
+    def answer(self) -> Any:
+        """Returns the reply to send back to the sender, or None if there's none."""
+        raise NotImplementedError("Subclass must implement answer method")
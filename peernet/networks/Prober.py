@@ -0,0 +1,333 @@
+"""Background link probing, in parallel with a running workload.
+
+Benchmark iterations time the network and inference together, so their jitter
+mixes both. A Prober sends small timestamped Pings to its peers at a fixed rate
+from a background thread, over a network instance of its own, and keeps
+rolling estimates of round trip time, jitter and loss that benchmark code can
+read at any time. Every probe is also logged to a MetricLogger tree.
+
+Peers answer Pings inside poll(), like any ControlMessage. A ProbeResponder
+keeps a peer's probe network polling in the background.
+
+Jitter is the RFC 3550 interarrival jitter estimator, applied to round trips:
+a running average of the difference between consecutive round trip times,
+with gain 1/16. Pings that get no reply within timeout count as lost.
+
+Typical usage example:
+    # On the server
+    responder = ProbeResponder(ZMQ_Pair("server", start_port=6000, ...))
+    responder.start()
+    # On the client
+    prober = Prober(ZMQ_Pair("client", start_port=6000, ...), ["server"], rate=10)
+    prober.start()
+    ...
+    prober.log(iter_l, "server")
+    ...
+    prober.stop()
+    prober.to_csv("probes.csv")
+"""
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+from peernet.metrics import Container, Value
+from peernet.metrics.MetricLogger import MetricLogger
+from peernet.networks.ImpairedNetwork import ImpairedNetwork
+from peernet.networks.Messages import NO_REPLY, ControlMessage
+
+# logger setup
+import logging
+from peernet.utils import ch
+
+logger = logging.getLogger("Prober")
+logger.setLevel(logging.WARNING)
+logger.addHandler(ch)
+
+
+@dataclass
+class Ping(ControlMessage):
+    """Probe answered by the peer's poll() with a Pong.
+
+    Attributes:
+        seq: int - Probe number, unique per Prober.
+        t0: float - When we sent it, on our clock.
+    """
+
+    seq: int
+    t0: float
+
+    def answer(self) -> "Pong":
+        """Echoes the probe back."""
+        return Pong(self.seq, self.t0)
+
+
+@dataclass
+class Pong(ControlMessage):
+    """Reply to a Ping, passed to the Prober's poll callback."""
+
+    seq: int
+    t0: float
+
+    def answer(self) -> None:
+        """Replies aren't answered."""
+        return None
+
+
+@dataclass
+class LinkStats:
+    """Rolling estimates for the link to one peer.
+
+    Attributes:
+        rtt: float - Mean round trip time of the recent probes, in seconds.
+        rtt_min: float - Shortest recent round trip time.
+        jitter: float - RFC 3550 jitter of the round trip time.
+        loss: float - Fraction of the recent probes that were lost.
+        sent: int - Probes sent so far.
+        lost: int - Probes lost so far.
+    """
+
+    rtt: float = float("nan")
+    rtt_min: float = float("nan")
+    jitter: float = float("nan")
+    loss: float = float("nan")
+    sent: int = 0
+    lost: int = 0
+
+
+class _Link:
+    """Probe history for one peer."""
+
+    def __init__(self, window: int):
+        # Round trip times of recent probes, NaN for lost ones
+        self.recent = deque(maxlen=window)
+        self.last_rtt = None
+        self.jitter = float("nan")
+        self.sent = 0
+        self.lost = 0
+
+    def add(self, rtt: float) -> None:
+        self.recent.append(rtt)
+        if np.isnan(rtt):
+            self.lost += 1
+            return
+
+        if self.last_rtt is not None:
+            diff = abs(rtt - self.last_rtt)
+            if np.isnan(self.jitter):
+                self.jitter = diff
+            else:
+                self.jitter += (diff - self.jitter) / 16
+        self.last_rtt = rtt
+
+    def stats(self) -> LinkStats:
+        if not self.recent:
+            return LinkStats(sent=self.sent)
+
+        recent = np.array(self.recent)
+        received = recent[~np.isnan(recent)]
+        return LinkStats(
+            rtt=received.mean() if received.size else float("nan"),
+            rtt_min=received.min() if received.size else float("nan"),
+            jitter=self.jitter,
+            loss=1 - received.size / recent.size,
+            sent=self.sent,
+            lost=self.lost,
+        )
+
+
+class _Background:
+    """Runs _run() in a daemon thread between start() and stop()."""
+
+    def start(self) -> None:
+        """Starts the background thread."""
+        self._stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stops the background thread, waiting at most timeout seconds."""
+        self._stopping.set()
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            logger.warning(f"{type(self).__name__} thread didn't stop in time")
+
+    def __enter__(self):  # noqa: D105
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):  # noqa: D105
+        self.stop()
+
+    def _run(self) -> None:
+        raise NotImplementedError("Subclass must implement _run method")
+
+
+class ProbeResponder(_Background):
+    """Answers Pings on a network in the background."""
+
+    def __init__(self, network):
+        """Constructor.
+
+        Args:
+            network: BaseNetwork - Network the Probers send to. Nothing else
+                may use it while the responder runs.
+        """
+        self.network = network
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self.network.poll(timeout=0.1, stop=self._stopping.is_set)
+
+
+class Prober(_Background):
+    """Measures the links to peers with Pings, in the background."""
+
+    def __init__(
+        self,
+        network,
+        peers: Iterable[str],
+        rate: float = 10.0,
+        window: int = 100,
+        timeout: float = 1.0,
+        metric_logger: Optional[MetricLogger] = None,
+    ):
+        """Constructor.
+
+        Args:
+            network: BaseNetwork - Network to probe over, separate from the
+                workload's. Nothing else may use it while the prober runs.
+            peers: Iterable[str] - Devices to probe. Each must run a
+                ProbeResponder, or otherwise poll the network.
+            rate: float - Pings per second to each peer.
+            window: int - Number of recent probes the estimates cover.
+            timeout: float - Seconds after which a Ping counts as lost.
+            metric_logger: MetricLogger - Tree to log every probe to, as a
+                Container with peer, sent, rtt, jitter and lost. A new one
+                is made by default.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self.network = network
+        self.peers = list(peers)
+        self.period = 1 / rate
+        self.timeout = timeout
+        self.links = {peer: _Link(window) for peer in self.peers}
+
+        if metric_logger is None:
+            metric_logger = Container("probes")
+        self.metric_logger = metric_logger
+
+        # Held while updating links or metric_logger, which the workload reads
+        self.lock = threading.Lock()
+
+        # Pings awaiting a Pong, by seq
+        self.in_flight: Dict[int, Any] = dict()
+        self.next_seq = 0
+
+    def stats(self, peer: str) -> LinkStats:
+        """Returns the current estimates for the link to peer."""
+        with self.lock:
+            return self.links[peer].stats()
+
+    def log(self, metric_logger: MetricLogger, peer: str) -> None:
+        """Logs the current estimates for peer as probe-rtt, probe-jitter and probe-loss."""  # noqa: E501
+        stats = self.stats(peer)
+        metric_logger.log_section("probe-rtt", Value).end_collection(stats.rtt)
+        metric_logger.log_section("probe-jitter", Value).end_collection(stats.jitter)
+        metric_logger.log_section("probe-loss", Value).end_collection(stats.loss)
+
+    def to_csv(self, dest: str) -> None:
+        """Writes every probe logged so far to a csv."""
+        with self.lock:
+            if self.metric_logger.children:
+                self.metric_logger.to_csv(dest)
+
+    def _run(self) -> None:
+        next_ping = time.time()
+
+        while not self._stopping.is_set():
+            now = time.time()
+            if now >= next_ping:
+                self._expire(now)
+                for peer in self.peers:
+                    self._ping(peer)
+
+                # Skip pings rather than bunching them up after a stall
+                next_ping = max(next_ping + self.period, now)
+
+            self.network.poll(
+                callback=self._on_reply,
+                timeout=max(next_ping - time.time(), 0),
+                stop=lambda: self._stopping.is_set() or time.time() >= next_ping,
+            )
+
+    def _ping(self, peer: str) -> None:
+        seq = self.next_seq
+        self.next_seq += 1
+
+        ping = Ping(seq, time.time())
+        self.in_flight[seq] = (peer, ping.t0)
+        with self.lock:
+            self.links[peer].sent += 1
+        self.network.send(peer, ping)
+
+    def _on_reply(self, msg: Any):
+        # Late replies to pings already counted as lost are ignored
+        if not isinstance(msg, Pong) or msg.seq not in self.in_flight:
+            return NO_REPLY
+
+        peer, t0 = self.in_flight.pop(msg.seq)
+        self._record(peer, msg.seq, t0, time.time() - t0)
+        return NO_REPLY
+
+    def _expire(self, now: float) -> None:
+        for seq, (peer, t0) in list(self.in_flight.items()):
+            if now - t0 >= self.timeout:
+                del self.in_flight[seq]
+                self._record(peer, seq, t0, float("nan"))
+
+    def _record(self, peer: str, seq: int, t0: float, rtt: float) -> None:
+        with self.lock:
+            link = self.links[peer]
+            link.add(rtt)
+
+            probe_l = self.metric_logger.log_section(f"{seq}", Container)
+            probe_l.log_section("peer", Value).end_collection(peer)
+            probe_l.log_section("sent", Value).end_collection(t0)
+            probe_l.log_section("rtt", Value).end_collection(rtt)
+            probe_l.log_section("jitter", Value).end_collection(link.jitter)
+            probe_l.log_section("lost", Value).end_collection(int(np.isnan(rtt)))
+
+
+def probe_config(net_config) -> dict:
+    """Returns a copy of a network config, on ports of its own for probing.
+
+    Uses the config's probe_port as start_port if given, and otherwise the
+    ports right after the workload's. Probes aren't recorded.
+    """
+    config = dict(net_config)
+    config.pop("record", None)
+    start_port = config.pop("probe_port", None)
+    if start_port is None:
+        start_port = config.get("start_port", 5551) + len(config["devices"])
+
+    config["start_port"] = start_port
+    return config
+
+
+def probe_network(network, device_name: str, net_config):
+    """Returns a second instance of network, on ports of its own for probing.
+
+    Impaired networks get the same impairment, so probes see the same link.
+    """
+    if isinstance(network, ImpairedNetwork):
+        inner = probe_network(network.network, device_name, net_config)
+        return ImpairedNetwork(inner, **network.profile)
+
+    return type(network)(device_name=device_name, **probe_config(net_config))
@@ -0,0 +1,233 @@
+"""Replays a recorded trace against live peers.
+
+A trace recorded on a robot (see peernet.networks.trace) holds every message
+it sent, with payloads and send times. ReplayNetwork sends the same messages
+again over a live network, typically to a server on the local machine, either
+at the recorded pace or as fast as possible. Server-side changes can then be
+profiled with exactly the traffic the robot produced, and inference engines
+compared on identical input streams, without the robot.
+
+Open timers in a replayed Message's logger (e.g. "upload") are restarted when
+it's sent, so they time the replay rather than the recording. Responses are
+matched to requests by seq, or in order for data without one.
+
+Typical usage example:
+    network = ZMQ_Pair("robot", **config)
+    results = ReplayNetwork(network, "robot.trace").replay(speed=1.0)
+    results.to_csv("replay.csv")
+"""
+
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+from peernet.metrics import Container, Timer, Value, pad_sections
+from peernet.metrics.MetricLogger import MetricLogger
+from peernet.networks.Messages import NO_REPLY, ControlMessage, Message
+from peernet.networks.serializers import get_serializer
+from peernet.networks.trace import TraceReader
+
+# logger setup
+import logging
+from peernet.utils import ch
+
+logger = logging.getLogger("ReplayNetwork")
+logger.setLevel(logging.INFO)
+logger.addHandler(ch)
+
+
+class ReplayNetwork:
+    """Sends the messages a device sent in a trace again, over a live network."""
+
+    def __init__(
+        self,
+        network,
+        trace: Union[str, TraceReader],
+        device: Optional[str] = None,
+    ):
+        """Constructor.
+
+        Args:
+            network: BaseNetwork - Live network to replay over. Its device plays
+                the part of the recorded one.
+            trace: Union[str, TraceReader] - Trace, recorded with payloads on
+                either end of the device's links.
+            device: str - Device whose messages to replay. Defaults to
+                network.name.
+
+        Raises:
+            ValueError - The trace has no payloads.
+        """
+        if isinstance(trace, str):
+            trace = TraceReader(trace)
+        if not trace.payloads:
+            raise ValueError(f"{trace.path} was recorded without payloads")
+
+        self.network = network
+        self.trace = trace
+        self.device = device or network.name
+        self.serializer = get_serializer(trace.serializer)
+
+    def messages(self) -> Iterator[Tuple[float, str, Any]]:
+        """Yields (time, destination, message) for every message the device sent.
+
+        Control messages, like clock sync probes, are left out.
+        """
+        for record in self.trace:
+            if record.source != self.device:
+                continue
+
+            msg = self.serializer.loads(record.frames)
+            if not isinstance(msg, ControlMessage):
+                yield record.time, record.destination, msg
+
+    def replay(
+        self,
+        speed: Optional[float] = 1.0,
+        window: Optional[int] = None,
+        timeout: float = 10.0,
+    ) -> Container:
+        """Sends every message, and waits for the responses.
+
+        Args:
+            speed: float - Multiple of the recorded pace to send at. None or 0
+                sends as fast as possible.
+            window: int - Most requests in flight at once. None doesn't limit
+                them, so only the pace does.
+            timeout: float - Seconds without a response after which the
+                requests in flight are given up on.
+
+        Returns:
+            Container - One row per message. Rows hold the response's logger,
+                and scheduled (seconds into the trace), lag (how late it was
+                sent), response-time, upload-bytes, download-bytes and dropped.
+        """
+        results = Container("replay")
+
+        # Requests awaiting a response, in the order they were sent
+        self.in_flight: Dict[Tuple[str, Any], Tuple[MetricLogger, dict]] = dict()
+        self.template = None
+
+        start = time.time()
+        first = None
+        for idx, (when, destination, msg) in enumerate(self.messages()):
+            first = when if first is None else first
+            scheduled = (when - first) / speed if speed else 0.0
+
+            # Take in responses until it's time to send, and there's room
+            while time.time() < start + scheduled:
+                self._collect(start + scheduled)
+            while window is not None and len(self.in_flight) >= window:
+                if not self._collect(time.time() + timeout):
+                    self._give_up()
+
+            if isinstance(msg, Message):
+                _restart_timers(msg.logger)
+
+                # Deadlines were on the recording's clock, and keep their budget
+                if msg.deadline is not None:
+                    msg.deadline = time.monotonic() + msg.budget
+
+            sent = time.time()
+            stats = self.network.send(destination, msg)
+
+            row = results.log_section(f"{idx}", Container)
+            key = (destination, getattr(msg, "seq", None))
+            if key[1] is None or key in self.in_flight:
+                key = (destination, ("order", idx))
+            self.in_flight[key] = (
+                row,
+                dict(
+                    scheduled=when - first,
+                    lag=sent - start - scheduled if speed else 0.0,
+                    sent=sent,
+                    upload_bytes=stats.nbytes,
+                ),
+            )
+
+        while self.in_flight:
+            if not self._collect(time.time() + timeout):
+                self._give_up()
+
+        # Rows without a response get the columns of those with one
+        if self.template is not None:
+            for row in results.children:
+                if row.get_metric("dropped") == 1:
+                    pad_sections(row, self.template)
+
+        return results
+
+    def _collect(self, deadline: float) -> int:
+        """Takes in responses until deadline, or until one arrives.
+
+        Returns:
+            int - Number of responses.
+        """
+        return self.network.poll(
+            1, self._on_response, timeout=max(deadline - time.time(), 0)
+        )
+
+    def _on_response(self, msg: Any):
+        """Completes the row of the request msg answers."""
+        received = time.time()
+        source = self.network.last_source
+
+        key = (source, getattr(msg, "seq", None))
+        if key not in self.in_flight:
+            # Data without a seq answers the oldest request to its sender
+            waiting = [k for k in self.in_flight if k[0] == source]
+            if not waiting:
+                logger.warning(f"Dropping unexpected response from {source}")
+                return NO_REPLY
+            key = waiting[0]
+
+        row, info = self.in_flight.pop(key)
+        name = row.name
+        if isinstance(msg, Message):
+            msg.logger.end_sub("download")
+            if source in self.network.clocks:
+                self.network.clocks[source].correct(
+                    msg.logger, outbound=["upload"], inbound=["download"]
+                )
+            row.copy_from(msg.logger)
+            row.name = name
+
+        dropped = isinstance(msg, Message) and msg.logger.get_metric("dropped") == 1
+        if not dropped:
+            row.log_section("dropped", Value).end_collection(0)
+        _log_info(row, info)
+        row.log_section("response-time", Value).end_collection(
+            received - info["sent"]
+        )
+        row.log_section("download-bytes", Value).end_collection(
+            self.network.last_recv.nbytes
+        )
+
+        if self.template is None and not dropped:
+            self.template = row
+
+        # Don't reply to responses
+        return NO_REPLY
+
+    def _give_up(self) -> None:
+        """Records the oldest request in flight as dropped."""
+        key = next(iter(self.in_flight))
+        row, info = self.in_flight.pop(key)
+        logger.warning(f"No response to {row.name} in time, recording it as dropped")
+
+        row.log_section("dropped", Value).end_collection(1)
+        _log_info(row, info)
+
+
+def _log_info(row: MetricLogger, info: dict) -> None:
+    """Logs what's known about a request when it was sent."""
+    row.log_section("scheduled", Value).end_collection(info["scheduled"])
+    row.log_section("lag", Value).end_collection(info["lag"])
+    row.log_section("upload-bytes", Value).end_collection(info["upload_bytes"])
+
+
+def _restart_timers(metric_logger: MetricLogger) -> None:
+    """Restarts the timers in a tree that are still running."""
+    for child in metric_logger.children:
+        if isinstance(child, Timer) and child.metric is None:
+            child.start_collection()
+        _restart_timers(child)
@@ -0,0 +1,321 @@
+"""Implementation of a PEERNet compatible network through shared memory.
+
+For devices on the same host, such as a sensor process and an inference
+process on one Jetson, going through TCP loopback measures the kernel's network
+stack more than anything else. Here, every directed pair of devices shares a
+multiprocessing.shared_memory ring buffer, owned by the sender. A send copies
+the serialized frames into the ring once and rings a doorbell, a tiny message
+on a ZMQ ipc PAIR socket saying where the frames are. The receiver copies them
+out, then hands the space back by replying with a release credit on the same
+socket.
+
+The send(destination, data) / recv(source) / poll() API is the same as
+ZMQ_Pair's, so it works as a zero-network baseline in the same benchmark.
+"""
+
+from collections import deque
+from multiprocessing import resource_tracker, shared_memory
+import os
+import struct
+import tempfile
+
+from peernet.networks import BaseNetwork
+from peernet.networks import TransferStats
+from peernet.networks.trace import RECV, SEND
+from peernet.networks.framing import as_buffer
+
+from peernet.utils.custom_formatter import ch
+import logging
+import getpass
+import zmq
+
+# offset of the first frame in the ring, and ring bytes used including padding
+_DOORBELL = struct.Struct("<QQ")
+
+# ring bytes handed back by the receiver
+_CREDIT = struct.Struct("<Q")
+
+# Rings created by this process, which its resource tracker is meant to know
+_owned_rings = set()
+
+
+class SharedMemory_Pair(BaseNetwork):
+    """Subclass of BaseNetwork that passes messages through shared memory rings.
+
+    Every device can directly address any other device on the same host.
+    """
+
+    _timeout_error = zmq.Again
+
+    def __init__(
+        self,
+        device_name,
+        start_port=5551,
+        verbose=0,
+        ring_size=64 * 2**20,
+        *args,
+        **kwargs,
+    ):
+        """Constructor.
+
+        Args:
+            device_name: str - Name of this device in the devices mapping.
+            start_port: int - Only used to name the rings and ipc endpoints, so
+                separate experiments on one host don't collide.
+            verbose: int - 0/1/2 scale for logging verbosity.
+            ring_size: int - Bytes in each ring buffer. A single message must
+                fit in one ring.
+            *args :- To pass to BaseNetwork
+            **kwargs :- To pass to Base Network (devices, serializer).
+        """
+        super().__init__(verbose=verbose, **kwargs)
+
+        # logger setup
+        self.logger = logging.getLogger("SharedMemory_Pair")
+        if verbose == 0:
+            self.logger.setLevel(logging.DEBUG)
+        elif verbose == 1:
+            self.logger.setLevel(logging.WARN)
+        else:
+            self.logger.setLevel(logging.CRITICAL)
+        self.logger.addHandler(ch)
+
+        # Who am I?
+        if device_name in self.device_number:
+            self.name = device_name
+        else:
+            self.logger.warning("Invalid device_name, defaulting to getuser()")
+            self.name = getpass.getuser()
+        self.number = self.device_number[self.name]
+
+        self.start_port = start_port
+        self.ring_size = ring_size
+
+        # Rings we write to, with where the next message goes and how much of
+        # each ring the receiver hasn't handed back yet
+        self.send_rings = [None] * self.NUM_DEVICES
+        self.heads = [0] * self.NUM_DEVICES
+        self.used = [0] * self.NUM_DEVICES
+
+        # Rings we read from, attached on the first doorbell
+        self.recv_rings = [None] * self.NUM_DEVICES
+
+        self.send_sockets = [None] * self.NUM_DEVICES
+        self.recv_sockets = [None] * self.NUM_DEVICES
+        self.recv_socket_mapping = dict()
+
+        context = self.tuning.context()
+
+        # setup the rings and doorbells we send on, all bound to me
+        for recv_device, recv_device_number in self.device_number.items():
+            self.send_rings[recv_device_number] = self._create_ring(
+                self.number, recv_device_number
+            )
+
+            socket = self.tuning.apply(context.socket(zmq.PAIR))
+            address = self.get_address(self.number, recv_device_number)
+            socket.bind(address)
+            self.send_sockets[recv_device_number] = socket
+
+            self.logger.debug(
+                f"Set up ring and doorbell to send to {recv_device} at {address}"
+            )
+
+        # Setup the doorbells we receive on, connected to the other devices
+        for send_device, send_device_number in self.device_number.items():
+            socket = self.tuning.apply(context.socket(zmq.PAIR))
+            socket.connect(self.get_address(send_device_number, self.number))
+            self.recv_sockets[send_device_number] = socket
+
+            self.recv_socket_mapping[socket] = send_device
+
+        # set up some objects for polling
+        self.poller = zmq.Poller()
+        for r_s in self.recv_sockets:
+            self.poller.register(r_s, zmq.POLLIN)
+
+        # Sockets that fired on the last poll, and may hold more messages
+        self._ready = deque()
+
+    def get_ring_name(self, sender: int, receiver: int) -> str:
+        """Returns the shared memory name of the ring from sender to receiver."""
+        return f"peernet{self.start_port}_{sender}_{receiver}"
+
+    def get_address(self, sender: int, receiver: int) -> str:
+        """Returns the ipc endpoint of the doorbell from sender to receiver."""
+        path = os.path.join(tempfile.gettempdir(), self.get_ring_name(sender, receiver))
+        return f"ipc://{path}"
+
+    def _create_ring(self, sender: int, receiver: int) -> shared_memory.SharedMemory:
+        """Creates a ring we own, replacing one left behind by a crashed run."""
+        name = self.get_ring_name(sender, receiver)
+        try:
+            ring = shared_memory.SharedMemory(name, create=True, size=self.ring_size)
+        except FileExistsError:
+            self.logger.warning(f"Replacing stale shared memory {name}")
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            ring = shared_memory.SharedMemory(name, create=True, size=self.ring_size)
+
+        _owned_rings.add(ring.name)
+        return ring
+
+    def _attach_ring(self, sender: int) -> shared_memory.SharedMemory:
+        """Returns the ring sender writes to us on, attaching to it if needed."""
+        if self.recv_rings[sender] is None:
+            ring = shared_memory.SharedMemory(self.get_ring_name(sender, self.number))
+
+            # Attaching registers the ring with this process's resource
+            # tracker, which would unlink it from under its owner at exit
+            if ring.name not in _owned_rings:
+                resource_tracker.unregister(ring._name, "shared_memory")
+            self.recv_rings[sender] = ring
+
+        return self.recv_rings[sender]
+
+    def send(self, destination: str, data, section_name=None) -> TransferStats:
+        """Send (data) to destination.
+
+        Blocks while the ring to destination is too full for the message, until
+        destination receives enough of the messages before it.
+
+        destination - a hostname, not an IP
+        section_name - if data is a Message, log its encoding time under this name
+
+        Returns the wire sizes of the sent message, also kept in self.last_send.
+        """
+        dest_number = self.device_number[destination]
+        socket = self.send_sockets[dest_number]
+
+        frames = self.serializer.dumps(data, section_name)
+        views = [memoryview(as_buffer(frame)).cast("B") for frame in frames]
+        total = sum(view.nbytes for view in views)
+        if total > self.ring_size:
+            raise ValueError(
+                f"Message of {total} bytes doesn't fit a ring of {self.ring_size}"
+            )
+
+        # Collect whatever space the receiver has handed back, and wait for more
+        # until the message fits. Where it goes depends on what's still used.
+        self._collect_credits(dest_number, block=False)
+        offset, consumed = self._place(dest_number, total)
+        while self.ring_size - self.used[dest_number] < consumed:
+            self._collect_credits(dest_number)
+            offset, consumed = self._place(dest_number, total)
+
+        # One copy into shared memory, then tell the receiver where it is
+        buf = self.send_rings[dest_number].buf
+        position = offset
+        for view in views:
+            buf[position : position + view.nbytes] = view
+            position += view.nbytes
+
+        self.heads[dest_number] = position % self.ring_size
+        self.used[dest_number] += consumed
+
+        lengths = struct.pack(f"<{len(views)}Q", *(view.nbytes for view in views))
+        socket.send(_DOORBELL.pack(offset, consumed) + lengths)
+
+        self.last_send = TransferStats(
+            nbytes=total, header_bytes=views[0].nbytes, frames=len(views)
+        )
+        self._record(SEND, destination, views, total)
+        return self.last_send
+
+    def _place(self, dest_number: int, total: int):
+        """Returns the offset of a message of total bytes, and the ring it uses.
+
+        Messages are contiguous, so those that don't fit before the end of the
+        ring skip it, and use it up as padding. An empty ring starts over at 0.
+        """
+        offset = 0 if self.used[dest_number] == 0 else self.heads[dest_number]
+        if offset + total > self.ring_size:
+            return 0, total + self.ring_size - offset
+
+        return offset, total
+
+    def _collect_credits(self, dest_number: int, block: bool = True):
+        """Takes back ring space the receiver released.
+
+        With block=True, waits for at least one credit. Otherwise, only takes
+        the credits that already arrived.
+        """
+        socket = self.send_sockets[dest_number]
+
+        if block:
+            self.used[dest_number] -= _CREDIT.unpack(socket.recv())[0]
+
+        while True:
+            try:
+                credit = socket.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            self.used[dest_number] -= _CREDIT.unpack(credit)[0]
+
+    def recv(self, source: str, section_name=None):
+        """Block while waiting to receive data from source.
+
+        section_name - if a Message arrives, log its decoding time under this name
+        """
+        source_device_number = self.device_number[source]
+        socket = self.recv_sockets[source_device_number]
+
+        return self._recv_from(socket, section_name)
+
+    def _recv_from(self, socket, section_name=None, flags=0):
+        """Copies one message out of its ring, releases the space, and decodes it."""
+        doorbell = memoryview(socket.recv(flags))
+        offset, consumed = _DOORBELL.unpack_from(doorbell)
+        lengths = doorbell[_DOORBELL.size :].cast("Q")
+
+        ring = self._attach_ring(self.device_number[self.recv_socket_mapping[socket]])
+        data = memoryview(bytes(ring.buf[offset : offset + sum(lengths)]))
+        socket.send(_CREDIT.pack(consumed))
+
+        frames = []
+        position = 0
+        for length in lengths:
+            frames.append(data[position : position + length])
+            position += length
+
+        self.last_recv = TransferStats.from_frames(frames)
+        self.last_source = self.recv_socket_mapping[socket]
+        self._record(RECV, self.last_source, frames, self.last_recv.nbytes)
+        return self.serializer.loads(frames, section_name)
+
+    def _recv_next(self, section_name=None, timeout=None):
+        """Receives the next message from any device, emptying sockets that fired."""
+        while True:
+            while self._ready:
+                receiver = self._ready[0]
+                try:
+                    msg = self._recv_from(receiver, section_name, zmq.NOBLOCK)
+                except zmq.Again:
+                    self._ready.popleft()
+                    continue
+                return self.recv_socket_mapping[receiver], msg
+
+            timeout_ms = None if timeout is None else int(timeout * 1000)
+            ready = self.poller.poll(timeout_ms)
+            if not ready:
+                return None
+            self._ready.extend(receiver for receiver, _ in ready)
+
+    def close(self):
+        """Close all the sockets, and free the rings we own."""
+        # Doorbells and credits are meaningless once the rings are gone, and
+        # waiting to deliver them to a closed peer hangs the context at exit
+        for socket in self.send_sockets + self.recv_sockets:
+            socket.close(linger=0)
+
+        for ring in self.recv_rings:
+            if ring is not None:
+                ring.close()
+
+        for ring in self.send_rings:
+            _owned_rings.discard(ring.name)
+            ring.close()
+            ring.unlink()
+
+        super().close()
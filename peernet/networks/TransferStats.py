@@ -0,0 +1,38 @@
+"""Byte accounting for individual sends and receives.
+
+Networks record the size of every message they send or receive, as it
+appeared on the wire, in a TransferStats object. Benchmark code can then log
+byte counts without serializing messages a second time just to measure them.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+from peernet.networks.framing import as_buffer
+
+
+@dataclass
+class TransferStats:
+    """Sizes of one send or receive.
+
+    Attributes:
+        nbytes: int - Total bytes across all frames.
+        header_bytes: int - Bytes of the header frame. For Messages, this is
+            the encoded logger.
+        frames: int - Number of frames.
+    """
+
+    nbytes: int = 0
+    header_bytes: int = 0
+    frames: int = 0
+
+    @property
+    def payload_bytes(self) -> int:
+        """Bytes of everything but the header frame."""
+        return self.nbytes - self.header_bytes
+
+    @classmethod
+    def from_frames(cls, frames: Sequence[Any]) -> "TransferStats":
+        """Measures frames produced by a Serializer, without copying them."""
+        sizes = [memoryview(as_buffer(frame)).nbytes for frame in frames]
+        return cls(nbytes=sum(sizes), header_bytes=sizes[0], frames=len(sizes))
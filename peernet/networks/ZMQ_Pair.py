@@ -1,15 +1,16 @@
 """Implementation of a PEERNet compatible network through ZMQ TCP."""
 
 from peernet.networks import BaseNetwork
-from peernet.networks import Message
-from peernet.metrics import Timer, Value
+from peernet.networks import TransferStats
+from peernet.networks.trace import RECV, SEND
 
 from peernet.utils.custom_formatter import ch
 import logging
 import getpass
+import time
 import zmq
-import sys
-import pickle
+from collections import deque
+from typing import Iterable, Optional
 
 
 class ZMQ_Pair(BaseNetwork):
@@ -19,8 +20,33 @@ class ZMQ_Pair(BaseNetwork):
     address any other device).
     """
 
-    def __init__(self, device_name, start_port=5551, verbose=0, *args, **kwargs):
-        """Constructor."""
+    # Overridden by AsyncZMQ_Pair to build the same sockets on zmq.asyncio
+    _context_class = zmq.Context
+    _poller_class = zmq.Poller
+
+    _timeout_error = zmq.Again
+
+    def __init__(
+        self,
+        device_name,
+        start_port=5551,
+        verbose=0,
+        sndhwm=None,
+        rcvhwm=None,
+        peers: Optional[Iterable[str]] = None,
+        *args,
+        **kwargs,
+    ):
+        """Constructor.
+
+        sndhwm/rcvhwm - if given, the most messages ZMQ queues per socket before
+            send() blocks. Defaults to ZMQ's own (1000).
+        peers - devices poll() listens to. Defaults to every device.
+
+        No sockets are created here. Those to a peer are set up on the first
+        send, recv or poll involving it, or by connect_peers(), and the time it
+        took is kept in setup_times.
+        """
         super().__init__(verbose=verbose, **kwargs)
 
         # logger setup
@@ -47,115 +73,144 @@ class ZMQ_Pair(BaseNetwork):
         ]
         self.logger.debug(f"Using port dictionary: {self.ports}")
 
-        # Create lists for the 2 * N sockets we need on this device.
+        # Lists for the 2 * N sockets we may need on this device, created for
+        # each peer on first contact
         self.send_sockets = [None] * self.NUM_DEVICES
         self.recv_sockets = [None] * self.NUM_DEVICES
         self.recv_socket_mapping = dict()
+        self.sndhwm = sndhwm
+        self.rcvhwm = rcvhwm
 
-        context = zmq.Context()
-
-        # setup the sending sockets, all bound to me
-        for recv_device in self.device_number:
-            recv_device_number = self.device_number[recv_device]
-            socket = context.socket(zmq.PAIR)
-            port = self.ports[self.number][recv_device_number]
-
-            self.logger.debug(
-                f"Setting up sending socket to talk to {recv_device} on port {port}, bound to me."  # noqa: E501
-            )
+        # Devices poll() listens to
+        self.peers = list(self.device_number if peers is None else peers)
 
-            socket.bind(f"tcp://*:{port}")
-            self.send_sockets[recv_device_number] = socket
+        self.context = self.tuning.context(self._context_class)
+        self.poller = self._poller_class()
 
-        # Setup the receiving sockets - all connected to ports on OTHER devices
-        for send_device in self.device_number:
-            send_device_number = self.device_number[send_device]
-            send_dns_name = self.get_ip(send_device)
-            socket = context.socket(zmq.PAIR)
-            port = self.ports[send_device_number][self.number]
-            socket.connect(f"tcp://{send_dns_name}:{port}")
-            self.recv_sockets[send_device_number] = socket
+        # Sockets that fired on the last poll, and may hold more messages
+        self._ready = deque()
 
-            self.recv_socket_mapping[socket] = send_device
+    def connect_peers(self, peers: Iterable[str]) -> float:
+        """Sets up the sockets to peers now, rather than on first contact.
 
-        # set up some objects for polling
-        self.poller = zmq.Poller()
-        for r_s in self.recv_sockets:
-            self.poller.register(r_s, zmq.POLLIN)
-
-    def send(self, destination: str, data):
-        """Send (data) to destination.
+        Args:
+            peers: Iterable[str] - Devices to send to and receive from.
 
-        destination - a hostname, not an IP
+        Returns:
+            float - Seconds spent setting up sockets that didn't exist yet.
         """
-        # lookup the right socket to use
-        dest_number = self.device_number[destination]
-        socket = self.send_sockets[dest_number]
-
-        # Send using pickle serialization
-        socket.send_pyobj(data)
-
-    def send_with_timing(self, destination: str, data, logger, section_name):
-        """Sends with timing using our serialized logger format."""
-        msg = Message(data, logger)
+        elapsed = 0.0
+        for peer in peers:
+            if peer not in self.setup_times:
+                elapsed += self._connect(peer)
+
+        return elapsed
+
+    def _connect(self, peer: str) -> float:
+        """Binds the socket sending to peer, and connects the one receiving from it."""
+        start = time.time()
+        peer_number = self.device_number[peer]
+
+        # The sending socket is bound to me
+        socket = self.context.socket(zmq.PAIR)
+        if self.sndhwm is not None:
+            socket.setsockopt(zmq.SNDHWM, self.sndhwm)
+        self.tuning.apply(socket)
+        socket.bind(f"tcp://*:{self.ports[self.number][peer_number]}")
+        self.send_sockets[peer_number] = socket
+
+        # The receiving socket is connected to a port on the peer
+        socket = self.context.socket(zmq.PAIR)
+        if self.rcvhwm is not None:
+            socket.setsockopt(zmq.RCVHWM, self.rcvhwm)
+        self.tuning.apply(socket)
+        port = self.ports[peer_number][self.number]
+        socket.connect(f"tcp://{self.get_ip(peer)}:{port}")
+        self.recv_sockets[peer_number] = socket
+        self.recv_socket_mapping[socket] = peer
+        self.poller.register(socket, zmq.POLLIN)
+
+        self.setup_times[peer] = time.time() - start
+        self.logger.debug(
+            f"Set up sockets to {peer} in {self.setup_times[peer]:.4f} s"
+        )
+        return self.setup_times[peer]
 
-        msg.logger.log_section(section_name, Timer)
+    def _send_socket(self, destination: str):
+        """Returns the socket sending to destination, setting it up if needed."""
+        if destination not in self.setup_times:
+            self._connect(destination)
 
-        self.send(destination, msg)
+        return self.send_sockets[self.device_number[destination]]
 
-    def recv(self, source: str):
-        """Block while waiting to receive data from source."""
-        source_device_number = self.device_number[source]
-        socket = self.recv_sockets[source_device_number]
+    def _recv_socket(self, source: str):
+        """Returns the socket receiving from source, setting it up if needed."""
+        if source not in self.setup_times:
+            self._connect(source)
 
-        return socket.recv_pyobj()
+        return self.recv_sockets[self.device_number[source]]
 
-    def recv_with_timing(self, source: str, logger, section_name, log_bytes=True):
-        """Receives with timing using our serialized logger format."""
-        recv_msg = self.recv(source)
-        recv_msg.logger.end_sub(section_name)
+    def send(self, destination: str, data, section_name=None) -> TransferStats:
+        """Send (data) to destination.
 
-        msg_bytes = sys.getsizeof(pickle.dumps(recv_msg))
-        data_bytes = sys.getsizeof(pickle.dumps(recv_msg.data))
+        destination - a hostname, not an IP
+        section_name - if data is a Message, log its encoding time under this name
 
-        recv_msg.logger.log_section(f"{section_name}-msg-bytes", Value).end_collection(
-            msg_bytes
-        )
-        recv_msg.logger.log_section(f"{section_name}-data-bytes", Value).end_collection(
-            data_bytes
-        )
+        Returns the wire sizes of the sent message, also kept in self.last_send.
+        """
+        # lookup the right socket to use
+        socket = self._send_socket(destination)
 
-        logger.copy_from(recv_msg.logger)
+        # Send a small header plus raw payload buffers, without copying them
+        frames = self.serializer.dumps(data, section_name)
+        socket.send_multipart(frames, copy=False)
 
-        return recv_msg.data
+        self.last_send = TransferStats.from_frames(frames)
+        self._record(SEND, destination, frames, self.last_send.nbytes)
+        return self.last_send
 
-    def poll(self, max_msg_count, callback=None):
-        """Polls for messages on all registered recv_sockets.
+    def recv(self, source: str, section_name=None):
+        """Block while waiting to receive data from source.
 
-        This is a blocking function. Set max_msg_count wisely.
+        section_name - if a Message arrives, log its decoding time under this name
         """
-        for _ in range(max_msg_count):
-            incoming_messages = dict(self.poller.poll())
+        return self._recv_from(self._recv_socket(source), section_name)
 
-            # Go through all our receiving sockets to see who set off the poll.
-            for receiver in self.recv_sockets:
-                if receiver in incoming_messages:
-                    sending_device = self.recv_socket_mapping[receiver]
+    def _recv_from(self, socket, section_name=None, flags=0):
+        """Receives and deserializes one message, recording its wire sizes."""
+        frames = socket.recv_multipart(flags, copy=False)
+        self.last_recv = TransferStats.from_frames(frames)
+        self.last_source = self.recv_socket_mapping[socket]
+        self._record(RECV, self.last_source, frames, self.last_recv.nbytes)
+        return self.serializer.loads(frames, section_name)
 
-                    msg = receiver.recv_pyobj()
+    def _recv_next(self, section_name=None, timeout=None):
+        """Receives the next message from any peer, for poll().
 
-                    call_out = "ack"
-                    if callback:
-                        call_out = callback(msg)
-
-                    # Send an ack back
-                    self.logger.debug(f"Sending acknowledgement to {sending_device}")
-                    self.send(sending_device, call_out)
+        Sockets that fired are emptied before polling again, so a burst of
+        messages costs one poll call rather than one per message.
+        """
+        while True:
+            while self._ready:
+                receiver = self._ready[0]
+                try:
+                    msg = self._recv_from(receiver, section_name, zmq.NOBLOCK)
+                except zmq.Again:
+                    self._ready.popleft()
+                    continue
+                return self.recv_socket_mapping[receiver], msg
+
+            self.connect_peers(self.peers)
+            timeout_ms = None if timeout is None else int(timeout * 1000)
+            ready = self.poller.poll(timeout_ms)
+            if not ready:
+                return None
+            self._ready.extend(receiver for receiver, _ in ready)
 
     def close(self):
         """Close all the sockets."""
-        for socket in self.send_sockets:
-            socket.close()
+        for socket in self.send_sockets + self.recv_sockets:
+            if socket is not None:
+                socket.close()
 
-        for socket in self.recv_sockets:
-            socket.close()
+        super().close()
@@ -0,0 +1,316 @@
+"""Implementation of a PEERNet compatible network through ZMQ XPUB/SUB.
+
+Point-to-point networks send one camera frame to three consumers as three
+serializations and three sends. Here, every device binds a single XPUB socket,
+on port start_port + its device number, and connects one SUB socket to every
+other device's XPUB. publish(topic, data) serializes once, and ZMQ fans the
+frames out to every device subscribed to a prefix of topic.
+
+Every message travels as [topic, sender, *frames]. Each device also subscribes
+to a direct topic of its own, @{name}, so send(destination, data),
+recv(source), poll() and everything built on them (replies, ClockSync) work as
+on ZMQ_Pair.
+
+A Message's logger travels in its header, so publish_with_timing() followed by
+recv_with_timing() on each subscriber gives every subscriber its own receive
+timing. Like all PUB/SUB, messages published before a subscriber connected are
+never delivered to it; wait_for_subscribers() waits until they have.
+
+Publishes have no single destination, so traces only record direct sends and
+everything received.
+
+Typical usage example:
+    camera = ZMQ_PubSub("camera", devices=devices)
+    camera.wait_for_subscribers(["detector", "tracker"])
+    camera.publish("frames/front", frame)
+
+    detector = ZMQ_PubSub("detector", topics=["frames/"], devices=devices)
+    frame = detector.recv("camera")
+"""
+
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+from peernet.metrics import Timer
+from peernet.networks import BaseNetwork
+from peernet.networks import TransferStats
+from peernet.networks.Messages import Message
+from peernet.networks.trace import RECV, SEND
+
+from peernet.utils.custom_formatter import ch
+import logging
+import getpass
+import zmq
+
+# Prefix of the topic every device subscribes to for messages sent to it alone
+DIRECT = "@"
+
+
+class ZMQ_PubSub(BaseNetwork):
+    """Subclass of BaseNetwork that publishes messages to topics over XPUB/SUB.
+
+    Devices receive what's published to the topics they subscribe to, and
+    whatever is sent to them by name.
+    """
+
+    _timeout_error = zmq.Again
+
+    def __init__(
+        self,
+        device_name,
+        start_port=5551,
+        topics: Iterable[str] = (),
+        verbose=0,
+        sndhwm=None,
+        rcvhwm=None,
+        *args,
+        **kwargs,
+    ):
+        """Constructor.
+
+        Args:
+            device_name: str - Name of this device in the devices mapping.
+            start_port: int - This device's XPUB binds to start_port plus its
+                device number.
+            topics: Iterable[str] - Topic prefixes to receive publishes on.
+                By default, only what's sent to this device by name arrives.
+                "" receives everything published, but also every message sent
+                between other devices, which are then dropped.
+            verbose: int - 0/1/2 scale for logging verbosity.
+            sndhwm: int - If given, the most messages queued per subscriber
+                before publishes to it are dropped.
+            rcvhwm: int - If given, the most messages queued on the SUB.
+            *args :- To pass to BaseNetwork
+            **kwargs :- To pass to Base Network (devices, serializer).
+        """
+        super().__init__(verbose=verbose, **kwargs)
+
+        # logger setup
+        self.logger = logging.getLogger("ZMQ_PubSub")
+        if verbose == 0:
+            self.logger.setLevel(logging.DEBUG)
+        elif verbose == 1:
+            self.logger.setLevel(logging.WARN)
+        else:
+            self.logger.setLevel(logging.CRITICAL)
+        self.logger.addHandler(ch)
+
+        # Who am I?
+        if device_name in self.device_number:
+            self.name = device_name
+        else:
+            self.logger.warning("Invalid device_name, defaulting to getuser()")
+            self.name = getpass.getuser()
+        self.number = self.device_number[self.name]
+
+        self.start_port = start_port
+        self.context = self.tuning.context()
+
+        # One socket for everything we publish or send. XPUB tells us who's
+        # subscribed, through their direct topics.
+        self.xpub = self.context.socket(zmq.XPUB)
+        if sndhwm is not None:
+            self.xpub.setsockopt(zmq.SNDHWM, sndhwm)
+        self.tuning.apply(self.xpub)
+        port = self.get_port(self.name)
+        self.xpub.bind(f"tcp://*:{port}")
+        self.logger.debug(f"Bound XPUB socket on port {port}")
+        self.subscribers = set()
+
+        # One socket for everything we receive, from every other device
+        self.sub = self.context.socket(zmq.SUB)
+        if rcvhwm is not None:
+            self.sub.setsockopt(zmq.RCVHWM, rcvhwm)
+        self.tuning.apply(self.sub)
+        self.topics = list(topics)
+        for topic in [*self.topics, self.direct_topic(self.name)]:
+            self.sub.setsockopt(zmq.SUBSCRIBE, topic.encode())
+
+        for device in self.device_number:
+            if device != self.name:
+                address = f"tcp://{self.get_ip(device)}:{self.get_port(device)}"
+                self.sub.connect(address)
+                self.logger.debug(f"Connected SUB socket to {device} at {address}")
+
+        # Messages received from one device while waiting on another
+        self.inbox = {name: deque() for name in self.device_number}
+
+        # Topic of the most recent message received
+        self.last_topic = None
+
+    def get_port(self, device: str) -> int:
+        """Returns the port that device's XPUB socket is bound to."""
+        return self.start_port + self.device_number[device]
+
+    @staticmethod
+    def direct_topic(device: str) -> str:
+        """Returns the topic only device receives."""
+        return f"{DIRECT}{device}"
+
+    def publish(self, topic: str, data, section_name=None) -> TransferStats:
+        """Publishes (data) to every device subscribed to topic.
+
+        data is serialized once, however many devices receive it.
+
+        topic - may not start with "@", which is for direct sends
+        section_name - if data is a Message, log its encoding time under this name
+
+        Returns the wire sizes of the published message, also kept in
+        self.last_send.
+        """
+        if topic.startswith(DIRECT):
+            raise ValueError(f"Topics starting with {DIRECT} are for send()")
+
+        frames = self._publish(topic, data, section_name)
+        self.last_send = TransferStats.from_frames(frames)
+        return self.last_send
+
+    def publish_with_timing(self, topic: str, data, logger, section_name):
+        """Publishes with timing, for subscribers' recv_with_timing()."""
+        msg = Message(data, logger)
+
+        msg.logger.log_section(section_name, Timer)
+
+        self.publish(topic, msg, f"{section_name}-encode")
+
+    def send(self, destination: str, data, section_name=None) -> TransferStats:
+        """Send (data) to destination alone.
+
+        Blocks until destination has connected, since PUB/SUB would drop
+        messages to it until then.
+
+        destination - a hostname, not an IP
+        section_name - if data is a Message, log its encoding time under this name
+
+        Returns the wire sizes of the sent message, also kept in self.last_send.
+        """
+        if destination not in self.subscribers:
+            self.wait_for_subscribers([destination])
+
+        frames = self._publish(self.direct_topic(destination), data, section_name)
+        self.last_send = TransferStats.from_frames(frames)
+        self._record(SEND, destination, frames, self.last_send.nbytes)
+        return self.last_send
+
+    def _publish(self, topic: str, data, section_name=None) -> list:
+        """Serializes data once and sends it as [topic, sender, *frames]."""
+        frames = self.serializer.dumps(data, section_name)
+        self.xpub.send_multipart(
+            [topic.encode(), self.name.encode(), *frames], copy=False
+        )
+        return frames
+
+    def wait_for_subscribers(
+        self, devices: Optional[Iterable[str]] = None, timeout: Optional[float] = None
+    ) -> bool:
+        """Waits until devices have connected, so they receive what's published.
+
+        Args:
+            devices: Iterable[str] - Devices to wait for. Defaults to all others.
+            timeout: float - Seconds to wait. None waits forever.
+
+        Returns:
+            bool - Whether all of them connected in time.
+        """
+        if devices is None:
+            devices = [device for device in self.device_number if device != self.name]
+        devices = set(devices)
+        waiting = devices - self.subscribers
+
+        deadline = None if timeout is None else time.time() + timeout
+        while waiting:
+            remaining = None if deadline is None else max(deadline - time.time(), 0)
+            if not self.xpub.poll(None if remaining is None else remaining * 1000):
+                return False
+
+            # Subscriptions arrive as \x01 + topic, unsubscriptions as \x00 + topic
+            event = self.xpub.recv()
+            topic = event[1:].decode()
+            if topic.startswith(DIRECT):
+                device = topic[len(DIRECT) :]
+                if event[:1] == b"\x01":
+                    self.subscribers.add(device)
+                else:
+                    self.subscribers.discard(device)
+            waiting = devices - self.subscribers
+
+        return True
+
+    def recv(self, source: str, section_name=None):
+        """Block while waiting to receive data from source.
+
+        Messages from other devices that arrive in the meantime are kept, in
+        order, for later calls to recv() or poll().
+
+        section_name - if a Message arrives, log its decoding time under this name
+        """
+        while not self.inbox[source]:
+            self._recv_into_inbox()
+
+        return self._decode(self.inbox[source].popleft(), source, section_name)
+
+    def _recv_into_inbox(self, flags=0) -> str:
+        """Waits for one message on the SUB, and returns who sent it.
+
+        Prefix matching also lets through messages sent to devices whose names
+        start with ours, which are dropped. With flags=zmq.NOBLOCK, raises
+        zmq.Again if nothing is waiting.
+        """
+        while True:
+            topic, sender, *frames = self.sub.recv_multipart(flags, copy=False)
+            topic = topic.bytes.decode()
+            sender = sender.bytes.decode()
+
+            if topic.startswith(DIRECT) and topic != self.direct_topic(self.name):
+                continue
+            if sender in self.inbox:
+                self.inbox[sender].append((topic, frames))
+                return sender
+
+            self.logger.warning(f"Dropping message from unknown device {sender}")
+
+    def _decode(self, entry, source, section_name=None):
+        """Deserializes a message taken from the inbox, recording its wire sizes."""
+        topic, frames = entry
+        self.last_recv = TransferStats.from_frames(frames)
+        self.last_source = source
+        self.last_topic = topic
+        self._record(RECV, source, frames, self.last_recv.nbytes)
+        return self.serializer.loads(frames, section_name)
+
+    def _recv_next(self, section_name=None, timeout=None):
+        """Takes the next message from any device, handling the inbox first.
+
+        The topic it came on is in last_topic. Messages for other devices are
+        dropped without extending timeout.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        while True:
+            sending_device = next(
+                (name for name, queue in self.inbox.items() if queue), None
+            )
+            if sending_device is not None:
+                break
+
+            remaining = None if deadline is None else max(deadline - time.time(), 0)
+            if not self.sub.poll(None if remaining is None else remaining * 1000):
+                return None
+            try:
+                sending_device = self._recv_into_inbox(zmq.NOBLOCK)
+            except zmq.Again:
+                # Only messages for other devices arrived
+                continue
+
+        msg = self._decode(
+            self.inbox[sending_device].popleft(), sending_device, section_name
+        )
+        return sending_device, msg
+
+    def close(self):
+        """Close all the sockets."""
+        self.xpub.close()
+        self.sub.close()
+
+        super().close()
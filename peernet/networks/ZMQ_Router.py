@@ -0,0 +1,216 @@
+"""Implementation of a PEERNet compatible network through ZMQ ROUTER/DEALER.
+
+ZMQ_Pair needs a bound and a connected PAIR socket for every pair of devices,
+so a fleet of N devices uses O(N^2) sockets and ports. Here, every device binds
+a single ROUTER socket for all incoming traffic, on port start_port + its
+device number, and opens one DEALER per peer it actually sends to. Each DEALER
+identifies itself with the sending device's name, so the ROUTER knows who a
+message came from without any port bookkeeping.
+
+The send(destination, data) / recv(source) API is the same as ZMQ_Pair's.
+"""
+
+import time
+from collections import deque
+from typing import Iterable
+
+from peernet.networks import BaseNetwork
+from peernet.networks import TransferStats
+from peernet.networks.trace import RECV, SEND
+
+from peernet.utils.custom_formatter import ch
+import logging
+import getpass
+import zmq
+
+
+class ZMQ_Router(BaseNetwork):
+    """Subclass of BaseNetwork that passes messages through one ROUTER per device.
+
+    Devices are addressed by name, and sockets to peers are only created once
+    something is sent to them.
+    """
+
+    _timeout_error = zmq.Again
+
+    def __init__(
+        self,
+        device_name,
+        start_port=5551,
+        verbose=0,
+        sndhwm=None,
+        rcvhwm=None,
+        *args,
+        **kwargs,
+    ):
+        """Constructor.
+
+        Args:
+            device_name: str - Name of this device in the devices mapping.
+            start_port: int - This device's ROUTER binds to start_port plus its
+                device number.
+            verbose: int - 0/1/2 scale for logging verbosity.
+            sndhwm: int - If given, the most messages queued per DEALER before
+                send() blocks.
+            rcvhwm: int - If given, the most messages queued on the ROUTER.
+            *args :- To pass to BaseNetwork
+            **kwargs :- To pass to Base Network (devices, serializer).
+        """
+        super().__init__(verbose=verbose, **kwargs)
+
+        # logger setup
+        self.logger = logging.getLogger("ZMQ_Router")
+        if verbose == 0:
+            self.logger.setLevel(logging.DEBUG)
+        elif verbose == 1:
+            self.logger.setLevel(logging.WARN)
+        else:
+            self.logger.setLevel(logging.CRITICAL)
+        self.logger.addHandler(ch)
+
+        # Who am I?
+        if device_name in self.device_number:
+            self.name = device_name
+        else:
+            self.logger.warning("Invalid device_name, defaulting to getuser()")
+            self.name = getpass.getuser()
+        self.number = self.device_number[self.name]
+
+        self.start_port = start_port
+        self.context = self.tuning.context()
+
+        # One socket for everything we receive
+        self.router = self.context.socket(zmq.ROUTER)
+        if rcvhwm is not None:
+            self.router.setsockopt(zmq.RCVHWM, rcvhwm)
+        self.tuning.apply(self.router)
+        self.sndhwm = sndhwm
+        port = self.get_port(self.name)
+        self.router.bind(f"tcp://*:{port}")
+        self.logger.debug(f"Bound ROUTER socket on port {port}")
+
+        # DEALER sockets to peers, created on the first send to each
+        self.dealers = dict()
+
+        # Messages received from one peer while waiting on another
+        self.inbox = {name: deque() for name in self.device_number}
+
+    def get_port(self, device: str) -> int:
+        """Returns the port that device's ROUTER socket is bound to."""
+        return self.start_port + self.device_number[device]
+
+    def connect_peers(self, peers: Iterable[str]) -> float:
+        """Opens the DEALER sockets to peers now, rather than on the first send.
+
+        Returns:
+            float - Seconds spent opening sockets that didn't exist yet.
+        """
+        start = time.time()
+        for peer in peers:
+            self._get_dealer(peer)
+
+        return time.time() - start
+
+    def _get_dealer(self, destination: str):
+        """Returns the DEALER socket to destination, connecting it if needed."""
+        if destination not in self.dealers:
+            start = time.time()
+            dealer = self.context.socket(zmq.DEALER)
+            dealer.setsockopt(zmq.IDENTITY, self.name.encode())
+            if self.sndhwm is not None:
+                dealer.setsockopt(zmq.SNDHWM, self.sndhwm)
+            self.tuning.apply(dealer)
+
+            address = f"tcp://{self.get_ip(destination)}:{self.get_port(destination)}"
+            dealer.connect(address)
+            self.dealers[destination] = dealer
+            self.setup_times[destination] = time.time() - start
+            self.logger.debug(f"Connected DEALER socket to {destination} at {address}")
+
+        return self.dealers[destination]
+
+    def send(self, destination: str, data, section_name=None) -> TransferStats:
+        """Send (data) to destination.
+
+        destination - a hostname, not an IP
+        section_name - if data is a Message, log its encoding time under this name
+
+        Returns the wire sizes of the sent message, also kept in self.last_send.
+        """
+        frames = self.serializer.dumps(data, section_name)
+        self._get_dealer(destination).send_multipart(frames, copy=False)
+
+        self.last_send = TransferStats.from_frames(frames)
+        self._record(SEND, destination, frames, self.last_send.nbytes)
+        return self.last_send
+
+    def recv(self, source: str, section_name=None):
+        """Block while waiting to receive data from source.
+
+        Messages from other devices that arrive in the meantime are kept, in
+        order, for later calls to recv() or poll().
+
+        section_name - if a Message arrives, log its decoding time under this name
+        """
+        while not self.inbox[source]:
+            self._recv_into_inbox()
+
+        return self._decode(self.inbox[source].popleft(), source, section_name)
+
+    def _recv_into_inbox(self, flags=0) -> str:
+        """Waits for one message on the ROUTER, and returns who sent it.
+
+        With flags=zmq.NOBLOCK, raises zmq.Again if nothing is waiting.
+        """
+        while True:
+            identity, *frames = self.router.recv_multipart(flags, copy=False)
+            sender = identity.bytes.decode()
+            if sender in self.inbox:
+                self.inbox[sender].append(frames)
+                return sender
+
+            self.logger.warning(f"Dropping message from unknown device {sender}")
+
+    def _decode(self, frames, source, section_name=None):
+        """Deserializes frames taken from the inbox, recording their wire sizes."""
+        self.last_recv = TransferStats.from_frames(frames)
+        self.last_source = source
+        self._record(RECV, source, frames, self.last_recv.nbytes)
+        return self.serializer.loads(frames, section_name)
+
+    def _recv_next(self, section_name=None, timeout=None):
+        """Takes the next message from any device, handling the inbox first.
+
+        Messages from unknown devices are dropped without extending timeout.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        while True:
+            sending_device = next(
+                (name for name, queue in self.inbox.items() if queue), None
+            )
+            if sending_device is not None:
+                break
+
+            remaining = None if deadline is None else max(deadline - time.time(), 0)
+            if not self.router.poll(None if remaining is None else remaining * 1000):
+                return None
+            try:
+                self._recv_into_inbox(zmq.NOBLOCK)
+            except zmq.Again:
+                # Only messages from unknown devices arrived
+                continue
+
+        msg = self._decode(
+            self.inbox[sending_device].popleft(), sending_device, section_name
+        )
+        return sending_device, msg
+
+    def close(self):
+        """Close all the sockets."""
+        self.router.close()
+
+        for dealer in self.dealers.values():
+            dealer.close()
+
+        super().close()
@@ -1,6 +1,30 @@
-"""Implements a PEERNet compatible network through ZQM using UDP."""
+"""Implements a PEERNet compatible network through ZQM using UDP.
+
+Each message is serialized into a single datagram, which is then split into
+chunks small enough for one RADIO message each (see
+peernet.networks.fragmentation). The receiver reassembles frames per sender and
+keeps track of frames that were lost or only partially delivered.
+
+Every device sends on a RADIO group named after itself, so receivers can tell
+senders apart by group as well as by port.
+"""
+
+import copy
+from collections import deque
 
 from peernet.networks import BaseNetwork
+from peernet.networks import TransferStats
+from peernet.networks.fragmentation import (
+    CHUNK_HEADER,
+    Reassembler,
+    ReassemblyStats,
+    fragment,
+)
+from peernet.networks.framing import as_buffer
+from peernet.networks.serializers import join_frames, split_frames
+from peernet.networks.Messages import Message
+from peernet.networks.trace import RECV, SEND
+from peernet.metrics import Value
 from peernet.utils.custom_formatter import ch
 import logging
 import getpass
@@ -13,11 +37,19 @@ class ZMQ_UDP(BaseNetwork):
     Radio Dish is currently the only ZMQ messaging pattern that supports UDP.
     """
 
+    _timeout_error = zmq.Again
+
+    # ZMQ's UDP engine carries at most 8192 bytes per message, group included
+    MAX_CHUNK_SIZE = 8000
+
     def __init__(
         self,
         device_name: str,
         start_port: int = 5551,
         verbose: int = 0,
+        chunk_size: int = MAX_CHUNK_SIZE,
+        reassembly_timeout: float = 0.5,
+        rcvtimeo: int = 1000,
         *args,
         **kwargs,
     ):
@@ -27,8 +59,13 @@ class ZMQ_UDP(BaseNetwork):
             device_name:str - Name to assign this device.
             start_port:int - Port to start assigning ports from.
             verbose:int - 0/1/2 scale for logging verbosity.
+            chunk_size:int - Maximum bytes per datagram, chunk header included.
+            reassembly_timeout:float - Seconds to wait for the missing chunks of
+                a frame before counting it as partially delivered.
+            rcvtimeo:int - Milliseconds recv() waits for a chunk before raising
+                zmq.Again. -1 waits forever.
             *args :- To pass to BaseNetwork
-            **kwargs :- To pass to Base Network.
+            **kwargs :- To pass to Base Network (devices, serializer).
         """
         super().__init__(verbose=verbose, **kwargs)
 
@@ -50,6 +87,26 @@ class ZMQ_UDP(BaseNetwork):
             self.name = getpass.getuser()
         self.number = self.device_number[self.name]
 
+        if not CHUNK_HEADER.size < chunk_size <= self.MAX_CHUNK_SIZE:
+            raise ValueError(
+                f"chunk_size must be in ({CHUNK_HEADER.size}, {self.MAX_CHUNK_SIZE}]"
+            )
+        self.chunk_size = chunk_size
+
+        # Outgoing frame IDs and incoming reassembly, per peer
+        self.next_frame_id = {name: 0 for name in self.device_number}
+        self.reassemblers = {
+            name: Reassembler(reassembly_timeout) for name in self.device_number
+        }
+
+        # Losses seen while receiving the most recent frame, and what the
+        # reassembly stats looked like after the previous frame from each peer
+        self.last_loss = ReassemblyStats()
+        self._loss_mark = {name: ReassemblyStats() for name in self.device_number}
+
+        # Bytes of chunks received towards the next frame from each peer
+        self._chunk_bytes = {name: 0 for name in self.device_number}
+
         # set the range of ports that we're going to use, 2d list
         self.ports = [
             [start_port + j for i in range(self.NUM_DEVICES)]
@@ -61,32 +118,29 @@ class ZMQ_UDP(BaseNetwork):
         self.send_sockets = [None] * self.NUM_DEVICES
         self.recv_sockets = [None] * self.NUM_DEVICES
 
-        # Create one more list to keep track of what group numbers I assign
-        # self.groups = [None]*self.NUM_DEVICES
-
         # Reverse mapping used to find out what name sent me a message when a particular
         # socket I poll has a new message
         self.recv_socket_mapping = dict()
 
-        context = zmq.Context()
+        self.rcvtimeo = rcvtimeo
+        context = self.tuning.context()
 
         # For the udp implementation, let's setup the receiving sockets, of type
         # DISH, first, and bind these to ports on our device.
         for send_device in self.device_number:
             send_device_number = self.device_number[send_device]
-            dish = context.socket(zmq.DISH)
+            dish = self.tuning.apply(context.socket(zmq.DISH))
 
             port = self.ports[send_device_number][self.number]
 
-            # udp stuff
-            dish.rcvtimeo = 1_000  # Corresponds to 1 second, don't know what this does
+            # udp stuff, recv() gives up after rcvtimeo milliseconds
+            dish.rcvtimeo = rcvtimeo
             dish.bind(f"udp://*:{port}")
-            group = "1"  # str(send_device_number)
+            group = send_device
             dish.join(group)
 
             self.recv_sockets[send_device_number] = dish
             self.recv_socket_mapping[dish] = send_device
-            # self.groups[send_device_number] = group
 
             self.logger.debug(
                 f"Established DISH socket to receive from {send_device}, device number: {send_device_number}, port: {port}, group: {group}"  # noqa: E501
@@ -99,7 +153,7 @@ class ZMQ_UDP(BaseNetwork):
             recv_dns_name = self.get_ip(recv_device)
 
             # udp stuff
-            radio = context.socket(zmq.RADIO)
+            radio = self.tuning.apply(context.socket(zmq.RADIO))
             port = self.ports[self.number][recv_device_number]
             radio.connect(f"udp://{recv_dns_name}:{port}")
 
@@ -109,30 +163,181 @@ class ZMQ_UDP(BaseNetwork):
                 f"Established RADIO socket to send to {recv_device}, device_number: {recv_device_number}, port: {port}"  # noqa: E501
             )
 
-        # TODO: Set up polling here
+        # set up some objects for polling
+        self.poller = zmq.Poller()
+        for dish in self.recv_sockets:
+            self.poller.register(dish, zmq.POLLIN)
+
+        # Sockets that fired on the last poll, and may hold more chunks
+        self._ready = deque()
+
+        # Section poll() logs lost frames under, while it runs
+        self._loss_section = None
 
-    def send(self, destination: str, data):
+    def send(self, destination: str, data, section_name=None) -> TransferStats:
         """Send (data) to destination.
 
         destination - a hostname, not an IP or dns name
+        section_name - if data is a Message, log its encoding time under this name
+
+        Returns the wire sizes of the sent datagram, also kept in self.last_send.
         """
         # lookup the right socket to use
         dest_number = self.device_number[destination]
         radio = self.send_sockets[dest_number]
-        # group = self.groups[dest_number]
 
-        # Send using default pickle serialization
-        radio.send_pyobj(data, group="1")
+        # RADIO only sends single-part messages, so join the serialized frames
+        # and split the result into chunks that each fit in a datagram
+        frames = self.serializer.dumps(data, section_name)
+        chunks = fragment(
+            join_frames(frames), self.next_frame_id[destination], self.chunk_size
+        )
+        self.next_frame_id[destination] += 1
+
+        for chunk in chunks:
+            radio.send(chunk, group=self.name)
+
+        self.last_send = TransferStats(
+            nbytes=sum(len(chunk) for chunk in chunks),
+            header_bytes=memoryview(as_buffer(frames[0])).nbytes,
+            frames=len(frames),
+        )
+        self._record(SEND, destination, frames, self.last_send.nbytes)
+        return self.last_send
+
+    def recv(self, source: str, section_name=None):
+        """Block while waiting to receive a complete frame from source.
+
+        Raises zmq.Again if no chunk arrives for rcvtimeo milliseconds, which
+        is set in the constructor.
+
+        Frames lost or partially delivered in the meantime are counted in
+        self.last_loss.
+
+        section_name - if a Message arrives, log its decoding time under this name
+        """
+        return self._recv_from(source, section_name)
+
+    def _recv_from(self, source: str, section_name=None, flags=0):
+        """Receives chunks from source until one completes a frame, and decodes it.
 
-    def recv(self, source: str):
-        """Block for a maximum of rcvtimeo while waiting to receive data from source.
-        
-        If you would like to change rcvtimeo, edit the constructor.
+        Chunks of incomplete frames are kept for the next call, so with
+        flags=zmq.NOBLOCK this raises zmq.Again once no chunk is waiting.
         """
-        source_device_number = self.device_number[source]
-        dish = self.recv_sockets[source_device_number]
+        dish = self.recv_sockets[self.device_number[source]]
+        reassembler = self.reassemblers[source]
+
+        datagram = None
+        while datagram is None:
+            chunk = dish.recv(flags, copy=False)
+            self._chunk_bytes[source] += len(chunk)
+            datagram = reassembler.add(chunk)
+
+        self.last_loss = reassembler.stats.since(self._loss_mark[source])
+        self._loss_mark[source] = copy.copy(reassembler.stats)
+
+        frames = split_frames(datagram)
+        self.last_recv = TransferStats(
+            nbytes=self._chunk_bytes[source],
+            header_bytes=frames[0].nbytes,
+            frames=len(frames),
+        )
+        self._chunk_bytes[source] = 0
+        self.last_source = source
+        self._record(RECV, source, frames, self.last_recv.nbytes)
+
+        return self.serializer.loads(frames, section_name)
 
-        return dish.recv_pyobj()
+    def _log_loss(self, logger, section_name):
+        """Logs the frames lost on the way to the most recently received one."""
+        logger.log_section(f"{section_name}-lost-frames", Value).end_collection(
+            self.last_loss.frames_lost
+        )
+        logger.log_section(f"{section_name}-partial-frames", Value).end_collection(
+            self.last_loss.frames_partial
+        )
+
+    def _finish_recv_with_timing(
+        self, recv_msg, logger, section_name, log_bytes, source=None
+    ):
+        """Also logs the frames lost on the way to the one we just received."""
+        self._log_loss(recv_msg.logger, section_name)
+
+        return super()._finish_recv_with_timing(
+            recv_msg, logger, section_name, log_bytes, source
+        )
+
+    def poll(
+        self,
+        max_msg_count=None,
+        callback=None,
+        decode_section=None,
+        encode_section=None,
+        timeout=None,
+        stop=None,
+        ack=True,
+        loss_section=None,
+    ) -> int:
+        """Polls for frames on all DISH sockets, replying to each sender.
+
+        Replies are sent over UDP too, so they may be lost on the way back.
+
+        Args:
+            max_msg_count: int - Return after handling this many messages.
+                None polls until timeout or stop says otherwise.
+            callback: Callable - Called with each message; its return value is
+                sent back to the sender, None included, unless it's NO_REPLY.
+                Without a callback, we send "ack", unless ack is False.
+            decode_section: str - If given, log the time spent decoding
+                received Messages under this name.
+            encode_section: str - If given, log the time spent encoding
+                replies under this name.
+            timeout: float - Return if no message arrives for this many seconds.
+            stop: Callable[[], bool] - Checked after every message. Return once
+                it returns True.
+            ack: bool - Whether to send "ack" when there's no callback. If
+                False, None results aren't sent back either.
+            loss_section: str - If given, log the frames lost before each
+                received Message as {loss_section}-lost-frames and
+                {loss_section}-partial-frames in its logger.
+
+        Returns:
+            int - Number of messages handled.
+        """
+        self._loss_section = loss_section
+        try:
+            return super().poll(
+                max_msg_count,
+                callback,
+                decode_section,
+                encode_section,
+                timeout,
+                stop,
+                ack,
+            )
+        finally:
+            self._loss_section = None
+
+    def _recv_next(self, section_name=None, timeout=None):
+        """Receives the next frame from any device, emptying sockets that fired."""
+        while True:
+            while self._ready:
+                sending_device = self.recv_socket_mapping[self._ready[0]]
+                try:
+                    msg = self._recv_from(sending_device, section_name, zmq.NOBLOCK)
+                except zmq.Again:
+                    self._ready.popleft()
+                    continue
+
+                if self._loss_section and isinstance(msg, Message):
+                    self._log_loss(msg.logger, self._loss_section)
+                return sending_device, msg
+
+            timeout_ms = None if timeout is None else int(timeout * 1000)
+            ready = self.poller.poll(timeout_ms)
+            if not ready:
+                return None
+            self._ready.extend(receiver for receiver, _ in ready)
 
     def close(self):
         """Close all the sockets."""
@@ -141,3 +346,5 @@ class ZMQ_UDP(BaseNetwork):
 
         for socket in self.recv_sockets:
             socket.close()
+
+        super().close()
@@ -7,14 +7,33 @@ logger = logging.getLogger("NETWORKS")
 logger.setLevel(logging.WARNING)
 logger.addHandler(ch)
 
-from .Messages import Message  # noqa: E402, F401
+from .Messages import NO_REPLY, ControlMessage, Message  # noqa: E402, F401
+from .serializers import (  # noqa: E402, F401
+    Serializer,
+    get_serializer,
+    register_serializer,
+)
 
 #Networks submodule is old, and should not be used. Some legacy code 
 #Might have it as a dependency
 #from .Networks import PyZMQ_Network  # noqa: E402, F401
+from .TransferStats import TransferStats  # noqa: E402, F401
+from .tuning import Tuning  # noqa: E402, F401
 from .BaseNetwork import BaseNetwork  # noqa: E402, F401
 from .ZMQ_Pair import ZMQ_Pair  # noqa: E402, F401
+from .AsyncZMQ_Pair import AsyncZMQ_Pair  # noqa: E402, F401
 from .ZMQ_UDP import ZMQ_UDP  # noqa: E402, F401
+from .ZMQ_Router import ZMQ_Router  # noqa: E402, F401
+from .ZMQ_PubSub import ZMQ_PubSub  # noqa: E402, F401
+from .SharedMemory_Pair import SharedMemory_Pair  # noqa: E402, F401
+from .ClockSync import ClockProbe, ClockSync  # noqa: E402, F401
+from .streaming import FrameQueue  # noqa: E402, F401
+from .workers import BatchPool, WorkerPool  # noqa: E402, F401
+from .oneway import OneWayMonitor, StreamStats  # noqa: E402, F401
+from .ImpairedNetwork import ImpairedNetwork  # noqa: E402, F401
+from .Prober import LinkStats, ProbeResponder, Prober  # noqa: E402, F401
+from .trace import TraceReader, TraceRecord, TraceWriter  # noqa: E402, F401
+from .ReplayNetwork import ReplayNetwork  # noqa: E402, F401
 
 try:
     from .ROS_Network import ROS_Network  # noqa: E402, F401
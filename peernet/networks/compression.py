@@ -0,0 +1,361 @@
+"""Payload compression between the sensor and the network.
+
+Samples are usually images, and sent as raw pixels they are large. A codec
+compresses a sample into a CompressedPayload before it's sent, and the server
+decompresses it before inference, trading compute time on both ends for bytes
+on the wire. We ship:
+
+1. "none" - passes samples through, so runs with and without compression share
+   a csv layout.
+2. "zlib" and "lz4" - lossless. lz4 requires the optional lz4 package.
+3. "jpeg" and "webp" - lossy, at a quality setting, through PIL.
+
+AdaptiveCodec picks one of these for every sample from the upload throughput
+measured on the previous iterations, so a single run shows when compression
+pays for itself.
+
+Typical usage example:
+    codec = get_codec("jpeg", quality=80)
+    with Timing(iter_l, "compress"):
+        payload = codec.compress(sample)
+    ...
+    with Timing(iter_l, "decompress"):
+        sample = decompress(payload)
+"""
+
+import pickle
+import zlib
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any, Dict, Optional, Sequence, Tuple, Type, Union
+
+import numpy as np
+
+try:
+    import lz4.frame  # type: ignore
+except ImportError:
+    lz4 = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+@dataclass
+class CompressedPayload:
+    """A compressed sample, with what's needed to rebuild it.
+
+    Attributes:
+        codec: str - Name of the codec that compressed it.
+        data: Any - Compressed bytes, or the sample itself for "none".
+        meta: dict - Type, shape, etc. of the original sample.
+    """
+
+    codec: str
+    data: Any
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+def _to_bytes(obj: Any) -> Tuple[bytes, Dict[str, Any]]:
+    """Flattens a sample into raw bytes, and what's needed to rebuild it."""
+    if isinstance(obj, np.ndarray) and not obj.dtype.hasobject:
+        meta = {
+            "kind": "ndarray",
+            "dtype": np.lib.format.dtype_to_descr(obj.dtype),
+            "shape": obj.shape,
+        }
+        return np.ascontiguousarray(obj).tobytes(), meta
+
+    if Image is not None and isinstance(obj, Image.Image):
+        return obj.tobytes(), {"kind": "image", "mode": obj.mode, "size": obj.size}
+
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj), {"kind": "bytes"}
+
+    return pickle.dumps(obj, protocol=5), {"kind": "pickle"}
+
+
+def _from_bytes(data: bytes, meta: Dict[str, Any]) -> Any:
+    """Rebuilds a sample flattened by _to_bytes()."""
+    kind = meta["kind"]
+    if kind == "ndarray":
+        dtype = np.lib.format.descr_to_dtype(meta["dtype"])
+        return np.frombuffer(data, dtype=dtype).reshape(meta["shape"])
+
+    if kind == "image":
+        return Image.frombytes(meta["mode"], meta["size"], data)
+
+    if kind == "bytes":
+        return data
+
+    return pickle.loads(data)
+
+
+class Codec:
+    """Base class for codecs. Subclasses implement compress() and decompress()."""
+
+    name = "base"
+    lossy = False
+
+    def __init__(self, **kwargs) -> None:
+        """Constructor. Codecs ignore settings they don't use."""
+
+    def accepts(self, obj: Any) -> bool:
+        """Whether compress() takes obj. Codecs take any sample by default."""
+        return True
+
+    def compress(self, obj: Any) -> CompressedPayload:
+        """Compresses a sample."""
+        raise NotImplementedError("Subclass must implement compress method")
+
+    def decompress(self, payload: CompressedPayload) -> Any:
+        """Rebuilds a sample compressed by compress()."""
+        raise NotImplementedError("Subclass must implement decompress method")
+
+
+class NoneCodec(Codec):
+    """Sends samples as they are."""
+
+    name = "none"
+
+    def compress(self, obj: Any) -> CompressedPayload:  # noqa: D102
+        return CompressedPayload(self.name, obj)
+
+    def decompress(self, payload: CompressedPayload) -> Any:  # noqa: D102
+        return payload.data
+
+
+class ZlibCodec(Codec):
+    """Lossless zlib (deflate) compression."""
+
+    name = "zlib"
+
+    def __init__(self, level: int = 1, **kwargs) -> None:
+        """Constructor.
+
+        Args:
+            level: int - 1 (fastest) to 9 (smallest).
+            **kwargs: Settings for other codecs, ignored here.
+        """
+        self.level = level
+
+    def compress(self, obj: Any) -> CompressedPayload:  # noqa: D102
+        data, meta = _to_bytes(obj)
+        return CompressedPayload(self.name, zlib.compress(data, self.level), meta)
+
+    def decompress(self, payload: CompressedPayload) -> Any:  # noqa: D102
+        return _from_bytes(zlib.decompress(payload.data), payload.meta)
+
+
+class LZ4Codec(Codec):
+    """Lossless lz4 compression, much faster than zlib at a lower ratio."""
+
+    name = "lz4"
+
+    def __init__(self, **kwargs) -> None:  # noqa: D107
+        if lz4 is None:
+            raise ImportError(
+                "The lz4 codec requires lz4. Install this package with the lz4 option."
+            )
+
+    def compress(self, obj: Any) -> CompressedPayload:  # noqa: D102
+        data, meta = _to_bytes(obj)
+        return CompressedPayload(self.name, lz4.frame.compress(data), meta)
+
+    def decompress(self, payload: CompressedPayload) -> Any:  # noqa: D102
+        return _from_bytes(lz4.frame.decompress(payload.data), payload.meta)
+
+
+class ImageCodec(Codec):
+    """Lossy image compression through PIL.
+
+    Takes PIL images, or uint8 arrays of shape (H, W) or (H, W, 3), and gives
+    back the same type.
+    """
+
+    lossy = True
+    format = None
+
+    def __init__(self, quality: int = 75, **kwargs) -> None:
+        """Constructor.
+
+        Args:
+            quality: int - 1 (smallest) to 100 (best looking).
+            **kwargs: Settings for other codecs, ignored here.
+        """
+        if Image is None:
+            raise ImportError(f"The {self.name} codec requires pillow.")
+        self.quality = quality
+
+    def accepts(self, obj: Any) -> bool:  # noqa: D102
+        if isinstance(obj, np.ndarray):
+            return obj.dtype == np.uint8 and (
+                obj.ndim == 2 or (obj.ndim == 3 and obj.shape[2] == 3)
+            )
+        return isinstance(obj, Image.Image)
+
+    def compress(self, obj: Any) -> CompressedPayload:  # noqa: D102
+        if isinstance(obj, np.ndarray):
+            image = Image.fromarray(obj)
+            meta = {"kind": "ndarray"}
+        elif isinstance(obj, Image.Image):
+            image = obj
+            meta = {"kind": "image", "mode": obj.mode}
+        else:
+            raise TypeError(f"Can't compress object of type {type(obj)} as an image")
+
+        # JPEG has no alpha or palettes
+        if image.mode not in ("L", "RGB"):
+            image = image.convert("RGB")
+
+        buffer = BytesIO()
+        image.save(buffer, format=self.format, quality=self.quality)
+        return CompressedPayload(self.name, buffer.getvalue(), meta)
+
+    def decompress(self, payload: CompressedPayload) -> Any:  # noqa: D102
+        image = Image.open(BytesIO(payload.data))
+        if payload.meta["kind"] == "ndarray":
+            return np.asarray(image)
+
+        image.load()
+        if image.mode != payload.meta["mode"]:
+            image = image.convert(payload.meta["mode"])
+        return image
+
+
+class JPEGCodec(ImageCodec):
+    """JPEG at a quality setting."""
+
+    name = "jpeg"
+    format = "JPEG"
+
+
+class WebPCodec(ImageCodec):
+    """WebP at a quality setting."""
+
+    name = "webp"
+    format = "WEBP"
+
+
+class AdaptiveCodec(Codec):
+    """Picks a codec for every sample from the measured upload throughput.
+
+    The slower the link, the more compression is worth its compute time. Tiers
+    map a minimum throughput to the codec used above it; the default sends raw
+    samples over fast links, lz4 (or zlib) over medium ones, and JPEG below.
+    Samples the selected codec doesn't take, like strings for JPEG, are
+    compressed losslessly instead.
+    """
+
+    name = "adaptive"
+
+    def __init__(
+        self,
+        tiers: Optional[Sequence[Tuple[float, str]]] = None,
+        smoothing: float = 0.2,
+        quality: int = 75,
+        **kwargs,
+    ) -> None:
+        """Constructor.
+
+        Args:
+            tiers: Sequence[Tuple[float, str]] - (minimum bits per second,
+                codec name) pairs.
+            smoothing: float - Weight of each new measurement in the moving
+                average of throughput.
+            quality: int - Quality of lossy codecs.
+            **kwargs: Settings for other codecs, ignored here.
+        """
+        lossless = "lz4" if lz4 is not None else "zlib"
+        if tiers is None:
+            tiers = [(200e6, "none"), (50e6, lossless), (0, "jpeg")]
+
+        self.tiers = sorted(tiers, reverse=True)
+        self.smoothing = smoothing
+        self.codecs = {
+            name: get_codec(name, quality=quality) for _, name in self.tiers
+        }
+
+        self.fallback = get_codec(lossless)
+
+        # Bits per second, None until the first measurement
+        self.throughput = None
+
+    def update(self, throughput: float) -> None:
+        """Adds a measurement of the upload throughput, in bits per second."""
+        if not np.isfinite(throughput) or throughput <= 0:
+            return
+
+        if self.throughput is None:
+            self.throughput = throughput
+        else:
+            self.throughput += self.smoothing * (throughput - self.throughput)
+
+    def select(self) -> Codec:
+        """Returns the codec for the current throughput.
+
+        Before any measurement, this is the fastest tier's codec.
+        """
+        if self.throughput is None:
+            return self.codecs[self.tiers[0][1]]
+
+        for min_throughput, name in self.tiers:
+            if self.throughput >= min_throughput:
+                return self.codecs[name]
+
+        return self.codecs[self.tiers[-1][1]]
+
+    def compress(self, obj: Any) -> CompressedPayload:  # noqa: D102
+        codec = self.select()
+        if not codec.accepts(obj):
+            codec = self.fallback
+        return codec.compress(obj)
+
+    def decompress(self, payload: CompressedPayload) -> Any:  # noqa: D102
+        return decompress(payload)
+
+
+CODECS: Dict[str, Type[Codec]] = {
+    codec.name: codec
+    for codec in (NoneCodec, ZlibCodec, LZ4Codec, JPEGCodec, WebPCodec, AdaptiveCodec)
+}
+
+
+def register_codec(name: str, codec: Type[Codec]) -> None:
+    """Makes a custom codec available by name."""
+    CODECS[name] = codec
+
+
+def get_codec(codec: Union[str, Codec], **kwargs) -> Codec:
+    """Returns a codec instance.
+
+    Args:
+        codec: Union[str, Codec] - A registered codec name, or an instance,
+            which is returned as is.
+        **kwargs: Settings such as quality or level, ignored by codecs that
+            don't use them.
+    """
+    if isinstance(codec, Codec):
+        return codec
+
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec}. Options are {list(CODECS)}")
+
+    return CODECS[codec](**kwargs)
+
+
+# One instance per codec for decompression, whatever settings compressed it
+_decoders: Dict[str, Codec] = dict()
+
+
+def decompress(payload: Any) -> Any:
+    """Rebuilds a sample from a CompressedPayload. Anything else is returned as is."""
+    if not isinstance(payload, CompressedPayload):
+        return payload
+
+    if payload.codec not in _decoders:
+        _decoders[payload.codec] = get_codec(payload.codec)
+
+    return _decoders[payload.codec].decompress(payload)
+
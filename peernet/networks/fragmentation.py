@@ -0,0 +1,178 @@
+"""Application-level fragmentation and reassembly for datagram transports.
+
+ZMQ's UDP transport sends every message as a single datagram, and anything
+bigger than a datagram (practically, any image) either fails or is fragmented
+by IP, where losing one fragment silently loses the whole frame. Instead, we
+split each serialized message ("frame") into chunks that fit a datagram, each
+tagged with a frame ID, its chunk index, and the chunk count. The receiver
+reassembles complete frames, gives up on incomplete ones after a timeout, and
+keeps loss statistics so lossy links can be characterized per frame.
+
+Typical usage example:
+    for chunk in fragment(datagram, frame_id, chunk_size=8000):
+        radio.send(chunk, group=group)
+
+    reassembler = Reassembler(timeout=0.5)
+    while (datagram := reassembler.add(dish.recv())) is None:
+        pass
+"""
+
+import struct
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional
+
+# frame id, chunk index, chunk count
+CHUNK_HEADER = struct.Struct("!IHH")
+
+_ID_SPACE = 2**32
+
+
+def fragment(datagram: Any, frame_id: int, chunk_size: int) -> List[bytes]:
+    """Splits a datagram into chunks of at most chunk_size bytes.
+
+    Args:
+        datagram: Any - Bytes-like object to split.
+        frame_id: int - ID shared by all chunks of this datagram.
+        chunk_size: int - Maximum size of a chunk, header included.
+
+    Returns:
+        List - Chunks, each starting with CHUNK_HEADER.
+    """
+    view = memoryview(datagram).cast("B")
+    step = chunk_size - CHUNK_HEADER.size
+    count = max(1, -(-view.nbytes // step))
+    if count >= 2**16:
+        raise ValueError(f"{view.nbytes} bytes need more than 65535 chunks")
+
+    frame_id %= _ID_SPACE
+    return [
+        CHUNK_HEADER.pack(frame_id, i, count) + view[i * step : (i + 1) * step]
+        for i in range(count)
+    ]
+
+
+@dataclass
+class ReassemblyStats:
+    """Running totals kept by a Reassembler.
+
+    Attributes:
+        frames_delivered: int - Frames that arrived complete.
+        frames_partial: int - Frames that timed out with some chunks missing.
+        frames_lost: int - Frames none of whose chunks ever arrived.
+        chunks_received: int - Chunks that arrived, including duplicates.
+        chunks_missing: int - Chunks missing from partial frames.
+    """
+
+    frames_delivered: int = 0
+    frames_partial: int = 0
+    frames_lost: int = 0
+    chunks_received: int = 0
+    chunks_missing: int = 0
+
+    def since(self, earlier: "ReassemblyStats") -> "ReassemblyStats":
+        """Returns what changed between an earlier copy of these stats and now."""
+        return ReassemblyStats(
+            **{
+                f.name: getattr(self, f.name) - getattr(earlier, f.name)
+                for f in fields(self)
+            }
+        )
+
+
+@dataclass
+class _PartialFrame:
+    first_seen: float
+    count: int
+    chunks: Dict[int, memoryview] = field(default_factory=dict)
+
+
+class Reassembler:
+    """Rebuilds datagrams from the chunks of a single sender."""
+
+    def __init__(self, timeout: float = 0.5, history: int = 1024):
+        """Constructor.
+
+        Args:
+            timeout: float - Seconds to wait for the rest of a frame after its
+                first chunk arrives.
+            history: int - How many finished frame IDs to remember, so that
+                late chunks of finished frames are ignored.
+        """
+        self.timeout = timeout
+        self.history = history
+        self.stats = ReassemblyStats()
+
+        self._partial: Dict[int, _PartialFrame] = dict()
+        self._finished: OrderedDict = OrderedDict()
+        self._newest: Optional[int] = None
+
+    def add(self, chunk: Any, now: Optional[float] = None) -> Optional[Any]:
+        """Adds a received chunk.
+
+        Args:
+            chunk: Any - Bytes-like chunk produced by fragment().
+            now: float - Arrival time, defaults to time.monotonic().
+
+        Returns:
+            The reassembled datagram if this chunk completed it, None otherwise.
+        """
+        now = time.monotonic() if now is None else now
+        self.expire(now)
+
+        view = memoryview(chunk).cast("B")
+        frame_id, index, count = CHUNK_HEADER.unpack_from(view)
+        self.stats.chunks_received += 1
+
+        if frame_id in self._finished:
+            return None
+
+        if frame_id not in self._partial:
+            self._track(frame_id)
+            self._partial[frame_id] = _PartialFrame(now, count)
+
+        frame = self._partial[frame_id]
+        frame.chunks[index] = view[CHUNK_HEADER.size :]
+        if len(frame.chunks) < frame.count:
+            return None
+
+        del self._partial[frame_id]
+        self._finish(frame_id)
+        self.stats.frames_delivered += 1
+
+        if frame.count == 1:
+            return frame.chunks[0]
+        return b"".join(frame.chunks[i] for i in range(frame.count))
+
+    def expire(self, now: Optional[float] = None) -> None:
+        """Gives up on frames that have been incomplete for longer than timeout."""
+        now = time.monotonic() if now is None else now
+
+        for frame_id, frame in list(self._partial.items()):
+            if now - frame.first_seen > self.timeout:
+                del self._partial[frame_id]
+                self._finish(frame_id)
+                self.stats.frames_partial += 1
+                self.stats.chunks_missing += frame.count - len(frame.chunks)
+
+    def _track(self, frame_id: int) -> None:
+        """Accounts for frame IDs skipped between the newest frame and this one."""
+        if self._newest is None:
+            self._newest = frame_id
+            return
+
+        gap = (frame_id - self._newest) % _ID_SPACE
+        if gap < _ID_SPACE // 2:
+            # Newer frame: everything in between hasn't shown up (yet)
+            self.stats.frames_lost += gap - 1
+            self._newest = frame_id
+        else:
+            # A late frame we had already counted as lost
+            self.stats.frames_lost -= 1
+
+    def _finish(self, frame_id: int) -> None:
+        """Remembers a delivered or expired frame ID."""
+        self._finished[frame_id] = None
+        if len(self._finished) > self.history:
+            self._finished.popitem(last=False)
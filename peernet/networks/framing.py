@@ -0,0 +1,80 @@
+"""Zero-copy multipart framing for messages carrying NumPy arrays.
+
+Pickling a Message that holds a large array (e.g. a camera frame from
+FixedImage.sample(numpy=True)) copies the whole array into a fresh byte string
+on every send. Instead, we pickle with protocol 5 and move the array buffers
+out-of-band: everything *except* the arrays ends up in a small header frame,
+and the raw array buffers are handed to the transport as separate frames. ZMQ
+can then send those buffers with copy=False, and the receiver rebuilds the
+arrays with np.frombuffer directly on top of the received frames.
+
+Typical usage example:
+    frames = dump_frames(msg)
+    socket.send_multipart(frames, copy=False)
+
+    msg = load_frames(socket.recv_multipart(copy=False))
+"""
+
+import io
+import pickle
+from typing import Any, List, Sequence, Tuple
+
+import numpy as np
+
+
+def _rebuild_array(buffer: Any, dtype: np.dtype, shape: Tuple[int, ...]) -> Any:
+    """Rebuilds an array on top of an out-of-band buffer without copying."""
+    return np.frombuffer(buffer, dtype=dtype).reshape(shape)
+
+
+class _FramePickler(pickle.Pickler):
+    """Protocol 5 pickler that moves ndarray buffers out of the pickle stream."""
+
+    def __init__(self, file: io.BytesIO, buffers: List[Any]):  # noqa: D107
+        super().__init__(file, protocol=5, buffer_callback=buffers.append)
+
+    def reducer_override(self, obj: Any) -> Any:
+        """Reduces arrays to an out-of-band PickleBuffer."""
+        if not isinstance(obj, np.ndarray) or obj.dtype.hasobject:
+            return NotImplemented
+
+        # Non-contiguous views (like a BGR flip) need one copy to be sendable.
+        buffer = pickle.PickleBuffer(np.ascontiguousarray(obj))
+        return _rebuild_array, (buffer, obj.dtype, obj.shape)
+
+
+def as_buffer(frame: Any) -> Any:
+    """Returns a buffer-protocol view of a zmq.Frame, bytes, or memoryview."""
+    return getattr(frame, "buffer", frame)
+
+
+def dump_frames(obj: Any) -> List[Any]:
+    """Serializes obj into a header frame followed by raw array buffers.
+
+    Args:
+        obj: Any - Picklable object, typically a Message.
+
+    Returns:
+        List - frames[0] is the pickled header, frames[1:] are array buffers.
+    """
+    frames = [None]
+    header = io.BytesIO()
+    _FramePickler(header, frames).dump(obj)
+    frames[0] = header.getvalue()
+    return frames
+
+
+def load_frames(frames: Sequence[Any]) -> Any:
+    """Rebuilds an object from frames produced by dump_frames.
+
+    Arrays in the returned object share memory with the received frames. When
+    the frames come straight off a zmq socket, those arrays are read-only.
+
+    Args:
+        frames: Sequence - Frames as received, e.g. from recv_multipart(copy=False)
+
+    Returns:
+        Any - The deserialized object.
+    """
+    buffers = [as_buffer(frame) for frame in frames[1:]]
+    return pickle.loads(as_buffer(frames[0]), buffers=buffers)
@@ -0,0 +1,167 @@
+"""One-way latency, jitter and loss of a stream, measured by its receiver.
+
+Sensor uplinks like telemetry or lidar only flow one way. Polling with
+ack=False sends nothing back for them, so the sender never sees a reply to
+measure with. Instead, the receiver measures every Message itself:
+
+1. Latency - senders start a Timer section (upload) before sending, which the
+   receiver ends, as for requests. Senders that log their ClockSync as
+   clock-offset get latencies corrected for the difference between clocks.
+2. Jitter - the interarrival jitter of RFC 3550: a running estimate of the mean
+   deviation of the differences in transit time between consecutive Messages,
+   smoothed by 1/16. Constant clock offsets cancel out, so it needs no sync.
+3. Loss - gaps in the sequence numbers of each sender's Messages. Messages lost
+   after the last one received can't be told apart from the end of a stream.
+
+Typical usage example:
+    monitor = OneWayMonitor()
+
+    def on_frame(msg):
+        monitor.observe(msg, network.last_source)
+
+    network.poll(callback=on_frame, ack=False)
+    monitor.summary().to_csv("uplink.csv")
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from peernet.metrics import Container, Value
+from peernet.networks.Messages import Message
+
+
+@dataclass
+class StreamStats:
+    """What a receiver knows about one sender's stream.
+
+    Attributes:
+        first_seq: int - Lowest sequence number received.
+        max_seq: int - Highest sequence number received.
+        received: int - Messages received.
+        reordered: int - Messages that arrived after a later one.
+        jitter: float - RFC 3550 interarrival jitter, in seconds.
+        transit: float - Transit time of the previous Message, on mixed clocks.
+        latencies: List[float] - One-way latency of every Message.
+    """
+
+    first_seq: Optional[int] = None
+    max_seq: Optional[int] = None
+    received: int = 0
+    reordered: int = 0
+    jitter: float = 0.0
+    transit: Optional[float] = None
+    latencies: List[float] = field(default_factory=list)
+
+    @property
+    def lost(self) -> int:
+        """Messages missing between the first and latest sequence numbers."""
+        if self.max_seq is None:
+            return 0
+
+        return max(self.max_seq - self.first_seq + 1 - self.received, 0)
+
+
+class OneWayMonitor:
+    """Measures one-way latency, jitter and loss of Messages as they arrive."""
+
+    def __init__(self, section: str = "upload"):
+        """Constructor.
+
+        Args:
+            section: str - Timer section senders start before sending. Every
+                observed Message also logs {section}-jitter, the sender's jitter
+                so far, and {section}-lost, the Messages missing right before it.
+        """
+        self.section = section
+        self.streams: Dict[str, StreamStats] = {}
+
+    def observe(self, msg: Message, source: str) -> None:
+        """Ends msg's section and updates source's stream with it.
+
+        Args:
+            msg: Message - Just received. Without a sequence number, only its
+                latency and jitter are measured.
+            source: str - Device that sent it, e.g. network.last_source.
+        """
+        stream = self.streams.setdefault(source, StreamStats())
+        iter_l = msg.logger
+        names = [child.name for child in iter_l.children]
+
+        # Messages can be held up, e.g. in a FrameQueue, after the section ended
+        timed = self.section in names
+        if timed and iter_l.get_metric(self.section) is None:
+            iter_l.end_sub(self.section)
+
+        lost = 0
+        if msg.seq is not None:
+            lost = self._count(stream, msg.seq)
+
+        if timed:
+            transit = iter_l.get_metric(self.section)
+
+            # RFC 3550, section 6.4.1
+            if stream.transit is not None:
+                stream.jitter += (abs(transit - stream.transit) - stream.jitter) / 16
+            stream.transit = transit
+
+            # Take out the sender's clock offset, as its ClockSync would
+            latency = transit
+            if "clock-offset" in names:
+                latency -= iter_l.get_metric("clock-offset")
+            stream.latencies.append(latency)
+
+            iter_l.log_section(f"{self.section}-jitter", Value).end_collection(
+                stream.jitter
+            )
+
+        iter_l.log_section(f"{self.section}-lost", Value).end_collection(lost)
+
+    def summary(self) -> Container:
+        """Returns one row per sender, with its loss, jitter and latencies."""
+        summary = Container("streams")
+
+        for source, stream in self.streams.items():
+            latencies = np.array(stream.latencies)
+            if latencies.size == 0:
+                latencies = np.array([np.nan])
+
+            expected = max(stream.received + stream.lost, 1)
+
+            row = summary.log_section(source, Container)
+            row.log_section("source", Value).end_collection(source)
+            row.log_section("received", Value).end_collection(stream.received)
+            row.log_section("lost", Value).end_collection(stream.lost)
+            row.log_section("loss-rate", Value).end_collection(stream.lost / expected)
+            row.log_section("reordered", Value).end_collection(stream.reordered)
+            row.log_section("jitter", Value).end_collection(stream.jitter)
+            row.log_section("latency-mean", Value).end_collection(
+                float(np.mean(latencies))
+            )
+            row.log_section("latency-p50", Value).end_collection(
+                float(np.percentile(latencies, 50))
+            )
+            row.log_section("latency-p99", Value).end_collection(
+                float(np.percentile(latencies, 99))
+            )
+
+        return summary
+
+    def _count(self, stream: StreamStats, seq: int) -> int:
+        """Counts seq into stream, returning how many Messages it skipped."""
+        stream.received += 1
+
+        if stream.max_seq is None:
+            stream.first_seq = stream.max_seq = seq
+            return 0
+
+        # Late arrivals fill in a gap that was already counted
+        if seq < stream.max_seq:
+            stream.reordered += 1
+            stream.first_seq = min(stream.first_seq, seq)
+            return 0
+
+        gap = max(seq - stream.max_seq - 1, 0)
+        stream.max_seq = seq
+        return gap
@@ -0,0 +1,277 @@
+"""Spreading requests across a pool of servers.
+
+A client with several servers picks one for every request with a Scheduler,
+and tells it when the request is answered or given up on. We ship:
+
+1. "least-outstanding" - the server with the fewest requests in flight, relative
+   to its weight. Adapts to slow servers without measuring them.
+2. "round-robin" - smooth weighted round-robin, so a server with weight 2 gets
+   twice the requests of one with weight 1, interleaved.
+3. "latency-aware" - the server with the lowest expected wait: its moving
+   average response time, times the requests it would then have in flight.
+
+Every scheduler keeps per-server statistics, so a run shows how evenly a fleet
+was loaded and how each server performed.
+
+Typical usage example:
+    scheduler = get_scheduler("least-outstanding", ["gpu0", "gpu1"])
+    server = scheduler.pick()
+    network.send(server, msg)
+    scheduler.sent(msg.seq, server)
+    ...
+    server = scheduler.done(reply.seq)
+    scheduler.summary().to_csv("servers.csv")
+"""
+
+import time
+from typing import Dict, Mapping, Optional, Sequence, Tuple, Type, Union
+
+import numpy as np
+
+from peernet.metrics import Container, Value
+
+
+def server_weights(servers: Union[str, Sequence[str], Mapping[str, float]]) -> dict:
+    """Returns {server: weight} for the server entry of a network config.
+
+    Args:
+        servers: A server name, a list of them with weight 1 each, or a mapping
+            of server names to weights.
+
+    Raises:
+        ValueError - No servers, or a weight that isn't positive.
+    """
+    if isinstance(servers, str):
+        weights = {servers: 1.0}
+    elif isinstance(servers, Mapping):
+        weights = {str(name): float(weight) for name, weight in servers.items()}
+    else:
+        weights = {str(name): 1.0 for name in servers}
+
+    if not weights:
+        raise ValueError("At least one server is needed")
+    for name, weight in weights.items():
+        if weight <= 0:
+            raise ValueError(f"Weight of {name} must be positive, not {weight}")
+
+    return weights
+
+
+class Scheduler:
+    """Picks a server for every request, and tracks what it sent where."""
+
+    name = None
+
+    def __init__(self, servers: Union[Sequence[str], Mapping[str, float]], **kwargs):
+        """Constructor.
+
+        Args:
+            servers: Server names, or a mapping of server names to weights.
+            **kwargs: Settings for other schedulers, ignored here.
+        """
+        self.weights = server_weights(servers)
+        self.servers = list(self.weights)
+
+        # Requests in flight, by sequence number
+        self.in_flight: Dict[int, Tuple[str, float]] = dict()
+        self.outstanding = {server: 0 for server in self.servers}
+
+        # Per-server statistics
+        self.requests = {server: 0 for server in self.servers}
+        self.dropped = {server: 0 for server in self.servers}
+        self.latencies = {server: [] for server in self.servers}
+
+    def pick(self) -> str:
+        """Returns the server for the next request."""
+        raise NotImplementedError("Subclass must implement pick method")
+
+    def sent(self, seq: int, server: str) -> None:
+        """Records that request seq was sent to server."""
+        self.in_flight[seq] = (server, time.time())
+        self.outstanding[server] += 1
+        self.requests[server] += 1
+
+    def done(self, seq: int) -> str:
+        """Records that request seq was answered.
+
+        Returns:
+            str - Server it was sent to.
+        """
+        server, sent = self.in_flight.pop(seq)
+        self.outstanding[server] -= 1
+
+        latency = time.time() - sent
+        self.latencies[server].append(latency)
+        self._observe(server, latency)
+        return server
+
+    def drop(self, seq: int) -> str:
+        """Records that request seq was given up on, or dropped by its server.
+
+        Returns:
+            str - Server it was sent to.
+        """
+        server, _ = self.in_flight.pop(seq)
+        self.outstanding[server] -= 1
+        self.dropped[server] += 1
+        return server
+
+    def summary(self) -> Container:
+        """Returns one row per server, with its share of requests and latencies.
+
+        Latency is the time from sending a request to receiving its response,
+        as measured by the client.
+        """
+        summary = Container("servers")
+        total = max(sum(self.requests.values()), 1)
+
+        for server in self.servers:
+            latencies = np.array(self.latencies[server])
+            if latencies.size == 0:
+                latencies = np.array([np.nan])
+
+            row = summary.log_section(server, Container)
+            row.log_section("server", Value).end_collection(server)
+            row.log_section("weight", Value).end_collection(self.weights[server])
+            row.log_section("requests", Value).end_collection(self.requests[server])
+            row.log_section("share", Value).end_collection(
+                self.requests[server] / total
+            )
+            row.log_section("dropped", Value).end_collection(self.dropped[server])
+            row.log_section("latency-mean", Value).end_collection(
+                float(np.mean(latencies))
+            )
+            row.log_section("latency-p50", Value).end_collection(
+                float(np.percentile(latencies, 50))
+            )
+            row.log_section("latency-p99", Value).end_collection(
+                float(np.percentile(latencies, 99))
+            )
+
+        return summary
+
+    def _observe(self, server: str, latency: float) -> None:
+        """Hook for schedulers that learn from response times."""
+        pass
+
+
+class LeastOutstanding(Scheduler):
+    """The server with the fewest requests in flight, per unit of weight.
+
+    Ties go round-robin, so an idle pool is still used evenly.
+    """
+
+    name = "least-outstanding"
+
+    def __init__(self, servers, **kwargs):  # noqa: D107
+        super().__init__(servers, **kwargs)
+        self.next = 0
+
+    def pick(self) -> str:  # noqa: D102
+        count = len(self.servers)
+        order = [self.servers[(self.next + i) % count] for i in range(count)]
+        server = min(order, key=lambda s: self.outstanding[s] / self.weights[s])
+
+        self.next = (self.servers.index(server) + 1) % count
+        return server
+
+
+class WeightedRoundRobin(Scheduler):
+    """Smooth weighted round-robin, as in nginx.
+
+    Every pick adds each server's weight to its credit, and takes the total
+    weight off the server with the most credit, which is picked.
+    """
+
+    name = "round-robin"
+
+    def __init__(self, servers, **kwargs):  # noqa: D107
+        super().__init__(servers, **kwargs)
+        self.credit = {server: 0.0 for server in self.servers}
+        self.total = sum(self.weights.values())
+
+    def pick(self) -> str:  # noqa: D102
+        for server in self.servers:
+            self.credit[server] += self.weights[server]
+
+        server = max(self.servers, key=self.credit.get)
+        self.credit[server] -= self.total
+        return server
+
+
+class LatencyAware(Scheduler):
+    """The server expected to answer soonest.
+
+    Each server's response time is tracked with an exponential moving average,
+    and a request is expected to wait that long for every request ahead of it
+    and itself. Servers that haven't answered yet are tried first.
+    """
+
+    name = "latency-aware"
+
+    def __init__(self, servers, smoothing: float = 0.2, **kwargs):
+        """Constructor.
+
+        Args:
+            servers: Server names, or a mapping of server names to weights.
+                Weights divide the expected wait.
+            smoothing: float - Weight of each new response time in the moving
+                average.
+            **kwargs: Passed on to Scheduler.
+        """
+        super().__init__(servers, **kwargs)
+        self.smoothing = smoothing
+        self.latency: Dict[str, Optional[float]] = {s: None for s in self.servers}
+
+    def pick(self) -> str:  # noqa: D102
+        def expected_wait(server):
+            latency = self.latency[server]
+            if latency is None:
+                return (0, self.outstanding[server])
+            wait = latency * (self.outstanding[server] + 1) / self.weights[server]
+            return (1, wait)
+
+        return min(self.servers, key=expected_wait)
+
+    def _observe(self, server: str, latency: float) -> None:
+        if self.latency[server] is None:
+            self.latency[server] = latency
+        else:
+            self.latency[server] += self.smoothing * (latency - self.latency[server])
+
+
+SCHEDULERS: Dict[str, Type[Scheduler]] = {
+    scheduler.name: scheduler
+    for scheduler in (LeastOutstanding, WeightedRoundRobin, LatencyAware)
+}
+
+
+def register_scheduler(name: str, scheduler: Type[Scheduler]) -> None:
+    """Makes a custom scheduler available by name."""
+    SCHEDULERS[name] = scheduler
+
+
+def get_scheduler(
+    scheduler: Union[str, Scheduler],
+    servers: Union[str, Sequence[str], Mapping[str, float]],
+    **kwargs,
+) -> Scheduler:
+    """Returns a scheduler instance.
+
+    Args:
+        scheduler: Union[str, Scheduler] - A registered scheduler name, or an
+            instance, which is returned as is.
+        servers: A server name, a list of them, or a mapping of server names to
+            weights.
+        **kwargs: Settings such as smoothing, ignored by schedulers that don't
+            use them.
+    """
+    if isinstance(scheduler, Scheduler):
+        return scheduler
+
+    if scheduler not in SCHEDULERS:
+        raise ValueError(
+            f"Unknown scheduler {scheduler}. Options are {list(SCHEDULERS)}"
+        )
+
+    return SCHEDULERS[scheduler](server_weights(servers), **kwargs)
@@ -0,0 +1,325 @@
+"""Pluggable serializers for transporting Messages over PEERNet networks.
+
+A serializer turns an object into a list of frames (anything supporting the
+buffer protocol) and back. Networks that support multipart messages send the
+frames as-is, and single-datagram transports join them with join_frames().
+
+Messages get special treatment: their numbers (sequence number, send time,
+source and deadline) and logger travel in a header frame, the numbers packed in
+a fixed-size struct and the logger using the compact encoding from
+peernet.metrics.wire, and only Message.data goes through the codec. This lets
+every serializer report the time spent encoding and decoding the payload as a
+Timer section in the Message's own MetricLogger, so codecs can be compared
+within a benchmark run.
+
+We ship three serializers, selected by name through get_serializer() or the
+"serializer" key of a network config:
+
+1. "pickle" - pickle protocol 5 with NumPy buffers sent out-of-band.
+2. "msgpack" - msgpack, with a NumPy extension type that also sends array
+   buffers out-of-band. Requires the optional msgpack package.
+3. "raw" - passes bytes-like payloads through untouched.
+
+Custom serializers subclass Serializer and are added with register_serializer().
+"""
+
+import math
+import pickle
+import struct
+import time
+from typing import Any, Dict, List, Optional, Sequence, Type, Union
+
+import numpy as np
+
+from peernet.metrics import Timing
+from peernet.metrics.MetricLogger import MetricLogger
+from peernet.metrics.wire import pack_logger, unpack_logger
+from peernet.networks.Messages import ControlMessage, Message
+from peernet.networks.framing import as_buffer, dump_frames, load_frames
+
+# logger setup
+import logging
+from peernet.utils import ch
+
+logger = logging.getLogger("serializers")
+logger.setLevel(logging.WARNING)
+logger.addHandler(ch)
+
+try:
+    import msgpack  # type: ignore
+except ImportError:
+    msgpack = None
+
+# First byte of the header frame, telling the receiver what follows.
+_PLAIN = b"O"
+_MESSAGE = b"N"
+_CONTROL = b"C"
+
+# Messages follow the first byte with their seq, sent, source and deadline.
+# Missing numbers are packed as -1, or NaN for times.
+_FIELDS = struct.Struct("<qdid")
+
+
+class Serializer:
+    """Base class for serializers. Subclasses implement encode() and decode()."""
+
+    name = "base"
+
+    def encode(self, obj: Any) -> List[Any]:
+        """Encodes obj into a list of frames."""
+        raise NotImplementedError("Subclass must implement encode method")
+
+    def decode(self, frames: Sequence[Any]) -> Any:
+        """Decodes a list of frames produced by encode()."""
+        raise NotImplementedError("Subclass must implement decode method")
+
+    def encode_logger(self, metric_logger: MetricLogger) -> bytes:
+        """Encodes the MetricLogger travelling with a Message.
+
+        Uses the compact format from peernet.metrics.wire, falling back to
+        pickle for trees holding custom node types.
+        """
+        try:
+            return pack_logger(metric_logger)
+        except TypeError:
+            return pickle.dumps(metric_logger, protocol=5)
+
+    def decode_logger(self, buffer: Any) -> MetricLogger:
+        """Decodes a MetricLogger produced by encode_logger()."""
+        if buffer[0] == pickle.PROTO[0]:
+            return pickle.loads(buffer)
+
+        return unpack_logger(buffer)
+
+    def dumps(self, obj: Any, section_name: Optional[str] = None) -> List[Any]:
+        """Serializes obj into frames ready to be sent.
+
+        Args:
+            obj: Any - Object to send. Messages carry their logger in the header.
+            section_name: str - If obj is a Message, log the payload encoding
+                time as a Timer section with this name in obj.logger.
+
+        Returns:
+            List - frames[0] is the header, frames[1:] come from encode().
+        """
+        if isinstance(obj, ControlMessage):
+            return [_CONTROL + pickle.dumps(obj, protocol=5)]
+
+        if not isinstance(obj, Message):
+            return [_PLAIN, *self.encode(obj)]
+
+        if section_name:
+            with Timing(obj.logger, section_name):
+                payload = self.encode(obj.data)
+        else:
+            payload = self.encode(obj.data)
+
+        fields = _FIELDS.pack(
+            -1 if obj.seq is None else obj.seq,
+            time.monotonic(),
+            -1 if obj.source is None else obj.source,
+            math.nan if obj.deadline is None else obj.deadline,
+        )
+        header = _MESSAGE + fields + self.encode_logger(obj.logger)
+        return [header, *payload]
+
+    def loads(self, frames: Sequence[Any], section_name: Optional[str] = None) -> Any:
+        """Deserializes frames produced by dumps().
+
+        Args:
+            frames: Sequence - Received frames.
+            section_name: str - If the frames hold a Message, log the payload
+                decoding time as a Timer section with this name in its logger.
+
+        Returns:
+            Any - The deserialized object or Message.
+        """
+        header = memoryview(as_buffer(frames[0]))
+        if header[:1] == _PLAIN:
+            return self.decode(frames[1:])
+
+        if header[:1] == _CONTROL:
+            return pickle.loads(header[1:])
+
+        received = time.monotonic()
+        seq, sent, source, deadline = _FIELDS.unpack_from(header, 1)
+        metric_logger = self.decode_logger(header[1 + _FIELDS.size :])
+
+        if section_name:
+            with Timing(metric_logger, section_name):
+                data = self.decode(frames[1:])
+        else:
+            data = self.decode(frames[1:])
+
+        return Message(
+            data,
+            metric_logger,
+            seq=None if seq < 0 else seq,
+            sent=None if math.isnan(sent) else sent,
+            source=None if source < 0 else source,
+            deadline=None if math.isnan(deadline) else deadline,
+            received=received,
+        )
+
+
+class PickleSerializer(Serializer):
+    """Pickle protocol 5, with NumPy array buffers sent as out-of-band frames."""
+
+    name = "pickle"
+
+    def encode(self, obj: Any) -> List[Any]:  # noqa: D102
+        return dump_frames(obj)
+
+    def decode(self, frames: Sequence[Any]) -> Any:  # noqa: D102
+        return load_frames(frames)
+
+
+class MsgpackSerializer(Serializer):
+    """Msgpack with an extension type for NumPy arrays.
+
+    Array buffers are sent as out-of-band frames, like PickleSerializer.
+    Msgpack only understands basic types, so tuples come back as lists and
+    arbitrary Python objects (e.g. PIL images) raise a TypeError.
+    """
+
+    name = "msgpack"
+    NDARRAY_EXT = 1
+
+    def __init__(self) -> None:  # noqa: D107
+        if msgpack is None:
+            raise ImportError(
+                "The msgpack serializer requires msgpack. Install this package "
+                "with the msgpack option."
+            )
+
+    def encode(self, obj: Any) -> List[Any]:  # noqa: D102
+        frames = [None]
+
+        def default(value: Any) -> Any:
+            if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+                frames.append(np.ascontiguousarray(value))
+                meta = (
+                    len(frames) - 1,
+                    np.lib.format.dtype_to_descr(value.dtype),
+                    value.shape,
+                )
+                return msgpack.ExtType(self.NDARRAY_EXT, msgpack.packb(meta))
+
+            if isinstance(value, np.generic):
+                return value.item()
+
+            raise TypeError(f"Can't msgpack object of type {type(value)}")
+
+        frames[0] = msgpack.packb(obj, default=default, use_bin_type=True)
+        return frames
+
+    def decode(self, frames: Sequence[Any]) -> Any:  # noqa: D102
+        def ext_hook(code: int, data: bytes) -> Any:
+            if code != self.NDARRAY_EXT:
+                return msgpack.ExtType(code, data)
+
+            index, descr, shape = msgpack.unpackb(data)
+            dtype = np.lib.format.descr_to_dtype(descr)
+            return np.frombuffer(as_buffer(frames[index]), dtype=dtype).reshape(shape)
+
+        return msgpack.unpackb(
+            as_buffer(frames[0]), ext_hook=ext_hook, raw=False, strict_map_key=False
+        )
+
+
+class RawSerializer(Serializer):
+    """Passes bytes-like payloads through without any encoding.
+
+    Strings are sent as utf-8. Decoding always returns a memoryview over the
+    received frame, so strings come back as bytes.
+    """
+
+    name = "raw"
+
+    def encode(self, obj: Any) -> List[Any]:  # noqa: D102
+        if isinstance(obj, str):
+            return [obj.encode()]
+
+        if not isinstance(obj, (bytes, bytearray, memoryview, np.ndarray)):
+            raise TypeError(f"Raw serializer can't send object of type {type(obj)}")
+
+        return [obj]
+
+    def decode(self, frames: Sequence[Any]) -> Any:  # noqa: D102
+        return memoryview(as_buffer(frames[0]))
+
+
+SERIALIZERS: Dict[str, Type[Serializer]] = {
+    "pickle": PickleSerializer,
+    "msgpack": MsgpackSerializer,
+    "raw": RawSerializer,
+}
+
+
+def register_serializer(name: str, serializer_class: Type[Serializer]) -> None:
+    """Makes a custom serializer available by name.
+
+    Args:
+        name: str - Name to use in network configs.
+        serializer_class: Type[Serializer] - Subclass of Serializer.
+    """
+    SERIALIZERS[name] = serializer_class
+
+
+def get_serializer(serializer: Union[str, Serializer]) -> Serializer:
+    """Returns a serializer instance from a name or an existing instance.
+
+    Args:
+        serializer: Union[str, Serializer] - Registered name or instance.
+
+    Returns:
+        Serializer
+
+    Raises:
+        ValueError: Unknown serializer name
+    """
+    if isinstance(serializer, Serializer):
+        return serializer
+
+    if serializer not in SERIALIZERS:
+        logger.error(f"Serializer {serializer} does not exist.")
+        raise ValueError(f"Serializer {serializer} does not exist.")
+
+    return SERIALIZERS[serializer]()
+
+
+def join_frames(frames: Sequence[Any]) -> bytes:
+    """Joins frames into a single buffer for single-datagram transports.
+
+    Args:
+        frames: Sequence - Frames produced by Serializer.dumps()
+
+    Returns:
+        bytes - Frame count and lengths, followed by the frames.
+    """
+    views = [memoryview(as_buffer(frame)).cast("B") for frame in frames]
+    lengths = [view.nbytes for view in views]
+    header = struct.pack(f"!I{len(views)}I", len(views), *lengths)
+    return b"".join([header, *views])
+
+
+def split_frames(buffer: Any) -> List[memoryview]:
+    """Splits a buffer produced by join_frames back into frames, without copying.
+
+    Args:
+        buffer: Any - Bytes-like object produced by join_frames().
+
+    Returns:
+        List[memoryview] - Views of the individual frames.
+    """
+    view = memoryview(as_buffer(buffer))
+    (count,) = struct.unpack_from("!I", view)
+    lengths = struct.unpack_from(f"!{count}I", view, 4)
+
+    frames = []
+    offset = 4 * (count + 1)
+    for length in lengths:
+        frames.append(view[offset : offset + length])
+        offset += length
+
+    return frames
@@ -0,0 +1,83 @@
+"""Bounded frame queues for serving sensor streams.
+
+When a sensor produces frames faster than the server processes them, a plain
+poll() works through the backlog in order, so every result comes from an older
+frame than the last, and the sender eventually stalls. For real-time use, what
+matters is how old the processed frame is, not whether every frame got through.
+
+A FrameQueue holds the frames waiting to be processed, and drops stale ones
+once it's full. BaseNetwork.stream() keeps the queue topped up from the
+network, processes frames out of it, and tells senders which frames were
+dropped. Two policies are supported:
+
+1. "drop-oldest" - a FIFO of at most depth frames. Once it's full, each new
+   frame evicts the oldest one.
+2. "keep-latest" - like drop-oldest while receiving, but processing always
+   takes the newest frame, and drops everything older.
+
+Typical usage example:
+    queue = FrameQueue(depth=2, policy="keep-latest")
+    network.stream(queue, engine.callback)
+"""
+
+from collections import deque
+from typing import Any, List, Tuple
+
+POLICIES = ("drop-oldest", "keep-latest")
+
+
+class FrameQueue:
+    """A bounded queue that drops stale frames instead of blocking."""
+
+    def __init__(self, depth: int = 1, policy: str = "drop-oldest"):
+        """Constructor.
+
+        Args:
+            depth: int - Most frames waiting at once.
+            policy: str - "drop-oldest" or "keep-latest".
+        """
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy}. Options are {POLICIES}")
+
+        self.depth = depth
+        self.policy = policy
+        self.frames = deque()
+
+        # Frames dropped so far
+        self.dropped = 0
+
+    def __len__(self) -> int:  # noqa: D105
+        return len(self.frames)
+
+    def push(self, frame: Any) -> List[Any]:
+        """Adds a frame.
+
+        Returns:
+            List - Frames dropped to make room for it.
+        """
+        self.frames.append(frame)
+
+        dropped = []
+        while len(self.frames) > self.depth:
+            dropped.append(self.frames.popleft())
+
+        self.dropped += len(dropped)
+        return dropped
+
+    def pop(self) -> Tuple[Any, List[Any]]:
+        """Takes the next frame to process.
+
+        Returns:
+            Tuple[Any, List] - The frame, and frames dropped in favor of it.
+        """
+        if self.policy == "drop-oldest":
+            return self.frames.popleft(), []
+
+        frame = self.frames.pop()
+        dropped = list(self.frames)
+        self.frames.clear()
+
+        self.dropped += len(dropped)
+        return frame, dropped
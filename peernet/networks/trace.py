@@ -0,0 +1,171 @@
+"""Compact binary traces of the messages a network sent and received.
+
+A network constructed with record="path" writes every message to a trace: when
+it was sent or received, by whom, to whom, its size on the wire, and
+optionally its frames. ReplayNetwork plays a trace back against live peers.
+
+The file starts with MAGIC and a length-prefixed JSON header holding the device
+names and the serializer. Each message then takes one fixed-size RECORD,
+followed by its frames as joined by join_frames() (if payloads are recorded).
+
+Typical usage example:
+    network = ZMQ_Pair("client", record="robot.trace", **config)
+    ...
+    network.close()
+
+    for record in TraceReader("robot.trace"):
+        print(record.time, record.source, record.destination, record.nbytes)
+"""
+
+import json
+import struct
+import time
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional, Sequence
+
+from peernet.networks.serializers import join_frames, split_frames
+
+MAGIC = b"PEERTRC1"
+
+# kind, time, source, destination, wire bytes, payload bytes
+RECORD = struct.Struct("<cdHHQQ")
+
+SEND = b"S"
+RECV = b"R"
+
+
+@dataclass
+class TraceRecord:
+    """One message in a trace.
+
+    Attributes:
+        kind: bytes - SEND or RECV, from the recording device's point of view.
+        time: float - When it was sent or received, on the recording device.
+        source: str - Device that sent it.
+        destination: str - Device it was sent to.
+        nbytes: int - Size on the wire.
+        frames: List - Serialized frames, or None if payloads weren't recorded.
+    """
+
+    kind: bytes
+    time: float
+    source: str
+    destination: str
+    nbytes: int
+    frames: Optional[List[memoryview]] = None
+
+
+class TraceWriter:
+    """Appends messages to a trace file."""
+
+    def __init__(
+        self,
+        path: str,
+        devices: Sequence[str],
+        serializer: str = "pickle",
+        payloads: bool = True,
+    ):
+        """Constructor.
+
+        Args:
+            path: str - File to write, replaced if it exists.
+            devices: Sequence[str] - Names of the devices on the network.
+            serializer: str - Name of the serializer the frames come from.
+            payloads: bool - Whether to record frames, or only sizes.
+        """
+        self.devices = list(devices)
+        self.device_number = {name: i for i, name in enumerate(self.devices)}
+        self.payloads = payloads
+
+        header = json.dumps(
+            dict(devices=self.devices, serializer=serializer, payloads=payloads)
+        ).encode()
+
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    def write(
+        self,
+        kind: bytes,
+        source: str,
+        destination: str,
+        frames: Sequence[Any],
+        nbytes: int,
+        when: Optional[float] = None,
+    ) -> None:
+        """Appends a message.
+
+        Args:
+            kind: bytes - SEND or RECV.
+            source: str - Device that sent it.
+            destination: str - Device it was sent to.
+            frames: Sequence - Frames produced by Serializer.dumps().
+            nbytes: int - Size on the wire.
+            when: float - Time of sending or receiving. Defaults to now.
+        """
+        when = time.time() if when is None else when
+        payload = join_frames(frames) if self.payloads else b""
+
+        self.file.write(
+            RECORD.pack(
+                kind,
+                when,
+                self.device_number[source],
+                self.device_number[destination],
+                nbytes,
+                len(payload),
+            )
+        )
+        self.file.write(payload)
+
+    def close(self) -> None:
+        """Flushes and closes the file."""
+        self.file.close()
+
+
+class TraceReader:
+    """Iterates over the messages in a trace file."""
+
+    def __init__(self, path: str):
+        """Constructor.
+
+        Args:
+            path: str - Trace written by TraceWriter.
+
+        Raises:
+            ValueError - The file isn't a trace.
+        """
+        self.path = path
+
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a PEERNet trace")
+            (length,) = struct.unpack("<I", file.read(4))
+            header = json.loads(file.read(length))
+            self.start = file.tell()
+
+        self.devices = header["devices"]
+        self.serializer = header["serializer"]
+        self.payloads = header["payloads"]
+
+    def __iter__(self) -> Iterator[TraceRecord]:  # noqa: D105
+        with open(self.path, "rb") as file:
+            file.seek(self.start)
+
+            while True:
+                fields = file.read(RECORD.size)
+                if len(fields) < RECORD.size:
+                    return
+
+                kind, when, source, destination, nbytes, length = RECORD.unpack(
+                    fields
+                )
+                frames = split_frames(file.read(length)) if length else None
+                yield TraceRecord(
+                    kind,
+                    when,
+                    self.devices[source],
+                    self.devices[destination],
+                    nbytes,
+                    frames,
+                )
@@ -0,0 +1,126 @@
+"""Tuning ZMQ contexts and sockets from a network config.
+
+Every ZMQ based network takes a tuning mapping, usually the tuning key of its
+network config:
+
+    tuning:
+      io_threads: 2          # ZMQ I/O threads in the context
+      io_cpus: [2, 3]        # CPUs the I/O threads may run on
+      sndbuf: 4194304        # Any of SOCKET_OPTIONS, set on every socket
+      immediate: 1
+      tcp_keepalive: 1
+
+Context options are set before any socket is created, and socket options on
+every socket the network opens, after its own defaults (e.g. sndhwm). Values
+are read back from the context and sockets, so applied holds what ZMQ actually
+uses, and summary() puts it in a run's results.
+
+Typical usage example:
+    tuning = Tuning.from_config(net_config.get("tuning"))
+    context = tuning.context()
+    socket = tuning.apply(context.socket(zmq.PAIR))
+    tuning.summary().to_csv("tuning.csv")
+"""
+
+from typing import Any, Iterable, Mapping, Optional
+
+import zmq
+
+from peernet.metrics import Container, Value
+
+# logger setup
+import logging
+from peernet.utils import ch
+
+logger = logging.getLogger("tuning")
+logger.setLevel(logging.WARNING)
+logger.addHandler(ch)
+
+# Config names of the socket options we set, and their ZMQ options
+SOCKET_OPTIONS = {
+    "sndbuf": zmq.SNDBUF,
+    "rcvbuf": zmq.RCVBUF,
+    "sndhwm": zmq.SNDHWM,
+    "rcvhwm": zmq.RCVHWM,
+    "linger": zmq.LINGER,
+    "immediate": zmq.IMMEDIATE,
+    "tcp_keepalive": zmq.TCP_KEEPALIVE,
+    "tcp_keepalive_idle": zmq.TCP_KEEPALIVE_IDLE,
+    "tcp_keepalive_cnt": zmq.TCP_KEEPALIVE_CNT,
+    "tcp_keepalive_intvl": zmq.TCP_KEEPALIVE_INTVL,
+}
+
+
+class Tuning:
+    """Context and socket options for a network's ZMQ sockets."""
+
+    def __init__(
+        self,
+        io_threads: Optional[int] = None,
+        io_cpus: Optional[Iterable[int]] = None,
+        **socket_options: int,
+    ):
+        """Constructor.
+
+        Args:
+            io_threads: int - Number of ZMQ I/O threads. ZMQ's default is 1.
+            io_cpus: Iterable[int] - CPUs the I/O threads are pinned to, where
+                libzmq supports it.
+            **socket_options: int - Values for any of SOCKET_OPTIONS.
+
+        Raises:
+            ValueError - An option isn't one of SOCKET_OPTIONS.
+        """
+        unknown = set(socket_options) - set(SOCKET_OPTIONS)
+        if unknown:
+            raise ValueError(
+                f"Unknown socket options {sorted(unknown)}. "
+                f"Options are {list(SOCKET_OPTIONS)}"
+            )
+
+        self.io_threads = io_threads
+        self.io_cpus = None if io_cpus is None else [int(cpu) for cpu in io_cpus]
+        self.socket_options = dict(socket_options)
+
+        # What ZMQ reports back once the options are set
+        self.applied = dict()
+
+    @classmethod
+    def from_config(cls, config: Optional[Mapping[str, Any]]) -> "Tuning":
+        """Returns the tuning described by a config mapping, or ZMQ's defaults."""
+        return cls(**dict(config or {}))
+
+    def context(self, context_class=zmq.Context) -> zmq.Context:
+        """Returns a new context with the I/O thread options set."""
+        context = context_class()
+
+        if self.io_threads is not None:
+            context.set(zmq.IO_THREADS, self.io_threads)
+            self.applied["io_threads"] = context.get(zmq.IO_THREADS)
+
+        if self.io_cpus is not None:
+            try:
+                for cpu in self.io_cpus:
+                    context.set(zmq.THREAD_AFFINITY_CPU_ADD, cpu)
+                self.applied["io_cpus"] = " ".join(map(str, self.io_cpus))
+            except (AttributeError, zmq.ZMQError) as e:
+                logger.warning(f"Couldn't pin ZMQ I/O threads to {self.io_cpus}: {e}")
+
+        return context
+
+    def apply(self, socket: zmq.Socket) -> zmq.Socket:
+        """Sets the socket options on socket, and returns it."""
+        for name, value in self.socket_options.items():
+            socket.setsockopt(SOCKET_OPTIONS[name], value)
+            self.applied[name] = socket.getsockopt(SOCKET_OPTIONS[name])
+
+        return socket
+
+    def summary(self) -> Container:
+        """Returns a single row holding the applied values."""
+        summary = Container("tuning")
+        row = summary.log_section("0", Container)
+        for name, value in self.applied.items():
+            row.log_section(name.replace("_", "-"), Value).end_collection(value)
+
+        return summary
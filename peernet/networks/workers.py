@@ -0,0 +1,221 @@
+"""Worker pools for serving requests concurrently.
+
+poll() calls its callback inline, on the thread that receives, so one slow
+inference holds up every other client's requests, and even their acks. A
+WorkerPool runs callbacks on a pool of threads or processes instead.
+BaseNetwork.serve() keeps receiving while the workers run, and sends each
+result back as soon as it's ready. Sockets are only ever used by the receiving
+thread, so this works with every network.
+
+Threads suit callbacks that release the GIL, like most GPU inference or
+numpy-heavy code. Processes suit pure-Python callbacks, but the callback and
+messages are pickled, so the callback must be a module-level function. Models
+are best loaded once per process, with initializer.
+
+A BatchPool instead gathers requests from every sender into batches, up to a
+size or a wait, and calls a batch callback once per batch on a worker thread.
+This keeps vector units and GPUs busy when several clients share a server.
+
+Time a request waits for a free worker, or for its batch to start, can be
+logged as a Timer section, which ends once a worker picks it up.
+
+Typical usage example:
+    with WorkerPool(workers=4) as pool:
+        network.serve(pool, engine.callback, queue_section="queueing")
+
+    with BatchPool(max_batch_size=8, max_wait=0.005) as pool:
+        network.serve(pool, engine.batch_callback, queue_section="batching-wait")
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from peernet.metrics import Value
+from peernet.networks.Messages import Message
+
+KINDS = ("thread", "process")
+
+
+class WorkerPool:
+    """Runs callbacks on a pool of threads or processes."""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        kind: str = "thread",
+        initializer: Optional[Callable] = None,
+        initargs: tuple = (),
+    ):
+        """Constructor.
+
+        Args:
+            workers: int - Number of workers. Defaults to what
+                concurrent.futures picks for the kind of pool.
+            kind: str - "thread" or "process".
+            initializer: Callable - Called with initargs once in every worker
+                as it starts, e.g. to load a model.
+            initargs: tuple - Arguments to initializer.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind {kind}. Options are {KINDS}")
+        if workers is not None and workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        executor = ThreadPoolExecutor if kind == "thread" else ProcessPoolExecutor
+        self.executor = executor(workers, initializer=initializer, initargs=initargs)
+        self.kind = kind
+        self.workers = self.executor._max_workers
+
+    def submit(
+        self, callback: Callable, msg: Any, queue_section: Optional[str] = None
+    ) -> Future:
+        """Runs callback(msg) on the next free worker.
+
+        Args:
+            callback: Callable - Called with msg. Must be picklable for
+                process pools.
+            msg: Any - Received message.
+            queue_section: str - If given, end this section of a Message's
+                logger when a worker picks it up.
+
+        Returns:
+            Future - Resolves to what callback returned.
+        """
+        return self.executor.submit(_work, callback, msg, queue_section)
+
+    def close(self) -> None:
+        """Waits for the callbacks already submitted, and stops the workers."""
+        self.executor.shutdown()
+
+    def __enter__(self):  # noqa: D105
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):  # noqa: D105
+        self.close()
+
+
+def _work(callback: Callable, msg: Any, queue_section: Optional[str]) -> Any:
+    """Runs on a worker. Module-level, so process pools can pickle it."""
+    if queue_section and isinstance(msg, Message):
+        msg.logger.end_sub(queue_section)
+    return callback(msg)
+
+
+class BatchPool:
+    """Runs a batch callback on requests gathered into batches.
+
+    A batch starts with the oldest waiting request, and takes in more until it
+    holds max_batch_size of them, or max_wait seconds have passed. Requests that
+    arrive while a batch runs are waiting for the next one, so under load
+    batches fill up without waiting. Every Message logs the size of its batch
+    as batch-size.
+    """
+
+    kind = "batching"
+    workers = 1
+
+    def __init__(self, max_batch_size: int = 8, max_wait: float = 0.005):
+        """Constructor.
+
+        Args:
+            max_batch_size: int - Most requests in a batch.
+            max_wait: float - Most seconds a batch waits to fill up.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_wait < 0:
+            raise ValueError("max_wait can't be negative")
+
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(
+        self, callback: Callable, msg: Any, queue_section: Optional[str] = None
+    ) -> Future:
+        """Adds msg to the next batch.
+
+        Args:
+            callback: Callable - Called with a list of messages, and returns a
+                list of replies in the same order. Requests are batched with
+                others for the same callback.
+            msg: Any - Received message.
+            queue_section: str - If given, end this section of a Message's
+                logger when its batch starts.
+
+        Returns:
+            Future - Resolves to the reply to msg.
+        """
+        future = Future()
+        self.requests.put((callback, msg, queue_section, future))
+        return future
+
+    def close(self) -> None:
+        """Runs the batches already submitted, and stops the worker."""
+        self.requests.put(None)
+        self.thread.join()
+
+    def __enter__(self):  # noqa: D105
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):  # noqa: D105
+        self.close()
+
+    def _run(self) -> None:
+        closing = False
+        while not closing:
+            request = self.requests.get()
+            if request is None:
+                return
+
+            # Fill the batch up, for at most max_wait
+            batch = [request]
+            deadline = time.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    request = self.requests.get(
+                        timeout=max(deadline - time.time(), 0)
+                    )
+                except queue.Empty:
+                    break
+                if request is None:
+                    closing = True
+                    break
+                batch.append(request)
+
+            # Batches don't mix callbacks
+            callbacks = dict.fromkeys(request[0] for request in batch)
+            for callback in callbacks:
+                self._run_batch([r for r in batch if r[0] == callback])
+
+    def _run_batch(self, batch: List[tuple]) -> None:
+        try:
+            msgs = []
+            for _, msg, queue_section, _ in batch:
+                if isinstance(msg, Message):
+                    if queue_section:
+                        msg.logger.end_sub(queue_section)
+                    msg.logger.log_section("batch-size", Value).end_collection(
+                        len(batch)
+                    )
+                msgs.append(msg)
+
+            replies = list(batch[0][0](msgs))
+            if len(replies) != len(batch):
+                raise ValueError(
+                    f"callback returned {len(replies)} replies "
+                    f"for a batch of {len(batch)}"
+                )
+        except Exception as e:
+            for *_, future in batch:
+                future.set_exception(e)
+            return
+
+        for (*_, future), reply in zip(batch, replies):
+            future.set_result(reply)
@@ -0,0 +1,75 @@
+"""Tests running inference on batches of requests."""
+
+from peernet.inference import DummyModel, enginize
+from peernet.inference.batching import collate, split
+from peernet.networks import Message
+from peernet.metrics import Container, Timer
+import numpy as np
+import pytest
+import time
+
+
+class Doubler:
+    """Doubles arrays, counting how often infer() is called."""
+
+    def __init__(self):
+        """Constructor."""
+        self.calls = 0
+
+    def preprocess(self, x):
+        """Turns a list into a batch of one row."""
+        return np.asarray(x, dtype=float).reshape(1, -1)
+
+    def infer(self, x):
+        """Doubles every sample in the batch."""
+        self.calls += 1
+        return 2 * x
+
+    def postprocess(self, x):
+        """Turns a batch of one row back into a list."""
+        return x[0].tolist()
+
+
+def _request(data, seq):
+    iter_l = Container(f"{seq}")
+    iter_l.log_section("upload", Timer)
+    return Message(data, iter_l, seq)
+
+
+def test_collate_and_split():
+    """Samples are joined along their batch axis, and split back up."""
+    samples = [np.zeros((1, 3)), np.ones((2, 3))]
+    batch, sizes = collate(samples)
+
+    assert batch.shape == (3, 3)
+    assert sizes == [1, 2]
+    pieces = split(batch, sizes)
+    assert [piece.shape for piece in pieces] == [(1, 3), (2, 3)]
+    assert np.array_equal(pieces[1], samples[1])
+
+    with pytest.raises(TypeError):
+        collate([[1], [2]])
+
+
+def test_batch_callback():
+    """One inference answers every request, each with its own reply."""
+    ie = enginize(Doubler())
+    replies = ie.batch_callback([_request([1, 2], 0), _request([3, 4], 1)])
+
+    assert ie.calls == 1
+    assert [reply.data for reply in replies] == [[2.0, 4.0], [6.0, 8.0]]
+    assert [reply.seq for reply in replies] == [0, 1]
+    assert all(reply.logger.get_metric("inference") >= 0 for reply in replies)
+
+
+def test_infer_batch():
+    """Models that define infer_batch() take the whole batch at once."""
+    ie = enginize(DummyModel)(inference_time=0.1)
+
+    start = time.time()
+    replies = ie.batch_callback([_request(None, seq) for seq in range(4)])
+    elapsed = time.time() - start
+
+    # Unbatched, inference alone takes 0.32 seconds
+    assert [reply.data for reply in replies] == [0] * 4
+    assert elapsed < 0.25
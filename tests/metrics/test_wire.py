@@ -0,0 +1,91 @@
+"""Tests the compact wire encoding of MetricLogger trees."""
+
+from peernet.metrics import (
+    Container,
+    Timer,
+    TokensPerSecondMeter,
+    Value,
+    pack_logger,
+    unpack_logger,
+)
+from peernet.metrics.MetricLogger import MetricLogger
+import pickle
+import pytest
+
+
+def make_iteration():
+    """Builds a tree shaped like one CLI client iteration."""
+    root = Container("root")
+    iter_l = root.log_section("0", Container)
+    iter_l.log_section("sensing", Timer).end_collection()
+    iter_l.log_section("upload", Timer)
+    iter_l.log_section("upload-bytes", Value).end_collection(1024)
+    iter_l.log_section("label", Value).end_collection("dog")
+    iter_l.log_section("score", Value).end_collection(0.93)
+    iter_l.log_section("flag", Value).end_collection(True)
+    iter_l.log_section("shape", Value).end_collection((3, 224, 224))
+    iter_l.log_section("tps", TokensPerSecondMeter).end_collection(10)
+    return iter_l
+
+
+def test_roundtrip():
+    """Rebuilt trees hold the same nodes, metrics and start times."""
+    iter_l = make_iteration()
+    out = unpack_logger(pack_logger(iter_l))
+
+    assert str(out) == str(iter_l)
+    assert out.asdict() == iter_l.asdict()
+    assert out.depth == iter_l.depth == 1
+    assert [type(c) for c in out.children] == [type(c) for c in iter_l.children]
+    assert out.children[1].start == iter_l.children[1].start
+    assert out.get_metric("upload") is None
+
+
+def test_rebuilt_tree_still_works():
+    """Open timers can be ended, and sections added, after decoding."""
+    out = unpack_logger(pack_logger(make_iteration()))
+    out.end_sub("upload")
+    out.log_section("download", Timer)
+
+    assert out.get_metric("upload") > 0
+    assert out.children[-1].depth == 2
+
+
+def test_smaller_than_pickle():
+    """The compact encoding beats pickle for a typical iteration."""
+    iter_l = make_iteration()
+    assert len(pack_logger(iter_l)) < len(pickle.dumps(iter_l)) / 3
+
+
+def test_unknown_node_type():
+    """Custom node types can't be packed."""
+
+    class Counter(MetricLogger):
+        def _tic(self):
+            pass
+
+        def _toc(self, count):
+            return count
+
+    root = Container("root")
+    root.log_section("counter", Counter)
+
+    with pytest.raises(TypeError):
+        pack_logger(root)
+
+
+@pytest.mark.parametrize("kind", ["names", "children", "string"])
+def test_too_large(kind):
+    """Trees too large for the format's 2 byte fields can't be packed."""
+    root = Container("root")
+    if kind == "names":
+        for i in range(2**16):
+            root.log_section(f"section-{i}", Container)
+    elif kind == "children":
+        for _ in range(2**16):
+            root.log_section("sensing", Container)
+    else:
+        root.log_section("label", Value).end_collection("x" * 2**16)
+
+    with pytest.raises(TypeError):
+        pack_logger(root)
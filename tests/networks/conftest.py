@@ -0,0 +1,27 @@
+"""Fixtures shared by the network tests."""
+
+from peernet.networks import SharedMemory_Pair
+import pytest
+
+DEVICES = {"client": "localhost", "server": "localhost"}
+
+
+@pytest.fixture
+def make_pair():
+    """Returns a function that sets up a client and a server on one host.
+
+    It takes the SharedMemory_Pair settings, start_port included, so every test
+    module can keep to its own ports, and optionally a SharedMemory_Pair
+    subclass for the server. Both ends are closed after the test.
+    """
+    networks = []
+
+    def make(server_class=SharedMemory_Pair, **config):
+        client = SharedMemory_Pair("client", devices=DEVICES, **config)
+        server = server_class("server", devices=DEVICES, **config)
+        networks.extend((client, server))
+        return client, server
+
+    yield make
+    for network in networks:
+        network.close()
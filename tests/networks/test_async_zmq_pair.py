@@ -0,0 +1,94 @@
+"""Tests the asyncio version of ZMQ_Pair on a single loopback device."""
+
+from peernet.networks import AsyncZMQ_Pair, BatchPool, ClockSync, FrameQueue, Message
+from peernet.metrics import Container, Timer
+import asyncio
+import numpy as np
+import pytest
+import zmq
+
+devices = {"local": "127.0.0.1"}
+
+
+def test_send_recv():
+    """Awaitable send/recv carry Messages and their timing."""
+
+    async def main():
+        network = AsyncZMQ_Pair("local", start_port=56150, devices=devices)
+        iter_l = Container("0")
+
+        await network.send_with_timing("local", np.arange(8), iter_l, "upload")
+        data = await network.recv_with_timing("local", iter_l, "upload")
+        network.close()
+        return data, iter_l
+
+    data, iter_l = asyncio.run(main())
+    assert np.array_equal(data, np.arange(8))
+    assert iter_l.get_metric("upload") > 0
+    assert iter_l.get_metric("upload-encode") >= 0
+    assert iter_l.get_metric("upload-decode") >= 0
+
+
+def test_poll_with_coroutine_callback():
+    """poll() awaits coroutine callbacks and lets other tasks run meanwhile."""
+
+    async def callback(msg):
+        await asyncio.sleep(0)
+        msg.logger.log_section("download", Timer)
+        return Message(msg.data * 2, msg.logger)
+
+    async def ticker(ticks):
+        while True:
+            ticks.append(None)
+            await asyncio.sleep(0.001)
+
+    async def main():
+        network = AsyncZMQ_Pair("local", start_port=56155, devices=devices)
+        ticks = []
+        tick_task = asyncio.ensure_future(ticker(ticks))
+
+        await asyncio.sleep(0.05)
+        await network.send("local", Message(np.ones(4), Container("0")))
+        await network.poll(1, callback)
+        reply = await network.recv("local")
+
+        tick_task.cancel()
+        network.close()
+        return reply, ticks
+
+    reply, ticks = asyncio.run(main())
+    assert np.array_equal(reply.data, 2 * np.ones(4))
+    assert len(ticks) > 1
+
+
+def test_recv_any():
+    """recv_any() is awaited too, and times out like ZMQ_Pair's."""
+
+    async def main():
+        network = AsyncZMQ_Pair("local", start_port=56410, devices=devices)
+        try:
+            await network.send("local", "hello")
+            assert await network.recv_any(timeout=1) == "hello"
+            assert network.last_source == "local"
+
+            with pytest.raises(zmq.Again):
+                await network.recv_any(timeout=0.05)
+        finally:
+            network.close()
+
+    asyncio.run(main())
+
+
+def test_blocking_helpers():
+    """Helpers that block on the network refuse to run on it."""
+    network = AsyncZMQ_Pair("local", start_port=56415, devices=devices)
+    try:
+        with pytest.raises(TypeError):
+            network.stream(FrameQueue(depth=1))
+        with BatchPool() as pool, pytest.raises(TypeError):
+            network.serve(pool, lambda msgs: msgs)
+        with pytest.raises(TypeError):
+            ClockSync(network, "local")
+        assert network.clocks == {}
+    finally:
+        network.close()
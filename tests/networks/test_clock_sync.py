@@ -0,0 +1,91 @@
+"""Tests clock offset estimation and correction of cross-host timers."""
+
+import threading
+import time
+
+from peernet.networks import ClockProbe, ClockSync, Message, SharedMemory_Pair
+from peernet.networks import get_serializer
+from peernet.metrics import Container, Timer
+import pytest
+
+
+class SkewedPeer:
+    """Answers probes in-process, with a clock ahead of ours by skew seconds."""
+
+    def __init__(self, skew):  # noqa: D107
+        self.skew = skew
+        self.clocks = dict()
+        self.replies = []
+
+    def send(self, destination, probe):  # noqa: D102
+        probe.t1 = time.time() + self.skew
+        probe.t2 = time.time() + self.skew
+        self.replies.append(probe)
+
+    def recv(self, source):  # noqa: D102
+        return self.replies.pop()
+
+
+def test_offset_and_correction():
+    """A skewed peer's offset is found, and taken out of crossing timers."""
+    network = SkewedPeer(5.0)
+    clock = ClockSync(network, "server")
+    clock.sync()
+
+    assert network.clocks["server"] is clock
+    assert clock.offset_at() == pytest.approx(5.0, abs=1e-3)
+    assert 0 <= clock.uncertainty < 1e-3
+
+    logger = Container("iteration")
+    logger.log_section("upload", Timer).metric = 5.25
+    logger.log_section("download", Timer).metric = -4.75
+    clock.correct(logger, outbound=["upload"], inbound=["download"])
+    clock.log(logger)
+
+    assert logger.get_metric("upload") == pytest.approx(0.25, abs=1e-3)
+    assert logger.get_metric("download") == pytest.approx(0.25, abs=1e-3)
+    assert logger.get_metric("clock-offset") == pytest.approx(5.0, abs=1e-3)
+
+
+def test_drift():
+    """Offsets from successive syncs are extrapolated along their trend."""
+    clock = ClockSync(SkewedPeer(0.0), "server")
+    clock.samples.extend([(100.0, 1.0, 0.0), (200.0, 1.5, 0.0), (300.0, 2.0, 0.0)])
+
+    assert clock.drift == pytest.approx(0.005)
+    assert clock.offset_at(400.0) == pytest.approx(2.5)
+
+
+def test_control_messages_skip_serializer():
+    """Probes are pickled even when the network's serializer can't handle them."""
+    raw = get_serializer("raw")
+    probe = raw.loads(raw.dumps(ClockProbe(1.0)))
+
+    assert probe == ClockProbe(1.0)
+
+
+def test_poll_answers_probes():
+    """A polling server answers probes without counting them as messages."""
+    config = dict(start_port=56200, devices={"client": "l", "server": "l"})
+    client = SharedMemory_Pair("client", **config)
+    server = SharedMemory_Pair("server", **config)
+
+    handled = []
+    thread = threading.Thread(
+        target=lambda: handled.append(server.poll(1, lambda msg: msg.seq, timeout=5))
+    )
+    thread.start()
+
+    clock = ClockSync(client, "server", rounds=4)
+    clock.sync()
+    client.send("server", Message(None, Container("root"), seq=7))
+    reply = client.recv("server")
+    thread.join()
+
+    client.close()
+    server.close()
+
+    assert handled == [1]
+    assert reply == 7
+    assert len(clock.samples) == 1
+    assert abs(clock.offset_at()) < 0.1
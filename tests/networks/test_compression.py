@@ -0,0 +1,97 @@
+"""Tests payload codecs and adaptive codec selection."""
+
+from peernet.networks import get_serializer
+from peernet.networks.compression import (
+    AdaptiveCodec,
+    CompressedPayload,
+    decompress,
+    get_codec,
+)
+from PIL import Image
+import numpy as np
+import pytest
+
+IMAGE = np.tile(np.arange(64, dtype=np.uint8), (48, 1))[:, :, None].repeat(3, axis=2)
+
+
+@pytest.mark.parametrize("name", ["none", "zlib", "lz4"])
+def test_lossless_roundtrip(name):
+    """Lossless codecs give back exactly what they were given."""
+    if name == "lz4":
+        pytest.importorskip("lz4")
+    codec = get_codec(name)
+
+    for sample in (IMAGE, Image.fromarray(IMAGE), b"bytes", {"any": "object"}):
+        payload = codec.compress(sample)
+        out = decompress(payload)
+
+        assert payload.codec == name
+        if isinstance(sample, Image.Image):
+            assert out.tobytes() == sample.tobytes()
+        else:
+            assert np.array_equal(out, sample) or out == sample
+
+
+@pytest.mark.parametrize("name", ["jpeg", "webp"])
+def test_lossy_roundtrip(name):
+    """Lossy codecs shrink images, and keep their type and shape."""
+    codec = get_codec(name, quality=90)
+
+    payload = codec.compress(IMAGE)
+    out = decompress(payload)
+    assert len(payload.data) < IMAGE.nbytes
+    assert out.shape == IMAGE.shape
+    assert np.abs(out.astype(int) - IMAGE).mean() < 8
+
+    out = decompress(codec.compress(Image.fromarray(IMAGE)))
+    assert isinstance(out, Image.Image)
+    assert out.size == (64, 48)
+
+    with pytest.raises(TypeError):
+        codec.compress("not an image")
+
+
+def test_payload_survives_serializer():
+    """Compressed payloads go over the network like any other object."""
+    serializer = get_serializer("pickle")
+    payload = get_codec("zlib").compress(IMAGE)
+
+    out = decompress(serializer.loads(serializer.dumps(payload)))
+    assert np.array_equal(out, IMAGE)
+
+
+def test_adaptive_selection():
+    """Slower links get more compression."""
+    codec = AdaptiveCodec(tiers=[(100e6, "none"), (10e6, "zlib"), (0, "jpeg")])
+
+    assert codec.select().name == "none"
+    codec.update(float("nan"))
+    assert codec.throughput is None
+
+    codec.update(5e6)
+    assert codec.compress(IMAGE).codec == "jpeg"
+
+    for _ in range(20):
+        codec.update(50e6)
+    assert codec.compress(IMAGE).codec == "zlib"
+
+
+@pytest.mark.parametrize("sample", ["random string", b"random bytes"])
+def test_adaptive_fallback(sample):
+    """Samples that aren't images are compressed losslessly on slow links."""
+    codec = AdaptiveCodec()
+    codec.update(1e6)
+    assert codec.select().name == "jpeg"
+
+    payload = codec.compress(sample)
+    assert payload.codec in ("lz4", "zlib")
+    assert decompress(payload) == sample
+
+
+def test_unknown_codec():
+    """Unknown names are refused, and anything but a payload is passed through."""
+    with pytest.raises(ValueError):
+        get_codec("gzip")
+
+    assert decompress("plain") == "plain"
+    assert isinstance(get_codec("none").compress(1), CompressedPayload)
@@ -0,0 +1,73 @@
+"""Tests chunking and reassembly of datagrams for ZMQ_UDP."""
+
+import copy
+
+from peernet.networks.fragmentation import CHUNK_HEADER, Reassembler, fragment
+from peernet.networks.serializers import get_serializer, join_frames, split_frames
+import numpy as np
+import pytest
+
+
+def test_roundtrip_large_image():
+    """An image far over the datagram limit survives chunking."""
+    image = np.random.randint(0, 255, (240, 320, 3), dtype=np.uint8)
+    serializer = get_serializer("pickle")
+    chunks = fragment(join_frames(serializer.dumps(image)), 7, 8000)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 8000 for chunk in chunks)
+
+    reassembler = Reassembler()
+    out = [reassembler.add(chunk) for chunk in reversed(chunks)]
+    assert out[:-1] == [None] * (len(chunks) - 1)
+    assert np.array_equal(serializer.loads(split_frames(out[-1])), image)
+    assert reassembler.stats.frames_delivered == 1
+
+
+def test_single_and_empty_chunk():
+    """Small and empty datagrams still make exactly one chunk."""
+    for datagram in (b"", b"hello"):
+        (chunk,) = fragment(datagram, 0, 100)
+        assert bytes(Reassembler().add(chunk)) == datagram
+
+    with pytest.raises(ValueError):
+        fragment(bytes(2**16 * 2), 0, CHUNK_HEADER.size + 1)
+
+
+def test_partial_frame_expires():
+    """A frame missing chunks is given up on after the timeout."""
+    chunks = fragment(bytes(300), 0, 100)
+    reassembler = Reassembler(timeout=0.5)
+
+    assert reassembler.add(chunks[0], now=0.0) is None
+    assert reassembler.add(fragment(b"next", 1, 100)[0], now=1.0) == b"next"
+
+    assert reassembler.stats.frames_partial == 1
+    assert reassembler.stats.chunks_missing == len(chunks) - 1
+
+    # Late chunks of the expired frame are ignored
+    assert reassembler.add(chunks[1], now=1.1) is None
+    assert reassembler.stats.frames_delivered == 1
+
+
+def test_lost_frames_from_id_gaps():
+    """Frame IDs skipped entirely count as lost, until they show up late."""
+    reassembler = Reassembler()
+    reassembler.add(fragment(b"a", 0, 100)[0])
+    before = copy.copy(reassembler.stats)
+    reassembler.add(fragment(b"d", 3, 100)[0])
+    assert reassembler.stats.frames_lost == 2
+
+    reassembler.add(fragment(b"b", 1, 100)[0])
+    assert reassembler.stats.frames_lost == 1
+
+    delta = reassembler.stats.since(before)
+    assert (delta.frames_delivered, delta.frames_lost) == (2, 1)
+
+
+def test_frame_id_wraps():
+    """Frame IDs wrap around without counting a huge loss."""
+    reassembler = Reassembler()
+    reassembler.add(fragment(b"a", 2**32 - 1, 100)[0])
+    assert reassembler.add(fragment(b"b", 2**32, 100)[0]) == b"b"
+    assert reassembler.stats.frames_lost == 0
@@ -0,0 +1,62 @@
+"""Tests zero-copy multipart framing of messages carrying numpy arrays."""
+
+from peernet.networks import Message, ZMQ_Pair
+from peernet.networks.framing import dump_frames, load_frames
+from peernet.metrics import Container
+import numpy as np
+
+
+def test_array_roundtrip():
+    """Arrays travel as separate frames and come back unchanged."""
+    image = np.random.randint(0, 255, size=(108, 192, 3), dtype=np.uint8)
+    msg = Message(image, Container("root"))
+
+    frames = dump_frames(msg)
+    assert len(frames) == 2
+    assert len(frames[0]) < 1024
+
+    out = load_frames(frames)
+    assert np.array_equal(out.data, image)
+    assert out.logger.name == "root"
+
+
+def test_no_copy_on_receive():
+    """Rebuilt arrays share memory with the received frame."""
+    frames = dump_frames(np.arange(100, dtype=np.float64))
+    out = load_frames(frames)
+
+    assert np.shares_memory(out, frames[1])
+
+
+def test_non_contiguous_and_nested():
+    """Views and arrays nested in containers are framed too."""
+    image = np.arange(2 * 3 * 3, dtype=np.int16).reshape(2, 3, 3)
+    bgr = image[:, :, ::-1]
+    payload = {"frame": bgr, "meta": ("cam0", np.zeros(0)), "scalar": 3}
+
+    out = load_frames(dump_frames(payload))
+    assert np.array_equal(out["frame"], bgr)
+    assert out["meta"][0] == "cam0"
+    assert out["meta"][1].shape == (0,)
+    assert out["scalar"] == 3
+
+
+def test_object_arrays_stay_in_band():
+    """Object arrays can't be sent as raw buffers, so they are pickled."""
+    arr = np.array(["a", None], dtype=object)
+    frames = dump_frames(arr)
+
+    assert len(frames) == 1
+    assert list(load_frames(frames)) == ["a", None]
+
+
+def test_zmq_pair_loopback():
+    """A device sending to itself over tcp receives the same array back."""
+    network = ZMQ_Pair("local", start_port=56110, devices={"local": "127.0.0.1"})
+    image = np.random.rand(64, 64, 3)
+
+    network.send("local", Message(image, Container("root")))
+    out = network.recv("local")
+    network.close()
+
+    assert np.array_equal(out.data, image)
@@ -0,0 +1,126 @@
+"""Tests user-space impairment of any network."""
+
+from peernet.networks import ImpairedNetwork, Message, SharedMemory_Pair
+from peernet.metrics import Container
+import numpy as np
+import pytest
+import time
+import zmq
+
+
+@pytest.fixture
+def pair(make_pair):
+    """A client and a server on one host, unimpaired so far."""
+    return make_pair(start_port=56240)
+
+
+def _send(client, count, nbytes=8):
+    for idx in range(count):
+        data = np.zeros(nbytes, dtype=np.uint8)
+        client.send("server", Message(data, Container(f"{idx}"), seq=idx))
+
+
+def test_latency(pair):
+    """Messages are delivered after the configured delay."""
+    client, server = pair
+    server = ImpairedNetwork(server, latency=0.05, distribution="constant")
+
+    start = time.time()
+    _send(client, 1)
+    assert server.recv("client").seq == 0
+    assert time.time() - start >= 0.05
+
+
+def test_bandwidth(pair):
+    """A token bucket paces messages to the configured bandwidth."""
+    client, server = pair
+    server = ImpairedNetwork(server, bandwidth=1e6, burst=1500)
+
+    start = time.time()
+    _send(client, 4, nbytes=5000)
+    for _ in range(4):
+        server.recv("client")
+
+    # 20 kB at 125 kB/s, less what the bucket held to begin with
+    assert time.time() - start >= (4 * 5000 - 1500) / 125e3
+
+
+def test_loss(pair):
+    """Lost messages never arrive, and recv gives up after rcvtimeo."""
+    client, server = pair
+    server = ImpairedNetwork(server, loss=0.5, rcvtimeo=100, seed=0)
+    _send(client, 20)
+
+    delivered = []
+    with pytest.raises(zmq.Again):
+        while True:
+            delivered.append(server.recv("client").seq)
+
+    assert server.received == 20
+    assert len(delivered) == 20 - server.dropped
+
+    # Nothing is sent back for lost messages
+    assert client.poll(timeout=0.1) == 0
+    assert 0 < server.dropped < 20
+    assert delivered == sorted(delivered)
+
+
+def test_reorder(pair):
+    """Messages held back are overtaken by the ones behind them."""
+    client, server = pair
+    server = ImpairedNetwork(server, reorder=0.5, reorder_delay=0.05, seed=1)
+    _send(client, 10)
+
+    delivered = [server.recv("client").seq for _ in range(10)]
+    assert sorted(delivered) == list(range(10))
+    assert delivered != list(range(10))
+    assert server.reordered > 0
+
+
+def test_poll_replies(pair):
+    """Polling delivers impaired messages to the callback, and replies."""
+    client, server = pair
+    server = ImpairedNetwork(server, latency=0.01, jitter=0.005, seed=2)
+    _send(client, 3)
+
+    assert server.poll(3, lambda msg: msg.seq) == 3
+    assert sorted(client.recv("server") for _ in range(3)) == [0, 1, 2]
+    assert server.poll(1, timeout=0.05) == 0
+
+
+def test_from_config(pair):
+    """Profiles are presets, overridden by settings and then by device."""
+    _, server = pair
+    config = dict(profile="lte", loss=0.02, server=dict(bandwidth=5e6), client={})
+
+    impaired = ImpairedNetwork.from_config(server, config)
+    assert impaired.latency == 0.025
+    assert impaired.loss == 0.02
+    assert impaired.bandwidth == 5e6
+    assert impaired.lossy
+    assert impaired.name == "server"
+
+    with pytest.raises(ValueError):
+        ImpairedNetwork.from_config(server, dict(profile="dialup"))
+    with pytest.raises(ValueError):
+        ImpairedNetwork(server, distribution="cauchy")
+
+
+class _LossReporting(SharedMemory_Pair):
+    """Takes a loss_section in poll(), as ZMQ_UDP does."""
+
+    def poll(self, *args, loss_section=None, **kwargs):  # noqa: D102
+        self.loss_sections.append(loss_section)
+        return super().poll(*args, **kwargs)
+
+
+def test_poll_options(make_pair):
+    """Options the wrapped network's poll() takes are passed on to it."""
+    client, server = make_pair(start_port=56400, server_class=_LossReporting)
+    server.loss_sections = []
+    server = ImpairedNetwork(server)
+
+    _send(client, 1)
+    assert server.poll(1, lambda msg: msg.seq, loss_section="upload") == 1
+    assert client.recv("server") == 0
+    assert set(server.network.loss_sections) == {"upload"}
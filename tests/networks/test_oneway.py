@@ -0,0 +1,80 @@
+"""Tests one-way streams, without acks, measured by their receiver."""
+
+from peernet.networks import ClockSync, Message, OneWayMonitor
+from peernet.metrics import Container, Timer, Value
+import pytest
+import threading
+import time
+
+
+@pytest.fixture
+def pair(make_pair):
+    """A client and a server on one host."""
+    return make_pair(start_port=56340, verbose=2)
+
+
+def _sample(seq, transit, offset=None):
+    """A received Message whose upload section took transit seconds."""
+    iter_l = Container(f"{seq}")
+    if offset is not None:
+        iter_l.log_section("clock-offset", Value).end_collection(offset)
+    iter_l.log_section("upload", Timer).start = time.time() - transit
+    return Message(None, iter_l, seq)
+
+
+def test_no_acks(pair):
+    """Nothing is sent back, except what the callback returns."""
+    client, server = pair
+    for seq in range(4):
+        client.send("server", Message(seq, Container(f"{seq}"), seq))
+
+    assert server.poll(4, ack=False) == 4
+    assert client.poll(timeout=0.2) == 0
+
+    # Results, and control messages, are still answered
+    client.send("server", Message(5, Container("5"), 5))
+    server.poll(1, lambda msg: msg.seq, ack=False)
+    assert client.recv("server") == 5
+
+    thread = threading.Thread(target=server.poll, kwargs=dict(timeout=1, ack=False))
+    thread.start()
+    clock = ClockSync(client, "server", rounds=2)
+    clock.sync()
+    thread.join()
+    assert len(clock.samples) == 1
+
+
+def test_jitter_and_loss():
+    """Jitter follows RFC 3550, and sequence gaps count as losses."""
+    monitor = OneWayMonitor()
+    samples = [_sample(0, 0.010), _sample(1, 0.014), _sample(4, 0.010)]
+    for msg in samples:
+        monitor.observe(msg, "client")
+
+    # J = J + (|D| - J) / 16, for D = 0.004 twice
+    jitter = 0.004 / 16
+    jitter += (0.004 - jitter) / 16
+    stream = monitor.streams["client"]
+    assert stream.jitter == pytest.approx(jitter, abs=1e-4)
+    assert [msg.logger.get_metric("upload-lost") for msg in samples] == [0, 0, 2]
+    assert stream.lost == 2
+
+    # A late arrival fills in one of the gaps
+    monitor.observe(_sample(2, 0.010), "client")
+    assert stream.lost == 1
+    assert stream.reordered == 1
+
+    row = monitor.summary().children[0]
+    assert row.get_metric("received") == 4
+    assert row.get_metric("loss-rate") == pytest.approx(0.2)
+
+
+def test_clock_offset():
+    """Latencies take out the clock offset the sender logged."""
+    monitor = OneWayMonitor()
+    monitor.observe(_sample(0, 0.5, offset=0.49), "a")
+    monitor.observe(_sample(0, 0.01), "b")
+
+    assert monitor.streams["a"].latencies[0] == pytest.approx(0.01, abs=2e-3)
+    assert monitor.streams["b"].latencies[0] == pytest.approx(0.01, abs=2e-3)
+    assert monitor.streams["a"].lost == 0
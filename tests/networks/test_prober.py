@@ -0,0 +1,72 @@
+"""Tests background link probing."""
+
+from peernet.networks import Message, ProbeResponder, Prober
+from peernet.networks.Prober import Ping, Pong, probe_config
+from peernet.metrics import Container
+import numpy as np
+import pytest
+import time
+
+
+@pytest.fixture
+def pair(make_pair):
+    """A client and a server on one host."""
+    return make_pair(start_port=56220)
+
+
+def test_probes_while_busy(pair):
+    """Round trips are measured in the background, and every probe is logged."""
+    client, server = pair
+
+    with ProbeResponder(server), Prober(client, ["server"], rate=100) as prober:
+        time.sleep(0.3)
+        stats = prober.stats("server")
+
+        # The workload can log the estimates while probing goes on
+        iter_l = Container("0")
+        prober.log(iter_l, "server")
+
+    assert stats.sent > 10
+    assert 0 < stats.rtt_min <= stats.rtt < 0.1
+    assert stats.jitter >= 0
+    assert stats.loss == 0
+    assert iter_l.get_metric("probe-rtt") == pytest.approx(stats.rtt, rel=0.5)
+
+    probes = prober.metric_logger.children
+    assert len(probes) >= stats.sent - 1
+    assert probes[0].get_metric("peer") == "server"
+    assert probes[0].get_metric("lost") == 0
+
+
+def test_unanswered_probes_are_lost(pair):
+    """Pings that no one answers count as lost once they time out."""
+    client, _ = pair
+
+    with Prober(client, ["server"], rate=50, timeout=0.05) as prober:
+        time.sleep(0.3)
+
+    stats = prober.stats("server")
+    assert stats.lost > 0
+    assert stats.loss == 1
+    assert np.isnan(stats.rtt)
+
+
+def test_pongs_reach_callback(pair):
+    """Pings are answered inside poll(), and the Pongs passed to the callback."""
+    client, server = pair
+    client.send("server", Ping(7, 1.0))
+    client.send("server", Message(None, Container("0"), seq=0))
+
+    assert server.poll(1, lambda msg: "ack") == 1
+    assert client.recv("server") == Pong(7, 1.0)
+    assert client.recv("server") == "ack"
+
+
+def test_probe_config():
+    """Probing gets ports of its own, next to the workload's."""
+    devices = {"client": "localhost", "server": "localhost"}
+    config = probe_config(dict(start_port=7000, devices=devices))
+    assert config["start_port"] == 7002
+
+    config = probe_config(dict(devices=devices, probe_port=9000))
+    assert config == dict(devices=devices, start_port=9000)
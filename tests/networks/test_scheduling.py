@@ -0,0 +1,115 @@
+"""Tests spreading requests across servers, and receiving from any of them."""
+
+from peernet.networks import BaseNetwork, SharedMemory_Pair
+from peernet.networks.scheduling import get_scheduler, server_weights
+import pytest
+import zmq
+
+SERVERS = ["a", "b", "c"]
+
+
+def test_server_weights():
+    """Configs name one server, a list of them, or weights."""
+    assert server_weights("a") == {"a": 1.0}
+    assert server_weights(["a", "b"]) == {"a": 1.0, "b": 1.0}
+    assert server_weights({"a": 2, "b": 1}) == {"a": 2.0, "b": 1.0}
+
+    with pytest.raises(ValueError):
+        server_weights([])
+    with pytest.raises(ValueError):
+        server_weights({"a": 0})
+    with pytest.raises(ValueError):
+        get_scheduler("random", SERVERS)
+
+
+def test_least_outstanding():
+    """Requests go to the least loaded server, and idle ones in turn."""
+    scheduler = get_scheduler("least-outstanding", SERVERS)
+
+    for seq in range(3):
+        scheduler.sent(seq, scheduler.pick())
+    assert scheduler.outstanding == {"a": 1, "b": 1, "c": 1}
+
+    # b answers, so it's the only one with room
+    scheduler.done(1)
+    assert scheduler.pick() == "b"
+
+    # An idle pool is still used evenly
+    for seq in (0, 2):
+        scheduler.done(seq)
+    assert [scheduler.pick() for _ in range(3)] == ["c", "a", "b"]
+
+
+def test_weighted_round_robin():
+    """Servers get requests in proportion to their weight, interleaved."""
+    scheduler = get_scheduler("round-robin", {"a": 2, "b": 1})
+
+    picks = [scheduler.pick() for _ in range(6)]
+    assert picks == ["a", "b", "a", "a", "b", "a"]
+
+
+def test_latency_aware(monkeypatch):
+    """Once measured, the fastest server is preferred until it's backed up."""
+    scheduler = get_scheduler("latency-aware", ["fast", "slow"])
+    clock = [0.0]
+    monkeypatch.setattr("time.time", lambda: clock[0])
+
+    # Each server answers once, fast in 10 ms and slow in 40 ms
+    for seq, latency in enumerate([0.01, 0.04]):
+        server = scheduler.pick()
+        scheduler.sent(seq, server)
+        clock[0] += latency
+        scheduler.done(seq)
+    assert scheduler.latency == {"fast": 0.01, "slow": 0.04}
+
+    # Up to 3 requests ahead on fast still beat an idle slow server
+    picks = []
+    for seq in range(2, 7):
+        picks.append(scheduler.pick())
+        scheduler.sent(seq, picks[-1])
+    assert picks == ["fast"] * 4 + ["slow"]
+
+
+def test_summary():
+    """The summary has a row per server, with its share and drops."""
+    scheduler = get_scheduler("round-robin", SERVERS)
+    for seq in range(3):
+        scheduler.sent(seq, scheduler.pick())
+    scheduler.done(0)
+    assert scheduler.drop(1) == "b"
+
+    rows = {row.name: row for row in scheduler.summary().children}
+    assert rows["a"].get_metric("share") == pytest.approx(1 / 3)
+    assert rows["b"].get_metric("dropped") == 1
+    assert rows["a"].get_metric("latency-p50") >= 0
+
+
+def test_recv_any():
+    """A client receives from whichever server answers first."""
+    devices = {"client": "localhost", "a": "localhost", "b": "localhost"}
+    config = dict(start_port=56280, devices=devices)
+    client = SharedMemory_Pair("client", **config)
+    servers = {name: SharedMemory_Pair(name, **config) for name in ("a", "b")}
+
+    try:
+        servers["b"].send("client", "from b")
+        assert client.recv_any(timeout=1) == "from b"
+        assert client.last_source == "b"
+
+        with pytest.raises(zmq.Again):
+            client.recv_any(timeout=0.05)
+    finally:
+        client.close()
+        for server in servers.values():
+            server.close()
+
+
+def test_recv_any_timeout():
+    """Networks not built on ZMQ time out with TimeoutError."""
+
+    class Silent(BaseNetwork):
+        def _recv_next(self, section_name=None, timeout=None):
+            return None
+
+    with pytest.raises(TimeoutError):
+        Silent({"client": "localhost"}, verbose=2).recv_any(timeout=0)
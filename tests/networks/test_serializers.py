@@ -0,0 +1,135 @@
+"""Tests the serializer registry and the serializers shipped with PEERNet."""
+
+from peernet.networks import Message, ZMQ_Pair, get_serializer
+from peernet.networks.serializers import join_frames, split_frames
+from peernet.metrics import Container
+from peernet.metrics.MetricLogger import MetricLogger
+import dataclasses
+import math
+import numpy as np
+import pytest
+import sys
+import time
+
+
+class Counter(MetricLogger):
+    """Custom node type without a compact wire encoding."""
+
+    def _tic(self):
+        pass
+
+    def _toc(self, count):
+        return count
+
+
+@pytest.mark.parametrize("name", ["pickle", "msgpack"])
+def test_message_roundtrip(name):
+    """Messages keep their logger, and payload codec time is logged."""
+    pytest.importorskip(name)
+    serializer = get_serializer(name)
+    image = np.random.randint(0, 255, size=(48, 64, 3), dtype=np.uint8)
+    msg = Message({"frame": image, "id": 7}, Container("root"))
+
+    frames = serializer.dumps(msg, "upload-encode")
+    out = serializer.loads(frames, "upload-decode")
+
+    assert np.array_equal(out.data["frame"], image)
+    assert out.data["id"] == 7
+    assert out.logger.get_metric("upload-encode") >= 0
+    assert out.logger.get_metric("upload-decode") >= 0
+
+
+def test_plain_objects():
+    """Objects that aren't Messages are passed straight to the codec."""
+    serializer = get_serializer("pickle")
+    assert serializer.loads(serializer.dumps("ack")) == "ack"
+
+
+def test_raw_passthrough():
+    """Raw serializer sends bytes untouched and rejects other objects."""
+    serializer = get_serializer("raw")
+    payload = b"\x00\x01payload"
+
+    out = serializer.loads(serializer.dumps(Message(payload, Container("root"))))
+    assert bytes(out.data) == payload
+
+    with pytest.raises(TypeError):
+        serializer.dumps({"not": "bytes"})
+
+
+def test_unknown_serializer():
+    """Unknown names raise a ValueError."""
+    with pytest.raises(ValueError):
+        get_serializer("ThisSerializerDoesn'tExist")
+
+
+def test_join_split_frames():
+    """Frames survive being joined into one datagram."""
+    frames = get_serializer("pickle").dumps(np.arange(10))
+    out = get_serializer("pickle").loads(split_frames(join_frames(frames)))
+    assert np.array_equal(out, np.arange(10))
+
+
+def test_zmq_pair_serializer_from_constructor():
+    """The serializer can be chosen when constructing a network."""
+    pytest.importorskip("msgpack")
+    network = ZMQ_Pair(
+        "local",
+        start_port=56120,
+        devices={"local": "127.0.0.1"},
+        serializer="msgpack",
+    )
+
+    network.send("local", Message(np.ones(16), Container("root")))
+    out = network.recv("local")
+    network.close()
+
+    assert network.serializer.name == "msgpack"
+    assert np.array_equal(out.data, np.ones(16))
+
+
+def test_logger_pickle_fallback():
+    """Loggers with custom node types still travel, using pickle."""
+    serializer = get_serializer("pickle")
+    root = Container("root")
+    root.log_section("counter", Counter).end_collection(3)
+
+    out = serializer.loads(serializer.dumps(Message(0, root)))
+    assert out.logger.get_metric("counter") == 3
+
+
+def test_sequence_numbers():
+    """Sequence numbers survive the trip, including the default of None."""
+    serializer = get_serializer("pickle")
+
+    numbered = serializer.loads(serializer.dumps(Message(0, Container("r"), 41)))
+    unnumbered = serializer.loads(serializer.dumps(Message(0, Container("r"))))
+
+    assert numbered.seq == 41
+    assert unnumbered.seq is None
+
+
+def test_header_fields():
+    """Send time, source and deadline travel packed, without touching the logger."""
+    serializer = get_serializer("pickle")
+    before = time.monotonic()
+    msg = Message(0, Container("r"), 3, source=2, deadline=before + 0.5)
+
+    out = serializer.loads(serializer.dumps(msg))
+    assert before <= out.sent <= time.monotonic()
+    assert msg.sent is None
+    assert (out.seq, out.source, out.deadline) == (3, 2, before + 0.5)
+    assert out.budget == pytest.approx(0.5, abs=0.01)
+    assert not out.expired()
+    assert out.logger.children == []
+
+    # Missing numbers stay missing, and Messages take no per-instance dict
+    out = serializer.loads(serializer.dumps(Message(0, Container("r"))))
+    assert (out.source, out.deadline, out.budget) == (None, None, None)
+    assert out.remaining() == math.inf
+    if sys.version_info >= (3, 10):
+        assert not hasattr(out, "__dict__")
+
+    # Still a dataclass
+    assert dataclasses.replace(out, seq=4).seq == 4
+    assert [f.name for f in dataclasses.fields(out)][:3] == ["data", "logger", "seq"]
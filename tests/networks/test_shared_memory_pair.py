@@ -0,0 +1,79 @@
+"""Tests the shared memory network on a single host."""
+
+from peernet.networks import Message
+from peernet.metrics import Container
+import numpy as np
+import pytest
+import threading
+
+
+@pytest.fixture
+def pair(make_pair):
+    """A client and a server on small rings, so messages wrap around."""
+    return make_pair(start_port=56190, ring_size=2**15)
+
+
+def test_requests_wrap_ring(pair):
+    """With two requests in flight at a time, the ring wraps around many times."""
+    client, server = pair
+
+    def send(idx):
+        image = np.full((100, 100), idx, dtype=np.uint8)
+        client.send("server", Message(image, Container(f"{idx}"), seq=idx))
+        assert client.last_send.payload_bytes >= image.nbytes
+
+    send(0)
+    for idx in range(1, 20):
+        send(idx)
+        assert server.poll(1, lambda msg: (msg.seq, int(msg.data.mean()))) == 1
+        assert client.recv("server") == (idx - 1, idx - 1)
+
+    assert server.poll(1, lambda msg: msg.seq) == 1
+    assert client.recv("server") == 19
+
+
+def test_mixed_sizes(pair):
+    """Messages over half the ring wrap behind smaller ones, without deadlock."""
+    client, server = pair
+    sizes = [8000, 25000, 3000, 20000, 25000, 17000, 30000, 1000, 25000]
+    received = []
+
+    def recv_all():
+        for _ in sizes:
+            received.append(server.recv("client").nbytes)
+
+    def send_all():
+        for size in sizes:
+            client.send("server", np.zeros(size, dtype=np.uint8))
+
+    receiver = threading.Thread(target=recv_all, daemon=True)
+    sender = threading.Thread(target=send_all, daemon=True)
+    receiver.start()
+    sender.start()
+    sender.join(timeout=5)
+    receiver.join(timeout=5)
+
+    assert not sender.is_alive()
+    assert received == sizes
+
+
+def test_timing_sections(pair):
+    """Message timing works as it does over ZMQ_Pair."""
+    client, _ = pair
+    image = np.random.randint(0, 255, (64, 64, 3), dtype=np.uint8)
+
+    client.send_with_timing("client", image, Container("root"), "upload")
+    logger = Container("iteration")
+    data = client.recv_with_timing("client", logger, "upload")
+
+    assert np.array_equal(data, image)
+    assert logger.get_metric("upload") > 0
+    assert logger.get_metric("upload-msg-bytes") == client.last_send.nbytes
+
+
+def test_message_too_large(pair):
+    """A message that can't fit in the ring is refused up front."""
+    client, _ = pair
+
+    with pytest.raises(ValueError):
+        client.send("server", np.zeros(2**16, dtype=np.uint8))
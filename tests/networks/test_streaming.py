@@ -0,0 +1,105 @@
+"""Tests bounded frame queues, and serving streams through them."""
+
+from peernet.networks import FrameQueue, Message
+from peernet.metrics import Container, Timer
+import pytest
+import time
+
+
+@pytest.fixture
+def pair(make_pair):
+    """A client and a server on one host."""
+    return make_pair(start_port=56210)
+
+
+def test_drop_oldest():
+    """A full queue evicts its oldest frames, and is served in order."""
+    queue = FrameQueue(depth=2)
+
+    assert queue.push(0) == []
+    assert queue.push(1) == []
+    assert queue.push(2) == [0]
+    assert queue.pop() == (1, [])
+    assert queue.pop() == (2, [])
+    assert queue.dropped == 1
+    assert len(queue) == 0
+
+
+def test_keep_latest():
+    """Only the newest frame is served, and the rest are dropped."""
+    queue = FrameQueue(depth=3, policy="keep-latest")
+
+    for frame in range(5):
+        queue.push(frame)
+
+    assert queue.pop() == (4, [2, 3])
+    assert queue.dropped == 4
+    assert len(queue) == 0
+
+
+def test_invalid_arguments():
+    """Queues need room for a frame, and a known policy."""
+    with pytest.raises(ValueError):
+        FrameQueue(depth=0)
+    with pytest.raises(ValueError):
+        FrameQueue(policy="drop-newest")
+
+
+def _send_burst(client, count):
+    """Sends count requests at once, as a sensor outpacing the server would."""
+    for idx in range(count):
+        iter_l = Container(f"{idx}")
+        iter_l.log_section("upload", Timer)
+        client.send("server", Message(idx, iter_l, seq=idx))
+
+    # Let the whole burst arrive before the server looks
+    time.sleep(0.1)
+
+
+def _recv_all(client, count):
+    """Returns {seq: response message} for count responses."""
+    responses = [client.recv("server") for _ in range(count)]
+    return {msg.seq: msg for msg in responses}
+
+
+@pytest.mark.parametrize(
+    "policy, served", [("drop-oldest", [3, 4]), ("keep-latest", [4])]
+)
+def test_stream_drops_backlog(pair, policy, served):
+    """A backlog is dropped per the policy, and every sender hears back."""
+    client, server = pair
+    _send_burst(client, 5)
+
+    def callback(msg):
+        msg.logger.log_section("result", Timer).start_collection()
+        return Message(msg.data * 10, msg.logger, msg.seq)
+
+    queue = FrameQueue(depth=2, policy=policy)
+    received = server.stream(
+        queue, callback, 5, arrival_section="upload", queue_section="queueing"
+    )
+    assert received == 5
+    assert queue.dropped == 5 - len(served)
+
+    responses = _recv_all(client, 5)
+    for seq, msg in responses.items():
+        if seq in served:
+            assert msg.data == seq * 10
+            assert msg.logger.get_metric("queueing") >= 0
+            assert msg.logger.get_metric("queueing-drops") >= 0
+        else:
+            assert msg.data is None
+            assert msg.logger.get_metric("dropped") == 1
+
+
+def test_stream_without_backlog(pair):
+    """Requests that keep pace with the server are all served."""
+    client, server = pair
+    queue = FrameQueue(depth=1)
+
+    for idx in range(3):
+        _send_burst(client, 1)
+        assert server.stream(queue, lambda msg: msg.seq, 1) == 1
+        assert client.recv("server") == 0
+
+    assert queue.dropped == 0
@@ -0,0 +1,142 @@
+"""Tests recording traces, and replaying them against a live server."""
+
+from peernet.networks import (
+    AsyncZMQ_Pair,
+    Message,
+    ReplayNetwork,
+    SharedMemory_Pair,
+    TraceReader,
+    TraceWriter,
+)
+from peernet.networks.trace import RECV, SEND
+from peernet.metrics import Container, Timer
+import asyncio
+import numpy as np
+import pytest
+import threading
+import time
+
+DEVICES = {"client": "localhost", "server": "localhost"}
+
+
+@pytest.fixture
+def config():
+    """Config of a client and a server on one host."""
+    return dict(start_port=56260, devices=DEVICES)
+
+
+def _request(idx):
+    iter_l = Container(f"{idx}")
+    iter_l.log_section("upload", Timer)
+    return Message(np.full(16, idx, dtype=np.uint8), iter_l, seq=idx)
+
+
+def _record(path, config, count=5, interval=0.02):
+    """Records a client sending count requests to an echoing server."""
+    client = SharedMemory_Pair("client", record=path, **config)
+    server = SharedMemory_Pair("server", **config)
+
+    for idx in range(count):
+        client.send("server", _request(idx))
+        server.poll(1, lambda msg: msg)
+        client.recv("server")
+        time.sleep(interval)
+
+    client.close()
+    server.close()
+
+
+def test_writer_roundtrip(tmp_path):
+    """Records read back as written, with or without payloads."""
+    path = str(tmp_path / "sizes.trace")
+    writer = TraceWriter(path, ["a", "b"], payloads=False)
+    writer.write(SEND, "a", "b", [b"frame"], 5, when=1.5)
+    writer.write(RECV, "b", "a", [b"reply"], 7, when=2.5)
+    writer.close()
+
+    reader = TraceReader(path)
+    assert reader.devices == ["a", "b"]
+    assert not reader.payloads
+
+    records = list(reader)
+    assert [(r.kind, r.time, r.source, r.destination) for r in records] == [
+        (SEND, 1.5, "a", "b"),
+        (RECV, 2.5, "b", "a"),
+    ]
+    assert [r.nbytes for r in records] == [5, 7]
+    assert records[0].frames is None
+
+    with pytest.raises(ValueError):
+        ReplayNetwork(None, reader)
+
+    with open(path, "wb") as file:
+        file.write(b"not a trace")
+    with pytest.raises(ValueError):
+        TraceReader(path)
+
+
+def test_record(tmp_path, config):
+    """A recording network traces what it sends and receives, with payloads."""
+    path = str(tmp_path / "robot.trace")
+    _record(path, config, count=3)
+
+    records = list(TraceReader(path))
+    assert [r.kind for r in records] == [SEND, RECV] * 3
+    assert records[0].source == "client"
+    assert records[1].source == "server"
+    assert all(r.nbytes > 0 and r.frames for r in records)
+    assert [r.time for r in records] == sorted(r.time for r in records)
+
+
+def test_record_async(tmp_path):
+    """AsyncZMQ_Pair traces what it sends and receives too."""
+    path = str(tmp_path / "async.trace")
+
+    async def main():
+        network = AsyncZMQ_Pair(
+            "local", start_port=56265, devices={"local": "127.0.0.1"}, record=path
+        )
+        await network.send("local", _request(0))
+        await network.recv("local")
+        network.close()
+
+    asyncio.run(main())
+
+    records = list(TraceReader(path))
+    assert [r.kind for r in records] == [SEND, RECV]
+    assert all(r.nbytes > 0 and r.frames for r in records)
+
+
+@pytest.mark.parametrize("speed", [0, 1.0])
+def test_replay(tmp_path, config, speed):
+    """Replays send the recorded requests, at the recorded pace if asked."""
+    path = str(tmp_path / "robot.trace")
+    _record(path, config, count=5, interval=0.02)
+
+    client = SharedMemory_Pair("client", **config)
+    server = SharedMemory_Pair("server", **config)
+    seen = []
+
+    def serve():
+        def echo(msg):
+            seen.append(int(msg.data[0]))
+            return msg
+
+        server.poll(5, echo, timeout=5)
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+
+    start = time.time()
+    results = ReplayNetwork(client, path).replay(speed=speed, timeout=2)
+    elapsed = time.time() - start
+    thread.join()
+    client.close()
+    server.close()
+
+    assert seen == list(range(5))
+    assert len(results.children) == 5
+    assert all(row.get_metric("dropped") == 0 for row in results.children)
+    assert all(row.get_metric("response-time") > 0 for row in results.children)
+    if speed:
+        assert elapsed >= 4 * 0.02
@@ -0,0 +1,31 @@
+"""Tests wire size accounting in networks."""
+
+from peernet.networks import Message, TransferStats, ZMQ_Pair
+from peernet.metrics import Container
+import numpy as np
+
+
+def test_from_frames():
+    """Sizes add up across frames, and the first frame is the header."""
+    stats = TransferStats.from_frames([b"head", np.zeros(10, dtype=np.uint8)])
+    assert stats.nbytes == 14
+    assert stats.header_bytes == 4
+    assert stats.payload_bytes == 10
+    assert stats.frames == 2
+
+
+def test_send_recv_report_same_sizes():
+    """Both ends of a loopback report the same wire sizes."""
+    network = ZMQ_Pair("local", start_port=56140, devices={"local": "127.0.0.1"})
+    image = np.zeros((32, 32, 3), dtype=np.uint8)
+
+    sent = network.send("local", Message(image, Container("root")))
+    logger = Container("iteration")
+    data = network.recv_with_timing("local", logger, "download")
+    network.close()
+
+    assert sent == network.last_send == network.last_recv
+    assert sent.payload_bytes >= image.nbytes
+    assert logger.get_metric("download-msg-bytes") == sent.nbytes
+    assert logger.get_metric("download-data-bytes") == sent.payload_bytes
+    assert np.array_equal(data, image)
@@ -0,0 +1,50 @@
+"""Tests tuning ZMQ contexts and sockets from a network config."""
+
+from peernet.networks import Tuning, ZMQ_Pair
+import pandas as pd
+import pytest
+import zmq
+
+devices = {"local": "127.0.0.1"}
+
+
+def test_unknown_option():
+    """Typos in socket options are caught, instead of silently ignored."""
+    with pytest.raises(ValueError):
+        Tuning(sendbuf=1 << 20)
+
+
+def test_network_tuning(tmp_path):
+    """Every socket of a network gets the options, and they're read back."""
+    tuning = dict(io_threads=2, sndbuf=1 << 20, immediate=1, tcp_keepalive=1)
+    network = ZMQ_Pair(
+        "local", start_port=56360, devices=devices, verbose=2, tuning=tuning
+    )
+    network.connect_peers(["local"])
+
+    sockets = network.send_sockets + network.recv_sockets
+    assert all(socket.getsockopt(zmq.SNDBUF) == 1 << 20 for socket in sockets)
+    assert all(socket.getsockopt(zmq.IMMEDIATE) == 1 for socket in sockets)
+    assert network.tuning.applied == {**tuning}
+
+    # Messages still make it through
+    network.send("local", "hello")
+    assert network.recv("local") == "hello"
+    network.close()
+
+    network.tuning.summary().to_csv(tmp_path / "tuning.csv")
+    row = pd.read_csv(tmp_path / "tuning.csv").iloc[0]
+    assert row["io-threads"] == 2
+    assert row["sndbuf"] == 1 << 20
+
+
+def test_defaults():
+    """Without tuning, nothing is set and nothing is reported."""
+    tuning = Tuning.from_config(None)
+    context = tuning.context()
+    socket = tuning.apply(context.socket(zmq.PAIR))
+
+    assert socket.getsockopt(zmq.SNDHWM) == 1000
+    assert tuning.applied == {}
+    socket.close()
+    context.term()
@@ -0,0 +1,177 @@
+"""Tests serving requests on pools of worker threads and processes."""
+
+from peernet.networks import (
+    BatchPool,
+    ClockSync,
+    Message,
+    WorkerPool,
+)
+from peernet.metrics import Container, Timer
+import pytest
+import threading
+import time
+
+
+@pytest.fixture
+def pair(make_pair):
+    """A client and a server on one host."""
+    client, server = make_pair(start_port=56300)
+
+    # Connect both ways first, so replies aren't held up by reconnects
+    client.send("server", "hello")
+    server.poll(1)
+    client.recv("server")
+
+    return client, server
+
+
+def _slow(msg):
+    """Takes longer for lower sequence numbers. Module-level, for processes."""
+    time.sleep(0.05 * (4 - msg.seq))
+    return Message(msg.seq, msg.logger, msg.seq)
+
+
+def _send(client, count):
+    for idx in range(count):
+        iter_l = Container(f"{idx}")
+        iter_l.log_section("upload", Timer)
+        client.send("server", Message(idx, iter_l, seq=idx))
+
+
+def test_invalid_arguments():
+    """Pools need a known kind, and at least one worker."""
+    with pytest.raises(ValueError):
+        WorkerPool(kind="fiber")
+    with pytest.raises(ValueError):
+        WorkerPool(workers=0)
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_serve(pair, kind):
+    """Requests run concurrently, and are answered as they complete."""
+    client, server = pair
+    _send(client, 4)
+
+    start = time.time()
+    with WorkerPool(4, kind) as pool:
+        received = server.serve(
+            pool, _slow, 4, arrival_section="upload", queue_section="queueing"
+        )
+    elapsed = time.time() - start
+
+    # Serially, this takes 0.5 seconds
+    assert received == 4
+    assert elapsed < 0.4
+
+    replies = [client.recv("server") for _ in range(4)]
+    assert [reply.seq for reply in replies] == [3, 2, 1, 0]
+    assert all(reply.logger.get_metric("queueing") >= 0 for reply in replies)
+
+
+def test_one_at_a_time(pair):
+    """A sender waiting on each reply gets it, with nothing else to receive."""
+    client, server = pair
+
+    with WorkerPool(2) as pool:
+        thread = threading.Thread(target=server.serve, args=(pool, _slow, 3))
+        thread.start()
+
+        for seq in (3, 3, 3):
+            client.send("server", Message(seq, Container("0"), seq=seq))
+            assert client.recv("server").seq == seq
+        thread.join()
+
+
+def test_queueing(pair):
+    """With one worker, later requests log the time they waited for it."""
+    client, server = pair
+    _send(client, 2)
+
+    with WorkerPool(1) as pool:
+        server.serve(pool, _slow, 2, queue_section="queueing")
+
+    waited = {}
+    for _ in range(2):
+        reply = client.recv("server")
+        waited[reply.seq] = reply.logger.get_metric("queueing")
+    assert waited[1] >= 0.15
+    assert waited[0] < 0.05
+
+
+def test_control_messages_while_busy(pair):
+    """Control messages are answered while every worker is busy."""
+    client, server = pair
+    _send(client, 1)
+
+    pool = WorkerPool(1)
+    thread = threading.Thread(target=server.serve, args=(pool, _slow, 2))
+    thread.start()
+
+    # The request takes 0.2 seconds, but syncing isn't held up by it
+    time.sleep(0.02)
+    start = time.time()
+    ClockSync(client, "server", rounds=2).sync()
+    assert time.time() - start < 0.15
+
+    client.send("server", Message(3, Container("3"), seq=3))
+    thread.join()
+    pool.close()
+    assert sorted(client.recv("server").seq for _ in range(2)) == [0, 3]
+
+
+def _echo_batch(msgs):
+    """Answers a batch at once, after one sleep."""
+    time.sleep(0.05)
+    return [Message(len(msgs), msg.logger, msg.seq) for msg in msgs]
+
+
+def test_invalid_batching():
+    """Batches hold at least one request, and don't wait negative time."""
+    with pytest.raises(ValueError):
+        BatchPool(max_batch_size=0)
+    with pytest.raises(ValueError):
+        BatchPool(max_wait=-1)
+
+
+def test_serve_batches(pair):
+    """Waiting requests are answered in batches, up to max_batch_size."""
+    client, server = pair
+    _send(client, 5)
+
+    # Let every request arrive before the first batch starts
+    time.sleep(0.05)
+    start = time.time()
+    with BatchPool(max_batch_size=4, max_wait=0.05) as pool:
+        server.serve(pool, _echo_batch, 5, queue_section="batching-wait")
+    elapsed = time.time() - start
+
+    # Two batches, rather than five requests, of 0.05 seconds each
+    assert elapsed < 0.2
+    replies = sorted((client.recv("server") for _ in range(5)), key=lambda r: r.seq)
+    assert [reply.data for reply in replies] == [4, 4, 4, 4, 1]
+    assert [reply.logger.get_metric("batch-size") for reply in replies] == [4] * 4 + [1]
+    assert all(reply.logger.get_metric("batching-wait") >= 0 for reply in replies)
+
+
+def test_batch_wait():
+    """A lone request waits at most max_wait for its batch to fill."""
+    with BatchPool(max_batch_size=8, max_wait=0.02) as pool:
+        start = time.time()
+        reply = pool.submit(_echo_batch, Message(0, Container("0"), seq=0)).result()
+        elapsed = time.time() - start
+
+    assert reply.data == 1
+    assert 0.07 <= elapsed < 0.15
+
+
+def test_batch_reply_count():
+    """A callback that drops replies fails every request in the batch."""
+    def drop_one(msgs):
+        return msgs[1:]
+
+    with BatchPool(max_batch_size=2, max_wait=0.05) as pool:
+        futures = [pool.submit(drop_one, i) for i in range(2)]
+
+    for future in futures:
+        with pytest.raises(ValueError):
+            future.result()
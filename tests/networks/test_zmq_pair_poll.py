@@ -0,0 +1,84 @@
+"""Tests ZMQ_Pair.poll on a single loopback device.
+
+The device sends to itself, so every reply poll() sends back is also
+something poll() could receive. Tests bound poll() accordingly.
+"""
+
+from peernet.networks import NO_REPLY, ZMQ_Pair
+import time
+
+devices = {"local": "127.0.0.1"}
+
+
+def test_drains_burst():
+    """A burst of messages is handled, in order, up to max_msg_count.
+
+    Everything already waiting is drained from the socket, without polling it
+    again for every message.
+    """
+    network = ZMQ_Pair("local", start_port=56170, devices=devices, verbose=2)
+    heard = []
+
+    for i in range(10):
+        network.send("local", i)
+    time.sleep(0.1)
+
+    polls = 0
+    poll = network.poller.poll
+
+    def counted_poll(*args, **kwargs):
+        nonlocal polls
+        polls += 1
+        return poll(*args, **kwargs)
+
+    network.poller.poll = counted_poll
+    handled = network.poll(10, callback=heard.append)
+    network.close()
+
+    assert handled == 10
+    assert heard == list(range(10))
+    assert polls == 1
+
+
+def test_timeout():
+    """With nothing to receive, poll gives up after the timeout."""
+    network = ZMQ_Pair("local", start_port=56175, devices=devices, verbose=2)
+
+    start = time.time()
+    handled = network.poll(timeout=0.1)
+    network.close()
+
+    assert handled == 0
+    assert 0.05 < time.time() - start < 1
+
+
+def test_stop_condition():
+    """Poll returns as soon as stop says so, even without max_msg_count."""
+    network = ZMQ_Pair("local", start_port=56180, devices=devices, verbose=2)
+    heard = []
+
+    for i in range(5):
+        network.send("local", i)
+
+    handled = network.poll(
+        callback=heard.append, timeout=1, stop=lambda: len(heard) >= 3
+    )
+    network.close()
+
+    assert handled == 3
+    assert heard == [0, 1, 2]
+
+
+def test_replies():
+    """Callback results are sent back, None included, unless they're NO_REPLY."""
+    network = ZMQ_Pair("local", start_port=56185, devices=devices, verbose=2)
+
+    network.send("local", 1)
+    network.send("local", 2)
+    assert network.poll(1, lambda msg: None) == 1
+    assert network.poll(1, lambda msg: NO_REPLY) == 1
+
+    # Only the None came back
+    assert network.recv("local") is None
+    assert network.poll(callback=lambda msg: NO_REPLY, timeout=0.1) == 0
+    network.close()
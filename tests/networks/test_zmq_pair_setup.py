@@ -0,0 +1,44 @@
+"""Tests setting up ZMQ_Pair's sockets on first contact with each peer."""
+
+from peernet.networks import ZMQ_Pair
+import pytest
+
+DEVICES = {"local": "127.0.0.1", "remote": "127.0.0.1"}
+
+
+@pytest.fixture
+def network():
+    """A device with one peer on this host, and one that never shows up."""
+    network = ZMQ_Pair("local", start_port=56390, devices=DEVICES, verbose=2)
+    yield network
+    network.close()
+
+
+def test_on_demand(network):
+    """Nothing is set up until a peer is sent to."""
+    assert network.send_sockets == [None, None]
+    assert network.recv_sockets == [None, None]
+
+    network.send("local", "hello")
+    assert network.recv("local") == "hello"
+
+    assert list(network.setup_times) == ["local"]
+    assert network.setup_times["local"] > 0
+    assert network.recv_sockets[1] is None
+
+
+def test_connect_peers(network):
+    """Peers can be set up ahead of time, once."""
+    assert network.connect_peers(["local"]) > 0
+    assert network.connect_peers(["local"]) == 0
+    assert network.send_sockets[0] is not None
+
+
+def test_poll_peers():
+    """poll() sets up the peers it listens to, and only those."""
+    network = ZMQ_Pair(
+        "local", start_port=56395, devices=DEVICES, verbose=2, peers=["local"]
+    )
+    assert network.poll(timeout=0.05) == 0
+    assert list(network.setup_times) == ["local"]
+    network.close()
@@ -0,0 +1,102 @@
+"""Tests publishing to topics, and sending by name, over ZMQ_PubSub."""
+
+from peernet.networks import ClockSync, Message, ZMQ_PubSub
+from peernet.metrics import Container
+import numpy as np
+import pytest
+import zmq
+import threading
+import time
+
+DEVICES = {"camera": "127.0.0.1", "detector": "127.0.0.1", "logger": "127.0.0.1"}
+
+
+@pytest.fixture
+def fleet():
+    """A camera, a detector of front frames, and a logger of every frame."""
+    config = dict(start_port=56350, devices=DEVICES, verbose=2)
+    camera = ZMQ_PubSub("camera", **config)
+    detector = ZMQ_PubSub("detector", topics=["frames/front"], **config)
+    logger = ZMQ_PubSub("logger", topics=["frames/"], **config)
+    assert camera.wait_for_subscribers(timeout=5)
+
+    yield camera, detector, logger
+    for network in (camera, detector, logger):
+        network.close()
+
+
+def test_topics(fleet):
+    """Publishes reach every device subscribed to a prefix of their topic."""
+    camera, detector, logger = fleet
+    frame = np.arange(1000, dtype=np.uint8)
+
+    camera.publish("frames/front", frame)
+    camera.publish("frames/rear", frame[:10])
+
+    assert np.array_equal(detector.recv("camera"), frame)
+    assert detector.last_topic == "frames/front"
+    assert len(logger.recv("camera")) == 1000
+    assert len(logger.recv("camera")) == 10
+    assert logger.last_topic == "frames/rear"
+
+    # The detector never saw the rear camera
+    assert detector.poll(timeout=0.1) == 0
+
+    with pytest.raises(ValueError):
+        camera.publish("@detector", frame)
+
+
+def test_receive_timing(fleet):
+    """Each subscriber times its own copy of a published Message."""
+    camera, detector, logger = fleet
+
+    camera.publish_with_timing("frames/front", b"frame", Container("0"), "frame")
+
+    loggers = [Container("detector"), Container("logger")]
+    for network, iter_l in zip((detector, logger), loggers):
+        assert network.recv_with_timing("camera", iter_l, "frame") == b"frame"
+
+    assert all(iter_l.get_metric("frame") >= 0 for iter_l in loggers)
+    assert all(iter_l.get_metric("frame-msg-bytes") > 0 for iter_l in loggers)
+
+
+def test_direct(fleet):
+    """Sends by name reach one device, and poll() replies to the sender."""
+    camera, detector, logger = fleet
+
+    thread = threading.Thread(
+        target=detector.poll, args=(1, lambda msg: msg.seq + 1), kwargs=dict(timeout=5)
+    )
+    thread.start()
+
+    ClockSync(camera, "detector", rounds=2).sync()
+    camera.send("detector", Message(None, Container("0"), seq=1))
+    assert camera.recv("detector") == 2
+    thread.join()
+
+    # Nothing sent to the detector reached the logger
+    assert logger.poll(timeout=0.1) == 0
+
+
+def test_timeout_with_traffic(fleet):
+    """Messages for other devices don't keep poll() past its timeout."""
+    camera, detector, logger = fleet
+    logger.sub.setsockopt(zmq.SUBSCRIBE, b"")
+    sending = threading.Event()
+    sending.set()
+
+    def chatter():
+        while sending.is_set():
+            camera.send("detector", b"frame")
+            time.sleep(0.01)
+
+    thread = threading.Thread(target=chatter)
+    thread.start()
+    start = time.time()
+    handled = logger.poll(timeout=0.2)
+    elapsed = time.time() - start
+    sending.clear()
+    thread.join()
+
+    assert handled == 0
+    assert elapsed < 1
@@ -0,0 +1,80 @@
+"""Tests the ROUTER/DEALER network with several devices on one host.
+
+Every device binds a single port, so unlike ZMQ_Pair, several devices can
+share a host.
+"""
+
+from peernet.networks import Message, ZMQ_Router
+from peernet.metrics import Container, Timer
+import pytest
+import time
+import zmq
+
+devices = {"robot1": "127.0.0.1", "robot2": "127.0.0.1", "server": "127.0.0.1"}
+
+
+@pytest.fixture
+def fleet():
+    """One network object per device."""
+    networks = {
+        name: ZMQ_Router(name, start_port=56160, devices=devices, verbose=2)
+        for name in devices
+    }
+    yield networks
+
+    for network in networks.values():
+        network.close()
+
+
+def test_request_reply(fleet):
+    """Requests are addressed by name and replies go back to the sender."""
+
+    def callback(msg):
+        msg.logger.end_sub("upload")
+        msg.logger.log_section("download", Timer)
+        return Message(msg.data.upper(), msg.logger, msg.seq)
+
+    for i, robot in enumerate(["robot1", "robot2"]):
+        iter_l = Container("0")
+        iter_l.log_section("upload", Timer)
+        fleet[robot].send("server", Message(robot, iter_l, seq=i))
+
+    fleet["server"].poll(2, callback)
+
+    for i, robot in enumerate(["robot1", "robot2"]):
+        reply = fleet[robot].recv("server")
+        assert reply.data == robot.upper()
+        assert reply.seq == i
+        assert reply.logger.get_metric("upload") > 0
+
+
+def test_recv_keeps_other_sources(fleet):
+    """Messages from other devices wait in the inbox until asked for."""
+    fleet["robot1"].send("server", "first")
+    fleet["robot2"].send("server", "second")
+
+    assert fleet["server"].recv("robot2") == "second"
+    assert fleet["server"].recv("robot1") == "first"
+
+
+def test_dealers_are_lazy(fleet):
+    """Only peers we've sent to get a socket."""
+    fleet["robot1"].send("server", "hi")
+    fleet["server"].recv("robot1")
+
+    assert list(fleet["robot1"].dealers) == ["server"]
+    assert fleet["robot2"].dealers == {}
+
+
+def test_timeout_with_strangers(fleet):
+    """Messages from unknown devices don't keep poll() past its timeout."""
+    server = fleet["server"]
+    stranger = zmq.Context.instance().socket(zmq.DEALER)
+    stranger.setsockopt(zmq.IDENTITY, b"stranger")
+    stranger.connect(f"tcp://127.0.0.1:{server.get_port('server')}")
+
+    stranger.send(b"hello")
+    start = time.time()
+    assert server.poll(timeout=0.2) == 0
+    assert time.time() - start < 1
+    stranger.close(linger=0)
@@ -6,6 +6,7 @@ programs need to be run on the appropriate devices.
 """
 
 from peernet.networks import ZMQ_UDP
+import numpy as np
 import omegaconf
 import zmq
 
@@ -32,6 +33,21 @@ def test_local_2():
         print(f"I heard {msg}")
 
 
+def test_local_image():
+    """Tests that frames larger than one datagram are reassembled."""
+    zmq_udp = ZMQ_UDP("hostname1", **config)
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+
+    for _ in range(10):
+        zmq_udp.send("hostname1", image)
+        msg = zmq_udp.recv("hostname1")
+
+        assert msg.shape == image.shape
+        assert msg.dtype == image.dtype
+        assert np.array_equal(msg, image)
+
+
 def test_client():
     """Tests client behavior."""
     zmq_udp = ZMQ_UDP("hostname1", **config)